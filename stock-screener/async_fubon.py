@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+AsyncFubonComplete - 並行 REST 請求
+====================================
+Fubon SDK 的 REST client 是阻塞式呼叫；逐筆呼叫時每筆的網路延遲會疊加在
+限流間隔上。這裡用 asyncio + ThreadPoolExecutor 讓多筆請求同時在途：
+
+- 每個 worker 執行阻塞呼叫前，由 FubonComplete / http_get_with_retry 向
+  quota_broker 取 token，因此整體仍精準維持在額度內
+- 同時在途的請求數上限為 max_in_flight，網路延遲被重疊掉
+- 完成的結果依完成順序在事件迴圈（單一執行緒）回呼 on_done，
+  呼叫端可直接在回呼裡寫日K庫 / 日誌，不需要另外加鎖
+
+用法：
+  afc = AsyncFubonComplete(fc)
+  afc.run([(code, "get_candles", (code,), {"from_date": f, "to_date": t}) for code in codes],
+          on_done=lambda code, candles: ...)
+
+  fetcher = AsyncFetcher()
+  fetcher.run([(sym, get_ma5_ma20, (sdk, sym), {}) for sym in symbols], on_done=...)
+"""
+
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_IN_FLIGHT = 4  # 60次/分鐘、單筆延遲 < 4 秒時足以讓額度不閒置
+
+
+class AsyncFetcher:
+    """以 executor 並行執行阻塞呼叫（限流由呼叫內部的 quota 控管）"""
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self.stats = {"requests": 0, "errors": 0, "elapsed": 0.0}
+
+    def _resolve(self, fn):
+        return fn
+
+    async def _gather(self, jobs, on_done):
+        loop = asyncio.get_running_loop()
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            futures = {}
+            for key, fn, args, kwargs in jobs:
+                call = functools.partial(self._resolve(fn), *args, **(kwargs or {}))
+                futures[loop.run_in_executor(executor, call)] = key
+            # 用 wait 取回完成的 future（as_completed 不保留原 future，無法回查 key）
+            pending = set(futures)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for fut in done:
+                    key = futures[fut]
+                    self.stats["requests"] += 1
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        self.stats["errors"] += 1
+                        print(f"[async] {key} 錯誤: {e}")
+                        result = None
+                    results[key] = result
+                    if on_done:
+                        on_done(key, result)
+        return results
+
+    def run(self, jobs, on_done=None) -> dict:
+        """
+        執行所有 jobs：[(key, 函式, args, kwargs), ...]
+        每筆完成時回呼 on_done(key, result)（失敗時 result 為 None），回傳 {key: result}
+        """
+        jobs = list(jobs)
+        if not jobs:
+            return {}
+        t0 = time.perf_counter()
+        results = asyncio.run(self._gather(jobs, on_done))
+        self.stats["elapsed"] += time.perf_counter() - t0
+        return results
+
+    @property
+    def rate_per_min(self) -> float:
+        """實際達到的請求速率（次/分鐘）"""
+        if not self.stats["elapsed"]:
+            return 0.0
+        return self.stats["requests"] / self.stats["elapsed"] * 60
+
+
+class AsyncFubonComplete(AsyncFetcher):
+    """FubonComplete 的並行版本：jobs 的函式可直接寫方法名稱（如 "get_candles"）"""
+
+    def __init__(self, fc, max_in_flight: int = MAX_IN_FLIGHT):
+        super().__init__(max_in_flight)
+        self.fc = fc
+
+    def _resolve(self, fn):
+        return getattr(self.fc, fn) if isinstance(fn, str) else fn
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+策略A 回測（向量化）
+====================
+以本地日K庫（candle_store）重播策略A六條件（indicators.strategy_a，與 strategy_a_screener.analyze_universe 相同），
+模擬 STRATEGY_A_SPEC.md 的進出場規則：
+
+- 進場：收盤後六條件全部成立 → 次一交易日開盤價買進
+- 每日新進場上限 top_n 檔（對應追蹤清單 20 檔），依 Gap 由小到大排序
+- 出場：停損 進場價 -5%、止盈 +10%（盤中觸價即出場，同一天兩者都觸及時以停損計，偏保守）；
+  跳空越過時以開盤價成交；持有超過 max_hold 日以收盤價出場
+- 同一檔持有中不重複進場；同時持倉最多 max_positions 檔（每筆投入 1 / max_positions 資金），
+  額滿時當天其餘信號略過（出場日當天仍佔用名額，隔日才能再進場）
+- 交易成本：手續費 0.1425% × 2 + 證交稅 0.3%
+
+條件、進場、出場全部以 股票 × 交易日 陣列運算完成；只有「同檔不重複進場」與持倉上限依交易筆數逐筆檢查。
+
+用法：
+  python backtest_a.py --years 5 --out /tmp/backtest_a.json
+"""
+
+import argparse
+import heapq
+import json
+import time
+
+import numpy as np
+
+import indicators
+from candle_store import CandleStore, DEFAULT_ROOT
+
+STOP_PCT = 0.05
+TARGET_PCT = 0.10
+MAX_HOLD = 60          # 最長持有交易日
+TOP_N = 20             # 每日新進場上限
+COST = 0.001425 * 2 + 0.003
+MAX_POSITIONS = 5      # 同時持倉上限
+ALLOCATION = 1 / MAX_POSITIONS   # 每筆交易佔資金比例
+
+EXIT_REASONS = ("STOP_LOSS", "TARGET", "TIMEOUT", "OPEN")
+
+
+def load_history(store: CandleStore, years: float = None) -> dict:
+    """從日K庫取出全市場歷史矩陣（股票 × 交易日，停牌日為 NaN）"""
+    n_sym, n_day = len(store.symbols), len(store.dates)
+    start = 0
+    if years:
+        start = max(0, n_day - int(years * 250))
+    data = {f: np.array(store.arrays[f][:n_sym, start:n_day]) for f in store.FIELDS}
+    data["symbols"] = list(store.symbols)
+    data["dates"] = list(store.dates[start:])
+    return data
+
+
+def entry_signals(data: dict, params: dict = None, analysis: dict = None):
+    """
+    六條件全部成立的布林矩陣，以及排序用的 Gap
+    analysis 可傳入預先算好的 indicators.strategy_a 結果（參數掃描時共用）
+    """
+    a = analysis or indicators.strategy_a(data["high"], data["low"], data["close"], data["volume"], params)
+    return a["conditions_met"] == 6, a["gap"]
+
+
+def simulate(data: dict, signal, rank_key, stop_pct: float = STOP_PCT, target_pct: float = TARGET_PCT,
+             max_hold: int = MAX_HOLD, top_n: int = TOP_N, cost: float = COST,
+             max_positions: int = MAX_POSITIONS) -> dict:
+    """
+    依進場信號模擬交易，回傳各欄位為陣列的交易表
+    {sym, signal_day, entry_day, exit_day, entry, exit, reason, ret}
+    """
+    o, h, l, c = data["open"], data["high"], data["low"], data["close"]
+    n_sym, n_day = c.shape
+
+    # 信號日 t → 進場日 t+1（需有開盤價）
+    sym, day = np.nonzero(signal[:, :-1])
+    entry_day = day + 1
+    entry = o[sym, entry_day]
+    ok = ~np.isnan(entry) & (entry > 0)
+    sym, day, entry_day, entry = sym[ok], day[ok], entry_day[ok], entry[ok]
+    key = np.nan_to_num(rank_key[sym, day], nan=np.inf)
+
+    # 每日新進場上限：同一信號日依 Gap 由小到大取前 top_n
+    if top_n and len(sym):
+        order = np.lexsort((key, day))
+        sym, day, entry_day, entry, key = sym[order], day[order], entry_day[order], entry[order], key[order]
+        first = np.r_[0, np.flatnonzero(np.diff(day)) + 1]
+        group_start = np.repeat(first, np.diff(np.r_[first, len(day)]))
+        keep = (np.arange(len(day)) - group_start) < top_n
+        sym, day, entry_day, entry, key = sym[keep], day[keep], entry_day[keep], entry[keep], key[keep]
+
+    # 出場搜尋：每筆交易取進場日起 max_hold 天的視窗（交易 × max_hold）
+    offsets = np.arange(max_hold)
+    cols = entry_day[:, None] + offsets
+    inside = cols < n_day
+    cols = np.minimum(cols, n_day - 1)
+    rows = sym[:, None]
+    wh, wl, wo, wc = h[rows, cols], l[rows, cols], o[rows, cols], c[rows, cols]
+    stop = (entry * (1 - stop_pct))[:, None]
+    target = (entry * (1 + target_pct))[:, None]
+    with np.errstate(invalid="ignore"):
+        hit_stop = inside & (wl <= stop)
+        hit_target = inside & (wh >= target)
+    never = max_hold + 1
+    first_stop = np.where(hit_stop.any(axis=1), hit_stop.argmax(axis=1), never)
+    first_target = np.where(hit_target.any(axis=1), hit_target.argmax(axis=1), never)
+
+    # 沒觸價：最後一個有收盤價的日子出場（視窗用完 = TIMEOUT，資料用完 = OPEN）
+    has_close = inside & ~np.isnan(wc)
+    last_close = max_hold - 1 - np.argmax(has_close[:, ::-1], axis=1)
+    data_ended = ~inside[:, -1]
+
+    is_stop = first_stop <= first_target
+    is_stop &= first_stop < never
+    is_target = ~is_stop & (first_target < never)
+    idx = np.where(is_stop, first_stop, np.where(is_target, first_target, last_close))
+    take = np.arange(len(sym))
+    day_open = wo[take, np.minimum(idx, max_hold - 1)]
+    stop_fill = np.where(day_open < stop[:, 0], day_open, stop[:, 0])
+    target_fill = np.where(day_open > target[:, 0], day_open, target[:, 0])
+    exit_price = np.where(is_stop, stop_fill,
+                          np.where(is_target, target_fill, wc[take, np.minimum(idx, max_hold - 1)]))
+    reason = np.where(is_stop, 0, np.where(is_target, 1, np.where(data_ended, 3, 2)))
+    exit_day = entry_day + idx
+
+    # 依進場日（同日依 Gap）逐筆：同一檔持有中不重複進場、持倉額滿不進場（逐筆交易，非逐日）
+    order = np.lexsort((key, entry_day))
+    keep = np.zeros(len(sym), dtype=bool)
+    busy_until = {}
+    holding = []           # 持有中交易的出場日（heap）
+    for i in order:
+        if np.isnan(exit_price[i]):
+            continue
+        d, s = entry_day[i], sym[i]
+        while holding and holding[0] < d:
+            heapq.heappop(holding)
+        if d <= busy_until.get(s, -1) or (max_positions and len(holding) >= max_positions):
+            continue
+        keep[i] = True
+        busy_until[s] = exit_day[i]
+        heapq.heappush(holding, exit_day[i])
+
+    trades = {
+        "sym": sym[keep], "signal_day": day[keep], "entry_day": entry_day[keep], "exit_day": exit_day[keep],
+        "entry": entry[keep], "exit": exit_price[keep], "reason": reason[keep],
+    }
+    trades["ret"] = trades["exit"] / trades["entry"] - 1 - cost
+    order = np.argsort(trades["entry_day"], kind="stable")
+    return {k: v[order] for k, v in trades.items()}
+
+
+def equity_curve(trades: dict, n_day: int, allocation: float = ALLOCATION) -> np.ndarray:
+    """已實現損益的權益曲線（起始 1.0，每筆交易固定投入 allocation，不複利；持倉上限由 simulate 保證）"""
+    pnl = np.bincount(trades["exit_day"], weights=trades["ret"] * allocation, minlength=n_day)
+    return 1.0 + np.cumsum(pnl[:n_day])
+
+
+def summarize(trades: dict, equity: np.ndarray) -> dict:
+    n = len(trades["ret"])
+    if n == 0:
+        return {"trades": 0}
+    peak = np.maximum.accumulate(equity)
+    counts = np.bincount(trades["reason"], minlength=len(EXIT_REASONS))
+    return {
+        "trades": n,
+        "win_rate": round(float((trades["ret"] > 0).mean()), 4),
+        "hit_rate": round(float(counts[1] / n), 4),
+        "avg_return": round(float(trades["ret"].mean()), 5),
+        "total_return": round(float(equity[-1] - 1), 5),
+        "max_drawdown": round(float((equity / peak - 1).min()), 5),
+        "exits": {name: int(cnt) for name, cnt in zip(EXIT_REASONS, counts)},
+    }
+
+
+def run_backtest(store: CandleStore, years: float = None, params: dict = None, **kwargs) -> dict:
+    data = load_history(store, years)
+    signal, rank_key = entry_signals(data, params)
+    trades = simulate(data, signal, rank_key, **kwargs)
+    positions = kwargs.get("max_positions", MAX_POSITIONS)
+    equity = equity_curve(trades, len(data["dates"]), 1 / positions if positions else ALLOCATION)
+    return {"data": data, "trades": trades, "equity": equity, "summary": summarize(trades, equity)}
+
+
+def trade_list(result: dict) -> list:
+    """交易表轉成 JSON 友善的列表"""
+    t, syms, dates = result["trades"], result["data"]["symbols"], result["data"]["dates"]
+    return [{
+        "code": syms[t["sym"][i]],
+        "signal_date": dates[t["signal_day"][i]],
+        "entry_date": dates[t["entry_day"][i]],
+        "exit_date": dates[t["exit_day"][i]],
+        "entry": round(float(t["entry"][i]), 2),
+        "exit": round(float(t["exit"][i]), 2),
+        "reason": EXIT_REASONS[t["reason"][i]],
+        "return_pct": round(float(t["ret"][i]) * 100, 2),
+    } for i in range(len(t["ret"]))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="策略A 向量化回測")
+    parser.add_argument("--store", default=DEFAULT_ROOT, help="日K庫目錄")
+    parser.add_argument("--years", type=float, default=5, help="回測年數（0 = 全部歷史）")
+    parser.add_argument("--max-hold", type=int, default=MAX_HOLD, help="最長持有交易日")
+    parser.add_argument("--top-n", type=int, default=TOP_N, help="每日新進場上限")
+    parser.add_argument("--max-positions", type=int, default=MAX_POSITIONS, help="同時持倉上限")
+    parser.add_argument("--out", help="輸出 JSON（交易明細 + 權益曲線）")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    store = CandleStore(args.store, readonly=True)
+    result = run_backtest(store, years=args.years or None, max_hold=args.max_hold, top_n=args.top_n,
+                          max_positions=args.max_positions)
+    elapsed = time.perf_counter() - t0
+
+    data = result["data"]
+    print(f"[回測] {len(data['symbols'])} 檔 × {len(data['dates'])} 日，耗時 {elapsed:.2f} 秒")
+    print(f"[回測] {json.dumps(result['summary'], ensure_ascii=False)}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({
+                "range": [data["dates"][0], data["dates"][-1]] if data["dates"] else [],
+                "summary": result["summary"],
+                "trades": trade_list(result),
+                "equity": {"dates": data["dates"], "values": [round(float(v), 5) for v in result["equity"]]},
+            }, f, ensure_ascii=False, indent=2)
+        print(f"[檔案] {args.out}")
+
+
+if __name__ == "__main__":
+    main()
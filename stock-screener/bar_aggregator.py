@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+BarAggregator - 盤中 tick → 分K（1 分 / 5 分）
+==============================================
+WebSocket trades 逐筆彙總成分K，不需要再呼叫 REST intraday.candles：
+
+- 每個週期一組預先配置的 NumPy 環形緩衝（股票 × 根數），欄位 ts / open / high / low / close / volume
+  容量 = 一個交易日的根數加餘裕，超過時覆蓋最舊的一根；股票數不足時倍增（同 CandleStore）
+  進行中的一根放在 Python list，收K時才寫入緩衝（tick 路徑不做 NumPy 純量存取）
+- 每檔累計：成交量（張，同 trades 的 size / volume）、VWAP（Σ價×量 / Σ量）、內盤量 / 外盤量、當日最高 / 最低價
+  內外盤：成交價 ≥ 賣價為外盤、≤ 買價為內盤；沒有委買賣價時用 tick rule（比上一筆高為外盤、低為內盤、平盤沿用）
+- 只有成交的分鐘才有K棒（ts = 該根開始時間，微秒）；補資料的舊 tick 併入對應的舊K棒（只更新高低與量）
+
+用法：
+  bars = BarAggregator()
+  bars.update("2330", ts_us, price, cum_volume, bid, ask)
+  bars.bars("2330", frame=5, n=12)     # 最近 12 根 5 分K {'ts', 'open', 'high', 'low', 'close', 'volume'}
+  bars.vwap("2330"), bars.volume_split("2330"), bars.day_range("2330")
+"""
+
+import numpy as np
+
+FRAMES = (1, 5)              # 分K週期（分鐘）
+SESSION_MINUTES = 300        # 08:30 試撮到 13:30 收盤
+INIT_SYMBOLS = 256
+MINUTE_US = 60_000_000
+
+
+class _Frame:
+    """
+    單一週期的分K：進行中的一根放在 Python list（每筆 tick 只做純量運算），
+    收完才寫進預先配置的 NumPy 環形緩衝（股票 × 根數）
+    """
+
+    def __init__(self, minutes: int, rows: int):
+        self.minutes = minutes
+        self.span = minutes * MINUTE_US
+        self.capacity = SESSION_MINUTES // minutes + 4
+        self.ts = np.zeros((rows, self.capacity), dtype=np.int64)
+        self.price = np.full((rows, 4, self.capacity), np.nan)      # open / high / low / close
+        self.volume = np.zeros((rows, self.capacity), dtype=np.int64)
+        self.count = np.zeros(rows, dtype=np.int64)                  # 已收K棒數（含被覆蓋的）
+        self.current = []                                            # row → [開始時間, 開, 高, 低, 收, 量] / None
+
+    def grow(self, rows: int):
+        pad = rows - self.ts.shape[0]
+        if pad <= 0:
+            return
+        self.ts = np.concatenate([self.ts, np.zeros((pad, self.capacity), dtype=np.int64)])
+        self.price = np.concatenate([self.price, np.full((pad, 4, self.capacity), np.nan)])
+        self.volume = np.concatenate([self.volume, np.zeros((pad, self.capacity), dtype=np.int64)])
+        self.count = np.concatenate([self.count, np.zeros(pad, dtype=np.int64)])
+
+    def add(self, row: int, ts: int, price: float, size: int):
+        start = ts - ts % self.span
+        bar = self.current[row]
+        if bar is not None:
+            if start == bar[0]:
+                if price > bar[2]:
+                    bar[2] = price
+                elif price < bar[3]:
+                    bar[3] = price
+                bar[4] = price
+                bar[5] += size
+                return
+            if start < bar[0]:
+                self._add_late(row, start, price, size)
+                return
+            self._commit(row, bar)
+        self.current[row] = [start, price, price, price, price, size]
+
+    def _commit(self, row: int, bar: list):
+        n = self.count[row]
+        slot = n % self.capacity
+        self.ts[row, slot] = bar[0]
+        self.price[row, :, slot] = bar[1:5]
+        self.volume[row, slot] = bar[5]
+        self.count[row] = n + 1
+
+    def _add_late(self, row: int, start: int, price: float, size: int):
+        """晚到的 tick（斷線補資料）：併入緩衝內同一時間的已收K棒，只更新高低與量"""
+        n = self.count[row]
+        for k in range(1, min(n, self.capacity) + 1):
+            slot = (n - k) % self.capacity
+            if self.ts[row, slot] == start:
+                p = self.price[row, :, slot]
+                p[1] = max(p[1], price)
+                p[2] = min(p[2], price)
+                self.volume[row, slot] += size
+                return
+            if self.ts[row, slot] < start:
+                return
+
+    def read(self, row: int, n: int = None) -> dict:
+        """已收K棒 + 進行中的一根（由舊到新，最多 capacity 根）"""
+        bar = self.current[row]
+        total = int(self.count[row])
+        closed = min(total, self.capacity - (bar is not None))
+        want = closed + (bar is not None) if n is None else n
+        k = min(closed, max(want - (bar is not None), 0))
+        slots = np.arange(total - k, total) % self.capacity
+        ts = self.ts[row, slots]
+        p = self.price[row][:, slots]
+        volume = self.volume[row, slots]
+        if bar is not None and want > 0:
+            ts = np.append(ts, bar[0])
+            p = np.column_stack([p, bar[1:5]])
+            volume = np.append(volume, bar[5])
+        return {"ts": ts, "open": p[0], "high": p[1], "low": p[2], "close": p[3], "volume": volume}
+
+
+class BarAggregator:
+    """多檔股票的盤中分K + VWAP + 內外盤量"""
+
+    def __init__(self, symbols: list = None, frames: tuple = FRAMES):
+        self.symbols = []
+        self.index = {}
+        self._rows = max(INIT_SYMBOLS, len(symbols or []))
+        self.frames = {m: _Frame(m, self._rows) for m in frames}
+        # 每檔累計（row 索引；每筆 tick 都會更新，用 list 避免 NumPy 純量存取的開銷）
+        self.last_volume = []     # 上一筆累計量（算單筆量）
+        self.last_price = []
+        self.last_side = []       # 1 外盤 / -1 內盤 / 0 未知
+        self.total_volume = []
+        self.notional = []        # Σ 價 × 量
+        self.inside = []
+        self.outside = []
+        self.day_high = []
+        self.day_low = []
+        for s in symbols or []:
+            self._row(s)
+
+    def _row(self, symbol: str) -> int:
+        row = self.index.get(symbol)
+        if row is None:
+            row = len(self.symbols)
+            if row >= self._rows:
+                self._rows *= 2
+                for f in self.frames.values():
+                    f.grow(self._rows)
+            for f in self.frames.values():
+                f.current.append(None)
+            self.symbols.append(symbol)
+            self.index[symbol] = row
+            for col, init in ((self.last_volume, 0), (self.last_price, 0.0), (self.last_side, 0),
+                              (self.total_volume, 0), (self.notional, 0.0), (self.inside, 0), (self.outside, 0),
+                              (self.day_high, None), (self.day_low, None)):
+                col.append(init)
+        return row
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.index
+
+    def update(self, symbol: str, ts: int, price: float, cum_volume: int = 0, bid: float = None,
+               ask: float = None, size: int = None):
+        """
+        加入一筆成交（ts 微秒）。單筆量優先用 size，否則以累計量差計算；
+        累計量倒退（晚到的補資料）時不計量，只更新K棒價格
+        """
+        if not price:
+            return
+        row = self.index.get(symbol)
+        if row is None:
+            row = self._row(symbol)
+        prev = self.last_volume[row]
+        if cum_volume > prev:
+            self.last_volume[row] = cum_volume
+        if size is None:
+            size = cum_volume - prev if cum_volume > prev else 0
+
+        # 內外盤
+        if ask and price >= ask:
+            side = 1
+        elif bid and price <= bid:
+            side = -1
+        else:
+            last = self.last_price[row]
+            if not last:
+                side = 0            # 當日第一筆且沒有委買賣價：無法判斷
+            else:
+                side = 1 if price > last else -1 if price < last else self.last_side[row]
+        if side > 0:
+            self.outside[row] += size
+        elif side < 0:
+            self.inside[row] += size
+        self.last_side[row] = side
+        self.last_price[row] = price
+        if self.day_high[row] is None:
+            self.day_high[row] = self.day_low[row] = price
+        elif price > self.day_high[row]:
+            self.day_high[row] = price
+        elif price < self.day_low[row]:
+            self.day_low[row] = price
+        self.total_volume[row] += size
+        self.notional[row] += price * size
+
+        for f in self.frames.values():
+            f.add(row, ts, price, size)
+
+    # ========================
+    # 讀取
+    # ========================
+
+    def bars(self, symbol: str, frame: int = 1, n: int = None) -> dict:
+        """最近 n 根分K（由舊到新）；沒有資料回 None"""
+        row = self.index.get(symbol)
+        if row is None:
+            return None
+        return self.frames[frame].read(row, n)
+
+    def latest(self, symbol: str, frame: int = 1) -> dict:
+        """目前（最新）一根分K"""
+        row = self.index.get(symbol)
+        bar = self.frames[frame].current[row] if row is not None else None
+        if bar is None:
+            return None
+        return {"ts": bar[0], "open": bar[1], "high": bar[2], "low": bar[3], "close": bar[4], "volume": bar[5]}
+
+    def vwap(self, symbol: str) -> float:
+        row = self.index.get(symbol)
+        if row is None or not self.total_volume[row]:
+            return None
+        return self.notional[row] / self.total_volume[row]
+
+    def volume_split(self, symbol: str) -> dict:
+        """累計內盤 / 外盤量（張）"""
+        row = self.index.get(symbol)
+        if row is None:
+            return {"inside": 0, "outside": 0}
+        return {"inside": self.inside[row], "outside": self.outside[row]}
+
+    def day_range(self, symbol: str) -> tuple:
+        """當日最高 / 最低成交價（沒有成交時為 (None, None)）"""
+        row = self.index.get(symbol)
+        if row is None:
+            return None, None
+        return self.day_high[row], self.day_low[row]
+
+    def snapshot(self, symbol: str) -> dict:
+        """狀態檔用：VWAP、成交量、內外盤量"""
+        row = self.index.get(symbol)
+        if row is None:
+            return None
+        vwap = self.vwap(symbol)
+        return {
+            "vwap": round(vwap, 2) if vwap is not None else None,
+            "volume": self.total_volume[row],
+            "inside": self.inside[row],
+            "outside": self.outside[row],
+        }
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+CandleStore - 本地日K線欄位式儲存
+==================================
+每個欄位（open/high/low/close/volume）各一個 memmap 的 NumPy 陣列
+（股票 × 交易日），加上 meta.json 記錄股票索引與交易日軸。
+
+目錄結構：
+  {root}/meta.json   {"symbols": [...], "dates": [...], "capacity": [列, 欄]}
+  {root}/close.npy   float64[列容量, 欄容量]，缺值為 NaN（停牌、尚未回補）
+  ...
+
+- 列 = 股票（依第一次寫入順序編號）
+- 欄 = 交易日（由舊到新，全市場共用同一條日期軸）
+- volume 單位與 Fubon candles 相同：股數（1張 = 1000股）
+"""
+
+import json
+import os
+
+import numpy as np
+
+DEFAULT_ROOT = "/home/admin/pCloudDrive/openclaw/stock-screener/data/candles"
+FIELDS = ("open", "high", "low", "close", "volume")
+META_FILE = "meta.json"
+
+# 初始容量（不足時自動倍增）
+INIT_SYMBOLS = 2048
+INIT_DAYS = 256
+
+
+class CandleStore:
+    """日K線本地儲存（每欄位一個 memmap 陣列 + 股票索引）"""
+
+    FIELDS = FIELDS
+    DTYPE = np.float64
+    FILL = np.nan
+    # 判斷「該股該日有資料」所用的欄位
+    KEY_FIELD = "close"
+
+    def __init__(self, root: str = DEFAULT_ROOT, readonly: bool = False):
+        self.root = root
+        self.readonly = readonly
+        if not readonly:
+            os.makedirs(root, exist_ok=True)
+        self._load_meta()
+        self._open_arrays()
+
+    # ========================
+    # 索引 / 中繼資料
+    # ========================
+
+    def _load_meta(self):
+        path = os.path.join(self.root, META_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                meta = json.load(f)
+        else:
+            meta = {"symbols": [], "dates": [], "capacity": [INIT_SYMBOLS, INIT_DAYS]}
+        self.symbols = list(meta["symbols"])
+        self.dates = list(meta["dates"])
+        self.capacity = tuple(meta["capacity"])
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        self.date_index = {d: i for i, d in enumerate(self.dates)}
+
+    def _write_meta(self):
+        path = os.path.join(self.root, META_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "symbols": self.symbols,
+                "dates": self.dates,
+                "capacity": list(self.capacity),
+            }, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def _field_path(self, field: str) -> str:
+        return os.path.join(self.root, f"{field}.npy")
+
+    def _open_arrays(self):
+        self.arrays = {}
+        for field in self.FIELDS:
+            path = self._field_path(field)
+            if os.path.exists(path):
+                mode = "r" if self.readonly else "r+"
+                self.arrays[field] = np.lib.format.open_memmap(path, mode=mode)
+            elif self.readonly:
+                self.arrays[field] = np.full(self.capacity, self.FILL, dtype=self.DTYPE)
+            else:
+                arr = np.lib.format.open_memmap(path, mode="w+", dtype=self.DTYPE, shape=self.capacity)
+                arr[:] = self.FILL
+                self.arrays[field] = arr
+
+    def _resize(self, rows: int, cols: int, col_map=None):
+        """
+        重新配置陣列容量；col_map 為舊欄位 → 新欄位的對照（日期軸插入時使用）
+        """
+        used_rows, used_cols = len(self.symbols), len(self.dates)
+        for field in self.FIELDS:
+            old = self.arrays[field]
+            path = self._field_path(field)
+            tmp = path + ".tmp.npy"
+            new = np.lib.format.open_memmap(tmp, mode="w+", dtype=self.DTYPE, shape=(rows, cols))
+            new[:] = self.FILL
+            if col_map is None:
+                n_cols = min(used_cols, old.shape[1])
+                new[:used_rows, :n_cols] = old[:used_rows, :n_cols]
+            else:
+                new[:used_rows, col_map] = old[:used_rows, :len(col_map)]
+            new.flush()
+            del new
+            self.arrays[field] = None
+            del old
+            os.replace(tmp, path)
+            self.arrays[field] = np.lib.format.open_memmap(path, mode="r+")
+        self.capacity = (rows, cols)
+
+    def _ensure_symbol(self, symbol: str) -> int:
+        row = self.index.get(symbol)
+        if row is not None:
+            return row
+        row = len(self.symbols)
+        if row >= self.capacity[0]:
+            self._resize(self.capacity[0] * 2, self.capacity[1])
+        self.symbols.append(symbol)
+        self.index[symbol] = row
+        return row
+
+    def _ensure_dates(self, dates) -> None:
+        """把新交易日併入日期軸（新日期接在尾端時直接附加，否則重排欄位）"""
+        new = sorted(set(d for d in dates if d not in self.date_index))
+        if not new:
+            return
+        if not self.dates or new[0] > self.dates[-1]:
+            need = len(self.dates) + len(new)
+            if need > self.capacity[1]:
+                cols = self.capacity[1]
+                while cols < need:
+                    cols *= 2
+                self._resize(self.capacity[0], cols)
+            self.dates.extend(new)
+        else:
+            merged = sorted(set(self.dates) | set(new))
+            pos = {d: i for i, d in enumerate(merged)}
+            col_map = np.array([pos[d] for d in self.dates], dtype=np.int64)
+            cols = self.capacity[1]
+            while cols < len(merged):
+                cols *= 2
+            self._resize(self.capacity[0], cols, col_map=col_map)
+            self.dates = merged
+        self.date_index = {d: i for i, d in enumerate(self.dates)}
+
+    # ========================
+    # 寫入
+    # ========================
+
+    def upsert(self, symbol: str, bars: list) -> int:
+        """
+        寫入單一股票的日K（Fubon candles 格式）
+        bars: [{'date': '2026-04-14', 'open':..., 'high':..., 'low':..., 'close':..., 'volume':...}, ...]
+        回傳寫入筆數
+        """
+        bars = [b for b in (bars or []) if b.get("date")]
+        if not bars:
+            return 0
+        row = self._ensure_symbol(symbol)
+        self._ensure_dates([b["date"][:10] for b in bars])
+        cols = np.array([self.date_index[b["date"][:10]] for b in bars], dtype=np.int64)
+        for field in self.FIELDS:
+            values = np.array([b.get(field, self.FILL) for b in bars], dtype=self.DTYPE)
+            self.arrays[field][row, cols] = values
+        return len(bars)
+
+    def upsert_day(self, day: str, bars: dict) -> int:
+        """
+        寫入單一交易日的全市場日K（TWSE MI_INDEX 匯入用）
+        bars: {code: {'open':..., 'high':..., 'low':..., 'close':..., 'volume':...}}
+        回傳寫入檔數
+        """
+        if not bars:
+            return 0
+        self._ensure_dates([day])
+        col = self.date_index[day]
+        rows = np.array([self._ensure_symbol(code) for code in bars], dtype=np.int64)
+        for field in self.FIELDS:
+            values = np.array([b.get(field) for b in bars.values()], dtype=self.DTYPE)
+            self.arrays[field][rows, col] = values
+        return len(bars)
+
+    def flush(self):
+        """寫回磁碟（陣列 + 索引）"""
+        if self.readonly:
+            return
+        for arr in self.arrays.values():
+            if isinstance(arr, np.memmap):
+                arr.flush()
+        self._write_meta()
+
+    # ========================
+    # 讀取
+    # ========================
+
+    def _present(self, values: np.ndarray) -> np.ndarray:
+        """KEY_FIELD 的值 → 「該股該日有資料」布林陣列（子類別可改寫缺值判斷）"""
+        return ~np.isnan(values)
+
+    def last_date(self, symbol: str):
+        """該股最後一筆有資料的交易日（無資料回 None）"""
+        row = self.index.get(symbol)
+        if row is None or not self.dates:
+            return None
+        key = self.arrays[self.KEY_FIELD][row, :len(self.dates)]
+        valid = np.flatnonzero(self._present(key))
+        if len(valid) == 0:
+            return None
+        return self.dates[valid[-1]]
+
+    def count(self, symbol: str) -> int:
+        """該股已入庫的交易日數"""
+        row = self.index.get(symbol)
+        if row is None:
+            return 0
+        return int(np.count_nonzero(self._present(self.arrays[self.KEY_FIELD][row, :len(self.dates)])))
+
+    def window(self, symbol: str, n: int):
+        """
+        取得單一股票最近 n 個「有交易」的日K
+        回傳 {'date': [...], 'open': ndarray, ...}，無資料回 None
+        """
+        row = self.index.get(symbol)
+        if row is None or not self.dates:
+            return None
+        used = len(self.dates)
+        key = self.arrays[self.KEY_FIELD][row, :used]
+        cols = np.flatnonzero(self._present(key))[-n:]
+        if len(cols) == 0:
+            return None
+        out = {"date": [self.dates[c] for c in cols]}
+        for field in self.FIELDS:
+            out[field] = np.array(self.arrays[field][row, cols])
+        return out
+
+    def latest(self, symbols: list) -> np.ndarray:
+        """各股最後一筆有資料的欄位索引（無資料為 -1）"""
+        used = len(self.dates)
+        rows = [self.index.get(s, -1) for s in symbols]
+        out = np.full(len(symbols), -1, dtype=np.int64)
+        known = np.array([r >= 0 for r in rows], dtype=bool)
+        if used == 0 or not known.any():
+            return out
+        key = self.arrays[self.KEY_FIELD][np.array(rows)[known], :used]
+        valid = self._present(key)
+        last = used - 1 - np.argmax(valid[:, ::-1], axis=1)
+        last[~valid.any(axis=1)] = -1
+        out[known] = last
+        return out
+
+    def matrix(self, field: str, symbols: list, n: int) -> np.ndarray:
+        """
+        取得多檔股票最近 n 個「有交易」日的矩陣（股票 × n，靠右對齊）
+        停牌日會被跳過（與 SDK 逐檔回傳的陣列相同），資料不足的左側補 NaN
+        """
+        used = len(self.dates)
+        out = np.full((len(symbols), n), self.FILL, dtype=self.DTYPE)
+        rows = np.array([self.index.get(s, -1) for s in symbols], dtype=np.int64)
+        known = rows >= 0
+        if used == 0 or not known.any():
+            return out
+        key = self.arrays[self.KEY_FIELD][rows[known], :used]
+        data = self.arrays[field][rows[known], :used]
+        # 把有資料的欄位穩定排序到右側，再取最後 n 欄
+        present = self._present(key)
+        order = np.argsort(present, axis=1, kind="stable")
+        aligned = np.take_along_axis(data, order, axis=1)
+        has = np.take_along_axis(present, order, axis=1)
+        aligned = np.where(has, aligned, self.FILL)
+        width = min(n, used)
+        out[known, n - width:] = aligned[:, used - width:]
+        return out
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+ConditionArchive - 策略A 六條件每日位元遮罩
+============================================
+每檔股票每個交易日的六條件存成 1 個 uint8（股票 × 交易日 memmap），
+沿用 CandleStore 的股票索引 / 日期軸 / 容量倍增：
+
+  bit 0~5  條件1 ~ 條件6 成立
+  bit 7    VALID：當日資料足以判斷（0 = 停牌、尚未上市或未分析）
+
+五年全市場（~2000 檔 × 1250 日）只有 2.5 MB，歷史查詢全部是陣列運算：
+
+  python condition_archive.py rebuild                        # 從日K庫重算全部歷史
+  python condition_archive.py streak --min-met 5 --hits 3 --last 5
+                                                             # 最近5日中有3日 ≥5 條件的股票
+  python condition_archive.py precede --cond 4 --window 5    # 條件4 與 6/6 通過的先後關係
+
+注意：重算以日K庫的全市場日期軸計算，停牌日為缺值，復牌後幾天的指標會重新暖機；
+每日掃描（strategy_a_screener）寫入的是跳過停牌日的結果，兩者只在停牌前後可能不同。
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+import indicators
+from candle_store import CandleStore, DEFAULT_ROOT as CANDLE_ROOT
+
+DEFAULT_ROOT = "/home/admin/pCloudDrive/openclaw/stock-screener/data/conditions"
+
+VALID = 0x80
+ALL_CONDS = 0x3F
+N_CONDS = 6
+REBUILD_CHUNK = 512  # 重算時每批股票數（控制暫存陣列大小）
+
+# analyze_universe 結果欄位，順序對應 bit 0~5
+RESULT_CONDS = (
+    "cond1_ma5_slope",
+    "cond2_gap_2pct",
+    "cond3_gap_shrinking",
+    "cond4_volume_up",
+    "cond5_kd_below_25",
+    "cond6_volume_1k",
+)
+
+# 位元遮罩 → 成立條件數
+POPCOUNT = np.array([bin(i & ALL_CONDS).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def encode(analysis: dict) -> np.ndarray:
+    """indicators.strategy_a 的結果 → uint8 位元遮罩矩陣"""
+    mask = np.where(analysis["valid"], VALID, 0).astype(np.uint8)
+    for i in range(N_CONDS):
+        mask |= analysis[f"cond{i + 1}"].astype(np.uint8) << i
+    return mask
+
+
+def encode_result(result: dict) -> int:
+    """單檔 analyze_universe 結果 → 位元遮罩"""
+    mask = VALID
+    for i, key in enumerate(RESULT_CONDS):
+        if result.get(key):
+            mask |= 1 << i
+    return mask
+
+
+class ConditionArchive(CandleStore):
+    """策略A 六條件位元遮罩庫（股票 × 交易日，uint8 memmap）"""
+
+    FIELDS = ("mask",)
+    DTYPE = np.uint8
+    FILL = 0
+    KEY_FIELD = "mask"
+
+    def __init__(self, root: str = DEFAULT_ROOT, readonly: bool = False):
+        super().__init__(root, readonly)
+
+    def _present(self, values: np.ndarray) -> np.ndarray:
+        return (values & VALID) != 0
+
+    # ========================
+    # 寫入
+    # ========================
+
+    def record(self, day: str, results: list) -> int:
+        """寫入單一交易日的分析結果（strategy_a_screener 每日呼叫），回傳寫入檔數"""
+        if not results:
+            return 0
+        self._ensure_dates([day])
+        col = self.date_index[day]
+        rows = np.array([self._ensure_symbol(r["code"]) for r in results], dtype=np.int64)
+        self.arrays["mask"][rows, col] = np.array([encode_result(r) for r in results], dtype=np.uint8)
+        return len(results)
+
+    def rebuild(self, store: CandleStore, params: dict = None, chunk: int = REBUILD_CHUNK) -> int:
+        """從日K庫重算全部歷史的六條件（覆蓋同股同日的既有值），回傳寫入格數"""
+        n_day = len(store.dates)
+        if n_day == 0 or not store.symbols:
+            return 0
+        self._ensure_dates(store.dates)
+        cols = np.array([self.date_index[d] for d in store.dates], dtype=np.int64)
+        rows = np.array([self._ensure_symbol(s) for s in store.symbols], dtype=np.int64)
+        for start in range(0, len(store.symbols), chunk):
+            block = slice(start, min(start + chunk, len(store.symbols)))
+            m = {f: np.asarray(store.arrays[f][block, :n_day]) for f in ("high", "low", "close", "volume")}
+            a = indicators.strategy_a(m["high"], m["low"], m["close"], m["volume"], params)
+            self.arrays["mask"][rows[block, None], cols] = encode(a)
+        return len(rows) * n_day
+
+    # ========================
+    # 查詢（全部為陣列運算）
+    # ========================
+
+    def masks(self, last: int = None) -> np.ndarray:
+        """已使用區域的位元遮罩（股票 × 交易日）；last 只取最近 last 個交易日"""
+        used = len(self.dates)
+        start = max(0, used - last) if last else 0
+        return np.asarray(self.arrays["mask"][:len(self.symbols), start:used])
+
+    def met(self, last: int = None) -> np.ndarray:
+        """每格成立的條件數（無資料為 0）"""
+        return POPCOUNT[self.masks(last)]
+
+    def cond(self, i: int, last: int = None) -> np.ndarray:
+        """條件 i（1~6）成立的布林矩陣"""
+        if not 1 <= i <= N_CONDS:
+            raise ValueError(f"條件編號必須是 1~{N_CONDS}: {i}")
+        return (self.masks(last) & (1 << (i - 1))) != 0
+
+    def passed(self, last: int = None) -> np.ndarray:
+        """六條件全部成立的布林矩陣"""
+        return (self.masks(last) & ALL_CONDS) == ALL_CONDS
+
+    def streak(self, min_met: int = 5, hits: int = 3, last: int = 5) -> list:
+        """
+        最近 last 個交易日中，至少 hits 天成立條件數 ≥ min_met 的股票
+        回傳 [(代號, 天數)]，依天數由多到少
+        """
+        days = np.count_nonzero(self.met(last) >= min_met, axis=1)
+        rows = np.flatnonzero(days >= hits)
+        rows = rows[np.argsort(-days[rows], kind="stable")]
+        return [(self.symbols[r], int(days[r])) for r in rows]
+
+    def precedence(self, i: int, window: int = 5) -> dict:
+        """
+        條件 i 與 6/6 通過的先後關係（同一檔股票內）
+        - preceded：通過日的前 window 個交易日內條件 i 曾成立的比例
+        - followed：條件 i 成立後 window 個交易日內出現通過的比例
+        """
+        c = self.cond(i).astype(np.int32)
+        p = self.passed().astype(np.int32)
+        n_day = c.shape[1]
+        if n_day == 0:
+            return {"cond": i, "window": window, "cond_days": 0, "passes": 0}
+
+        def trailing(x):
+            """每格往前 window 天（不含當天）的次數"""
+            cs = np.concatenate([np.zeros((x.shape[0], 1), dtype=np.int64), np.cumsum(x, axis=1)], axis=1)
+            end = np.arange(n_day)
+            return cs[:, end] - cs[:, np.maximum(0, end - window)]
+
+        def leading(x):
+            """每格往後 window 天（不含當天）的次數"""
+            cs = np.concatenate([np.zeros((x.shape[0], 1), dtype=np.int64), np.cumsum(x, axis=1)], axis=1)
+            end = np.arange(n_day)
+            return cs[:, np.minimum(n_day, end + 1 + window)] - cs[:, end + 1]
+
+        passes = p.astype(bool)
+        cond_days = c.astype(bool)
+        # 只計算後面還有完整 window 天的條件日，避免最近幾天低估
+        complete = np.arange(n_day) < len(self.dates) - window
+        cond_complete = cond_days & complete
+        n_pass = int(passes.sum())
+        n_cond = int(cond_complete.sum())
+        preceded = int((passes & (trailing(c) > 0)).sum())
+        followed = int((cond_complete & (leading(p) > 0)).sum())
+        return {
+            "cond": i,
+            "window": window,
+            "passes": n_pass,
+            "preceded": preceded,
+            "preceded_ratio": round(preceded / n_pass, 4) if n_pass else None,
+            "cond_days": n_cond,
+            "followed": followed,
+            "followed_ratio": round(followed / n_cond, 4) if n_cond else None,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="策略A 六條件位元遮罩庫")
+    parser.add_argument("--root", default=DEFAULT_ROOT, help="條件庫目錄")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("rebuild", help="從日K庫重算全部歷史")
+    p.add_argument("--store", default=CANDLE_ROOT, help="日K庫目錄")
+    p = sub.add_parser("streak", help="最近 N 日中多日接近通過的股票")
+    p.add_argument("--min-met", type=int, default=5, help="成立條件數下限")
+    p.add_argument("--hits", type=int, default=3, help="至少幾天")
+    p.add_argument("--last", type=int, default=5, help="最近幾個交易日")
+    p = sub.add_parser("precede", help="條件 N 與 6/6 通過的先後關係")
+    p.add_argument("--cond", type=int, required=True, help="條件編號 1~6")
+    p.add_argument("--window", type=int, default=5, help="往前 / 往後幾個交易日")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.cmd == "rebuild":
+        archive = ConditionArchive(args.root)
+        cells = archive.rebuild(CandleStore(args.store, readonly=True))
+        archive.flush()
+        print(f"[條件庫] 重算 {len(archive.symbols)} 檔 × {len(archive.dates)} 日（{cells} 格），"
+              f"耗時 {time.perf_counter() - t0:.2f} 秒")
+        return
+
+    archive = ConditionArchive(args.root, readonly=True)
+    if args.cmd == "streak":
+        rows = archive.streak(args.min_met, args.hits, args.last)
+        for code, days in rows:
+            print(f"  {code}: {days}/{args.last} 日 ≥ {args.min_met} 條件")
+        print(f"[條件庫] {len(rows)} 檔，耗時 {(time.perf_counter() - t0) * 1000:.1f} ms")
+    elif args.cmd == "precede":
+        print(json.dumps(archive.precedence(args.cond, args.window), ensure_ascii=False, indent=2))
+        print(f"[條件庫] 耗時 {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,9 @@ from dataclasses import dataclass
 from typing import Optional
 import os
 
+from quota_broker import QuotaClient, BUCKET_LIMITS
+from rate_control import AdaptiveRateController
+
 @dataclass
 class Quote:
     lastPrice: float
@@ -40,10 +43,14 @@ class Position:
 class FubonComplete:
     """富邦 SDK 完整工具，使用 SDK 技術分析 API"""
 
-    def __init__(self):
+    def __init__(self, caller: str = None):
         self.sdk = None
         self.account = None
         self.connected = False
+        # 與其他程序共用 Fubon REST 額度（見 quota_broker.py），429 時自動降速重試（見 rate_control.py）
+        self.quota = QuotaClient(caller)
+        self.rate = {bucket: AdaptiveRateController(bucket, limit, quota=self.quota)
+                     for bucket, limit in BUCKET_LIMITS.items()}
         self._load_config()
 
     def _load_config(self):
@@ -82,6 +89,14 @@ class FubonComplete:
                 pass
         self.connected = False
 
+    def _rest(self, bucket: str, fn, *args, **kwargs):
+        """REST 呼叫：取額度 + AIMD 限流 + 429 重試"""
+        return self.rate[bucket].call(fn, *args, **kwargs)
+
+    def effective_rate(self, bucket: str = "historical") -> float:
+        """目前有效請求速率（次/分鐘）"""
+        return self.rate[bucket].effective_rate
+
     # ========================
     # 技術分析 API（SDK原生）
     # ========================
@@ -96,7 +111,7 @@ class FubonComplete:
             if from_date and to_date:
                 kwargs["from"] = from_date
                 kwargs["to"] = to_date
-            result = tech.sma(**kwargs)
+            result = self._rest("historical", tech.sma, **kwargs)
             if result and "data" in result:
                 return result["data"]
         except Exception as e:
@@ -123,7 +138,7 @@ class FubonComplete:
             return None
         try:
             tech = self.sdk.marketdata.rest_client.stock.technical
-            result = tech.rsi(symbol=symbol, period=period, timeframe=timeframe)
+            result = self._rest("historical", tech.rsi, symbol=symbol, period=period, timeframe=timeframe)
             if result and "data" in result:
                 return result["data"][-1]
         except Exception as e:
@@ -136,7 +151,7 @@ class FubonComplete:
             return None
         try:
             tech = self.sdk.marketdata.rest_client.stock.technical
-            result = tech.macd(symbol=symbol, fast=fast, slow=slow, signal=signal, timeframe=timeframe)
+            result = self._rest("historical", tech.macd, symbol=symbol, fast=fast, slow=slow, signal=signal, timeframe=timeframe)
             if result and "data" in result:
                 return result["data"][-1]
         except Exception as e:
@@ -153,7 +168,7 @@ class FubonComplete:
             if from_date and to_date:
                 kwargs["from"] = from_date
                 kwargs["to"] = to_date
-            result = tech.kdj(**kwargs)
+            result = self._rest("historical", tech.kdj, **kwargs)
             if result and "data" in result:
                 return result["data"]
         except Exception as e:
@@ -170,7 +185,7 @@ class FubonComplete:
             if from_date and to_date:
                 kwargs["from"] = from_date
                 kwargs["to"] = to_date
-            result = hist.candles(**kwargs)
+            result = self._rest("historical", hist.candles, **kwargs)
             if result and "data" in result:
                 return result["data"]
         except Exception as e:
@@ -183,7 +198,7 @@ class FubonComplete:
             return None
         try:
             tech = self.sdk.marketdata.rest_client.stock.technical
-            result = tech.bb(symbol=symbol, period=period, std=std, timeframe=timeframe)
+            result = self._rest("historical", tech.bb, symbol=symbol, period=period, std=std, timeframe=timeframe)
             if result and "data" in result:
                 return result["data"][-1]
         except Exception as e:
@@ -200,7 +215,7 @@ class FubonComplete:
             return None
         try:
             rest = self.sdk.marketdata.rest_client.stock
-            q = rest.intraday.quote(symbol=symbol)
+            q = self._rest("intraday", rest.intraday.quote, symbol=symbol)
             if q and "data" in q:
                 return q["data"]
         except Exception as e:
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+技術指標（本地計算）
+====================
+以 NumPy 計算 SMA / KDJ，最後一軸為時間軸（由舊到新）：
+- 1-D：單一股票的序列
+- 2-D：股票 × 交易日 的矩陣（全市場一次算完，strategy_a() 直接產出六條件布林矩陣）
+
+計算方式對齊 Fubon SDK technical.sma / technical.kdj：
+- SMA(n)：最近 n 日收盤平均，前 n-1 日為 NaN
+- KDJ(9,3,3)：RSV = (C - 9日最低) / (9日最高 - 9日最低) × 100
+  K = K昨 × 2/3 + RSV × 1/3，D = D昨 × 2/3 + K × 1/3（K、D 初始值 50），J = 3K - 2D
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def sma(x, n: int) -> np.ndarray:
+    """簡單移動平均（視窗內有 NaN 則結果為 NaN）"""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(x.shape, np.nan)
+    if x.shape[-1] < n:
+        return out
+    out[..., n - 1:] = sliding_window_view(x, n, axis=-1).mean(axis=-1)
+    return out
+
+
+def kdj(high, low, close, rPeriod: int = 9, kPeriod: int = 3, dPeriod: int = 3):
+    """
+    KDJ 指標，回傳 (k, d, j)，形狀同 close
+    尚未累積滿 rPeriod 日的位置為 NaN
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    k = np.full(close.shape, np.nan)
+    d = np.full(close.shape, np.nan)
+    if close.shape[-1] < rPeriod:
+        return k, d, 3 * k - 2 * d
+
+    hh = sliding_window_view(high, rPeriod, axis=-1).max(axis=-1)
+    ll = sliding_window_view(low, rPeriod, axis=-1).min(axis=-1)
+    rng = hh - ll
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rsv = np.where(rng > 0, (close[..., rPeriod - 1:] - ll) / rng * 100, 50.0)
+    rsv[np.isnan(rng) | np.isnan(close[..., rPeriod - 1:])] = np.nan
+
+    # K/D 為遞迴平滑：時間軸逐日推進，股票軸一次算完
+    kv = np.full(close.shape[:-1], np.nan)
+    dv = np.full(close.shape[:-1], np.nan)
+    for t in range(rsv.shape[-1]):
+        r = rsv[..., t]
+        has = ~np.isnan(r)
+        k_prev = np.where(np.isnan(kv), 50.0, kv)
+        d_prev = np.where(np.isnan(dv), 50.0, dv)
+        k_new = k_prev * (kPeriod - 1) / kPeriod + r / kPeriod
+        d_new = d_prev * (dPeriod - 1) / dPeriod + k_new / dPeriod
+        kv = np.where(has, k_new, kv)
+        dv = np.where(has, d_new, dv)
+        k[..., rPeriod - 1 + t] = kv
+        d[..., rPeriod - 1 + t] = dv
+    return k, d, 3 * k - 2 * d
+
+
+# ========================
+# 策略A 條件（全市場矩陣運算）
+# ========================
+
+# 策略A 門檻（對應 STRATEGY_A_SPEC.md 進場條件）
+STRATEGY_A_PARAMS = {
+    "slope_days": 3,     # 條件1：MA5 連續上升天數
+    "gap_max": 2.0,      # 條件2：Gap 上限（%）
+    "gap_days": 4,       # 條件3：Gap 連續縮小天數（含今日）
+    "volume_days": 4,    # 條件4：成交量連續放大天數（含今日）
+    "kd_max": 25,        # 條件5：K、D 上限
+    "kd_days": 3,        # 條件5：K、D 連續低於上限天數
+    "min_lots": 1000,    # 條件6：日均成交張數下限（取 volume_days 天平均）
+}
+
+
+def gap_pct(ma5, ma20) -> np.ndarray:
+    """兩線價差 (MA20 - MA5) / MA20 × 100"""
+    ma5 = np.asarray(ma5, dtype=np.float64)
+    ma20 = np.asarray(ma20, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(ma20 > 0, (ma20 - ma5) / ma20 * 100, np.nan)
+
+
+def _trailing_all(mask, n: int) -> np.ndarray:
+    """mask 在最近 n 個位置（含當日）都成立；不足 n 日為 False"""
+    mask = np.asarray(mask, dtype=bool)
+    out = np.zeros(mask.shape, dtype=bool)
+    if n <= 1:
+        return mask.copy()
+    if mask.shape[-1] < n:
+        return out
+    out[..., n - 1:] = sliding_window_view(mask, n, axis=-1).all(axis=-1)
+    return out
+
+
+def rising(x, n: int) -> np.ndarray:
+    """最近 n 日嚴格遞增：x[t-n+1] < ... < x[t]"""
+    x = np.asarray(x, dtype=np.float64)
+    up = np.zeros(x.shape, dtype=bool)
+    with np.errstate(invalid="ignore"):
+        up[..., 1:] = x[..., 1:] > x[..., :-1]
+    return _trailing_all(up, n - 1) if n > 1 else ~np.isnan(x)
+
+
+def falling(x, n: int) -> np.ndarray:
+    """最近 n 日嚴格遞減：x[t-n+1] > ... > x[t]"""
+    return rising(-np.asarray(x, dtype=np.float64), n)
+
+
+def rolling_mean(x, n: int) -> np.ndarray:
+    """最近 n 日平均（同 sma，語意上用於成交量）"""
+    return sma(x, n)
+
+
+def strategy_a_base(high, low, close) -> dict:
+    """策略A 用到、但與門檻無關的指標矩陣（參數掃描時只需算一次）"""
+    close = np.asarray(close, dtype=np.float64)
+    ma5 = sma(close, 5)
+    ma20 = sma(close, 20)
+    k, d, _ = kdj(high, low, close)
+    return {"ma5": ma5, "ma20": ma20, "gap": gap_pct(ma5, ma20), "k": k, "d": d}
+
+
+def strategy_a_conditions(base: dict, volume, params: dict = None) -> dict:
+    """依門檻把 strategy_a_base 的指標轉成六條件布林矩陣"""
+    p = dict(STRATEGY_A_PARAMS)
+    if params:
+        p.update(params)
+
+    ma5, gap, k, d = base["ma5"], base["gap"], base["k"], base["d"]
+    volume = np.asarray(volume, dtype=np.float64)
+    avg_lots = rolling_mean(volume, p["volume_days"]) / 1000
+
+    with np.errstate(invalid="ignore"):
+        cond1 = rising(ma5, p["slope_days"])
+        cond2 = gap < p["gap_max"]
+        cond3 = falling(gap, p["gap_days"])
+        cond4 = rising(volume, p["volume_days"])
+        cond5 = _trailing_all((k < p["kd_max"]) & (d < p["kd_max"]), p["kd_days"])
+        cond6 = avg_lots >= p["min_lots"]
+
+    # 資料足夠：Gap 與 K 值往回的天數都有值
+    valid = (_trailing_all(~np.isnan(gap), p["gap_days"])
+             & _trailing_all(~np.isnan(k), p["kd_days"])
+             & _trailing_all(~np.isnan(volume), p["volume_days"]))
+
+    conds = [c & valid for c in (cond1, cond2, cond3, cond4, cond5, cond6)]
+    conditions_met = np.sum(conds, axis=0)
+
+    out = dict(base)
+    out.update({"avg_lots": avg_lots, "valid": valid, "conditions_met": conditions_met})
+    for i, c in enumerate(conds, 1):
+        out[f"cond{i}"] = c
+    return out
+
+
+def strategy_a(high, low, close, volume, params: dict = None) -> dict:
+    """
+    策略A 六條件（股票 × 交易日 矩陣）
+    每個輸出與輸入同形狀，最後一欄即「今日」
+
+    回傳:
+      ma5, ma20, gap, k, d, avg_lots  指標矩陣
+      cond1 ~ cond6                   布林矩陣
+      valid                           資料足以判斷（analyze_universe 只輸出此為 True 的股票）
+      conditions_met                  成立條件數
+    """
+    return strategy_a_conditions(strategy_a_base(high, low, close), volume, params)
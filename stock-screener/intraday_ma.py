@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+IntradayMA - 盤中即時 MA5 / MA20
+=================================
+盤中把最新成交價當作今日收盤，即時算出「收盤時會是多少」的 MA5 / MA20，
+取代開盤前查一次、整天不變的昨日 SMA。
+
+每檔只保留前 4 日與前 19 日收盤和（S4、S19，來自本地日K庫，不需 REST）：
+
+  MA5  = (S4  + 現價) / 5
+  MA20 = (S19 + 現價) / 20
+
+每個 tick O(1)。進場條件（MA5 > MA20 且 現價 > MA5）對現價是線性的，可直接解出當日固定門檻：
+
+  MA5 > MA20  ⇔ 現價 > (S19 - 4·S4) / 3
+  現價 > MA5  ⇔ 現價 > S4 / 4
+  → 現價 > max((S19 - 4·S4) / 3, S4 / 4)
+
+門檻整天不變，可直接放進 TriggerIndex；tick 只需一次比較。
+
+from_store 會檢查日K庫是否已匯入前一交易日：整庫落後時全部略過，個股沒有前一交易日K線時該檔略過
+（列在 stale），呼叫端改用 MA 快取 / API，不會以過期收盤算出門檻。
+沒有交易日曆，前一交易日以前一個平日估計，國定假日後也會判定落後（改走快取 / API，結果仍正確）。
+"""
+
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+
+SHORT = 5
+LONG = 20
+
+
+def previous_weekday(day: str) -> str:
+    """day 之前最近的平日（前一交易日的估計）"""
+    d = date.fromisoformat(day) - timedelta(days=1)
+    while d.weekday() >= 5:
+        d -= timedelta(days=1)
+    return d.isoformat()
+
+
+class IntradayMA:
+    """前 LONG-1 日收盤 + 即時現價 → 盤中 MA5 / MA20"""
+
+    def __init__(self, symbols: List[str], closes: np.ndarray):
+        """
+        closes：股票 × (LONG-1) 的前幾日收盤（最後一欄為昨日），資料不足的股票不列入
+        """
+        closes = np.asarray(closes, dtype=np.float64)
+        ok = ~np.isnan(closes).any(axis=1) if len(symbols) else np.zeros(0, dtype=bool)
+        self.symbols = [s for s, k in zip(symbols, ok) if k]
+        self.index: Dict[str, int] = {s: i for i, s in enumerate(self.symbols)}
+        closes = closes[ok]
+        self.s4 = closes[:, -(SHORT - 1):].sum(axis=1)
+        self.s19 = closes[:, -(LONG - 1):].sum(axis=1)
+        self.prev_close = closes[:, -1].copy()
+        self.last = np.full(len(self.symbols), np.nan)
+        self.ma5 = (self.s4 + self.prev_close) / SHORT     # 尚未成交前以昨收估算
+        self.ma20 = (self.s19 + self.prev_close) / LONG
+        self.stale: List[str] = []    # from_store 因日K未更新而略過的股票
+
+    @classmethod
+    def from_store(cls, store, symbols: List[str], today: str = None) -> "IntradayMA":
+        """
+        從日K庫取前 LONG-1 日收盤（今日K線已入庫時自動排除今日）
+        日K庫或個股缺前一交易日時略過（列在 stale）
+        """
+        today = today or date.today().isoformat()
+        n = LONG - 1
+        if not symbols:
+            return cls([], np.zeros((0, n)))
+        prev = next((d for d in reversed(store.dates) if d < today), None)
+        expected = previous_weekday(today)
+        if prev is None or prev < expected:
+            print(f"[盤中MA] 日K庫最新交易日 {prev} 早於前一交易日 {expected}（漏匯入？），{len(symbols)} 檔全部略過")
+            empty = cls([], np.zeros((0, n)))
+            empty.stale = list(symbols)
+            return empty
+        closes = store.matrix("close", symbols, n + 1)
+        today_col = store.date_index.get(today)
+        if today_col is not None:
+            has_today = store.latest(symbols) == today_col
+            closes = np.where(has_today[:, None], closes[:, :-1], closes[:, 1:])
+        else:
+            closes = closes[:, 1:]
+        # 個股前一交易日沒有K線（漏匯入或停牌）：收盤已過期，不列入
+        key = store.arrays[store.KEY_FIELD]
+        col = store.date_index[prev]
+        fresh = np.array([r >= 0 and bool(store._present(key[r, col]))
+                          for r in (store.index.get(s, -1) for s in symbols)], dtype=bool)
+        ma = cls([s for s, k in zip(symbols, fresh) if k], closes[fresh])
+        ma.stale = [s for s, k in zip(symbols, fresh) if not k]
+        if ma.stale:
+            print(f"[盤中MA] {len(ma.stale)} 檔缺 {prev} 日K，略過: {ma.stale[:10]}")
+        return ma
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.index
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def update(self, symbol: str, price: float) -> Optional[tuple]:
+        """以最新成交價更新該檔 MA（O(1)），回傳 (ma5, ma20)；不在引擎內回 None"""
+        i = self.index.get(symbol)
+        if i is None or not price:
+            return None
+        self.last[i] = price
+        ma5 = (self.s4[i] + price) / SHORT
+        ma20 = (self.s19[i] + price) / LONG
+        self.ma5[i] = ma5
+        self.ma20[i] = ma20
+        return ma5, ma20
+
+    def entry_threshold(self, symbol: str) -> Optional[float]:
+        """進場門檻：現價 > 門檻 ⇔ 盤中 MA5 > MA20 且 現價 > MA5"""
+        i = self.index.get(symbol)
+        if i is None:
+            return None
+        return float(self.thresholds()[i])
+
+    def thresholds(self) -> np.ndarray:
+        """所有股票的進場門檻（向量）"""
+        return np.maximum((self.s19 - 4 * self.s4) / 3, self.s4 / 4)
+
+    def snapshot(self, symbol: str) -> Optional[dict]:
+        """目前的盤中 MA（供 log / 狀態檔）"""
+        i = self.index.get(symbol)
+        if i is None:
+            return None
+        ma5, ma20 = float(self.ma5[i]), float(self.ma20[i])
+        return {
+            "ma5": ma5,
+            "ma20": ma20,
+            "gap_pct": (ma20 - ma5) / ma20 * 100 if ma20 else 0,
+            "last": None if np.isnan(self.last[i]) else float(self.last[i]),
+        }
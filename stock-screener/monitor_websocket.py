@@ -3,8 +3,13 @@
 盤中監控系統 - WebSocket 即時版
 ================================
 使用 WebSocket 訂閱即時報價，監控：
-1. 觀察名單進場條件（MA5 > MA20、現價 > MA5、外盤 > 內盤×2）
-2. 持倉停損/目標監控
+1. 觀察名單進場條件（盤中即時 MA5 > MA20、現價 > MA5、外盤 > 內盤×2）
+2. 持倉停損/目標監控（觸發時由 order_executor 即時送出市價賣單）
+3. 策略A 接近符合股票（whatif_solver 明日門檻）盤中落入通過區間
+
+訂閱數不限於單一連線的 200 檔：ws_pool.ConnectionPool 依需要開多條連線、依訊息頻率分配，
+所有連線的訊息經同一個 TickDispatcher 派發。
+判斷邏輯在 MonitorSession（不依賴 SDK / WebSocket），replay_monitor.py 可離線重播。
 
 依規格：sdk.marketdata.websocket_client.stock
 WebSocket 回調使用 on() 方法（add_handler 在 SDK 中等價於 on）
@@ -16,9 +21,13 @@ import json
 import time
 import signal
 import atexit
+import random
+import threading
 from datetime import datetime, date
 from typing import Optional, Dict, Any, List
 
+import numpy as np
+
 # ── 路徑設定 ────────────────────────────────────────────────────────────────
 WORKSPACE = "/home/admin/.openclaw/workspace"
 SCREENER_DIR = f"{WORKSPACE}/stock-screener"
@@ -27,14 +36,22 @@ sys.path.insert(0, FUBON_API_DIR)
 
 # ── 常數 ──────────────────────────────────────────────────────────────────
 STATUS_FILE = "/tmp/trading_status.json"
-WATCHLIST_FILE = "/home/admin/pCloudDrive/openclaw/stock-screener/data/tracking_list.json"
+STATUS_INTERVAL_MS = 200   # 狀態檔最短寫入間隔（期間的更新合併成一次）
+TICK_QUEUE_SIZE = 8192     # 收訊 → 判斷佇列容量
+TICK_QUEUE_POLICY = "drop_oldest"  # 佇列滿時：block / drop_oldest / conflate（每檔只留最新）
+TICK_BATCH = 256           # worker 每批最多處理筆數
+REBALANCE_INTERVAL = 60    # 連線負載重新分配間隔（秒）
+WATCHLIST_FILE = "/home/admin/pCloudDrive/openclaw/stock-screener/data/tracking_list.json"  # 相容匯出
+RESULTS_DB = f"{SCREENER_DIR}/data/results.db"
 ENV_FILE = "/home/admin/.env/fubon.env"
 LOG_FILE = f"{SCREENER_DIR}/log/websocket_monitor.log"
 
-# Rate Limit
-MA_QUERY_DELAY = 10   # HTTP API 查詢 MA 後延遲秒數
-RETRY_WAIT = 60       # 遇到 429 等候秒數
-MAX_RETRIES = 3       # WebSocket 重連次數
+# Rate Limit（HTTP API 額度由 quota_broker 與 screener / worker 共用）
+MAX_RETRIES = 3       # HTTP 重試次數；WebSocket 非交易時段的重連次數上限（交易時段不設上限）
+RECONNECT_BASE = 1.0  # WebSocket 重連退避起始秒數（指數增加，加隨機抖動）
+RECONNECT_MAX = 60.0  # WebSocket 重連退避上限秒數
+GAP_FILL_LIMIT = 500  # 斷線補資料：每次 REST 查詢的成交筆數
+ORDER_DONE_STATUS = (30, 50, 90)  # 委託狀態：已取消（IOC 未成交部分）/ 完全成交 / 失敗
 
 # WebSocket channels
 CHANNEL_TICK = "trades"
@@ -76,39 +93,58 @@ def logout_sdk(sdk):
         pass
 
 # ── 日誌 ───────────────────────────────────────────────────────────────────
+_log_file = None
+_log_lock = threading.Lock()
+
 def log(msg: str):
+    """寫入 stdout 與 LOG_FILE（檔案只開一次，行緩衝；收訊 / worker / 主執行緒共用）"""
+    global _log_file
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     line = f"[{ts}] {msg}"
     print(line)
-    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
-    with open(LOG_FILE, "a") as f:
-        f.write(line + "\n")
-
-# ── 狀態寫入 ───────────────────────────────────────────────────────────────
-def write_status(data: dict):
-    with open(STATUS_FILE, "w") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    with _log_lock:
+        if _log_file is None:
+            os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+            _log_file = open(LOG_FILE, "a", buffering=1)
+            atexit.register(_log_file.close)
+        _log_file.write(line + "\n")
 
 # ── FugleAPIError 包裝（規格要求） ────────────────────────────────────────
 from fugle_marketdata import FugleAPIError
-
-def http_get_with_retry(fn, *args, **kwargs):
-    """帶 Rate Limit 重試的 HTTP API 呼叫"""
-    for attempt in range(MAX_RETRIES):
-        try:
-            return fn(*args, **kwargs)
-        except FugleAPIError as e:
-            if e.status_code == 429:
-                log(f"WARNING: Rate Limit 429，等待 {RETRY_WAIT} 秒後重試（第 {attempt+1} 次）...")
-                time.sleep(RETRY_WAIT)
-            else:
-                log(f"ERROR: FugleAPIError: status={e.status_code} msg={e.response_text}")
-                raise
-        except Exception as e:
-            log(f"ERROR: HTTP API 錯誤: {e}")
-            raise
-    log("ERROR: 超過最大重試次數")
-    return None
+from quota_broker import QuotaClient, BUCKET_LIMITS
+from rate_control import AdaptiveRateController, is_rate_limit
+from async_fubon import AsyncFetcher
+from results_store import ResultsStore
+from status_writer import StatusWriter
+from tick_queue import TickQueue
+from ws_pool import ConnectionPool, TickDispatcher
+from tick_recorder import TickRecorder
+from trigger_index import TriggerIndex, LatencyStats
+from candle_store import CandleStore, DEFAULT_ROOT as CANDLE_DIR
+from intraday_ma import IntradayMA
+from bar_aggregator import BarAggregator
+from order_executor import OrderExecutor
+from price_board import PriceBoard
+import whatif_solver
+
+QUOTA = QuotaClient("monitor_websocket")
+# 每個 bucket 一個 AIMD 控制器：429 時降速並依重置提示等待，成功時慢慢加速
+RATE = {bucket: AdaptiveRateController(bucket, limit, quota=QUOTA, logger=lambda m: log(f"WARNING: {m}"))
+        for bucket, limit in BUCKET_LIMITS.items()}
+
+def http_get_with_retry(fn, *args, bucket: str = "historical", **kwargs):
+    """帶 Rate Limit 重試的 HTTP API 呼叫（額度由 quota_broker 控管，429 由 AIMD 控制器處理）"""
+    try:
+        return RATE[bucket].call(fn, *args, retries=MAX_RETRIES, **kwargs)
+    except FugleAPIError as e:
+        if is_rate_limit(e):
+            log("ERROR: 超過最大重試次數")
+            return None
+        log(f"ERROR: FugleAPIError: status={e.status_code} msg={e.response_text}")
+        raise
+    except Exception as e:
+        log(f"ERROR: HTTP API 錯誤: {e}")
+        raise
 
 # ── MA 查詢（帶 Rate Limit 延遲） ─────────────────────────────────────────
 def get_ma5_ma20(sdk, symbol: str) -> Optional[Dict[str, float]]:
@@ -118,12 +154,10 @@ def get_ma5_ma20(sdk, symbol: str) -> Optional[Dict[str, float]]:
             sdk.marketdata.rest_client.stock.technical.sma,
             symbol=symbol, period=5, timeframe="D"
         )
-        time.sleep(MA_QUERY_DELAY)
         ma20_data = http_get_with_retry(
             sdk.marketdata.rest_client.stock.technical.sma,
             symbol=symbol, period=20, timeframe="D"
         )
-        time.sleep(MA_QUERY_DELAY)
 
         if not ma5_data or not ma20_data:
             return None
@@ -134,15 +168,16 @@ def get_ma5_ma20(sdk, symbol: str) -> Optional[Dict[str, float]]:
         ma20 = ma20_data["data"][-1].get("sma") if ma20_data["data"] else None
         if ma5 is None or ma20 is None:
             return None
-        return {"ma5": ma5, "ma20": ma20}
+        as_of = str(ma20_data["data"][-1].get("date") or date.today())[:10]
+        return {"ma5": ma5, "ma20": ma20, "date": as_of}
     except Exception as e:
         log(f"ERROR: get_ma5_ma20({symbol}) 錯誤: {e}")
         return None
 
 # ── 時間檢查（模擬盤不交易）─────────────────────────────────────────────
-def is_market_open() -> bool:
-    """檢查是否在正式交易時段（09:00-13:30）"""
-    now = datetime.now()
+def is_market_open(now: datetime = None) -> bool:
+    """檢查是否在正式交易時段（09:00-13:30）；now 預設為目前時間（重播時傳入模擬時鐘）"""
+    now = now or datetime.now()
     hour = now.hour
     minute = now.minute
     weekday = now.weekday()  # 0=周一, 5=週六, 6=週日
@@ -160,37 +195,100 @@ def is_market_open() -> bool:
         return False
     
     # 13:30 以後收盤，不交易
-    if hour >= 13 and minute >= 30:
+    if (hour, minute) >= (13, 30):
         return False
     
     return True
 
-# ── 初始 MA 資料載入（在 WebSocket 連線前完成） ──────────────────────────
-def preload_ma_data(sdk, symbols: List[str]) -> Dict[str, Dict[str, float]]:
-    """預先載入所有觀察名單的 MA5/MA20"""
+def is_session_hours(now: datetime = None) -> bool:
+    """盤前試撮到收盤（週一至週五 08:30-13:30）：此時段 WebSocket 斷線持續重連不設上限"""
+    now = now or datetime.now()
+    if now.weekday() >= 5:
+        return False
+    return (8, 30) <= (now.hour, now.minute) < (13, 30)
+
+def backoff_delay(attempt: int) -> float:
+    """第 attempt 次重連前的等待秒數：指數退避（上限 RECONNECT_MAX）取後半段隨機值，避免多條連線同時重連"""
+    cap = min(RECONNECT_MAX, RECONNECT_BASE * 2 ** (attempt - 1))
+    return cap / 2 + random.uniform(0, cap / 2)
+
+# ── 斷線補資料（REST 當日成交明細） ─────────────────────────────────────────
+def fetch_trades_between(sdk, symbol: str, since: int, until: int) -> List[dict]:
+    """
+    查詢 since < time ≤ until（微秒）的成交明細，由舊到新
+    REST 回傳由新到舊，依 GAP_FILL_LIMIT 分頁直到早於 since
+    """
+    trades, offset = [], 0
+    while True:
+        resp = http_get_with_retry(sdk.marketdata.rest_client.stock.intraday.trades,
+                                   symbol=symbol, limit=GAP_FILL_LIMIT, offset=offset, bucket="intraday")
+        page = (resp or {}).get("data") or []
+        trades.extend(t for t in page if since < (t.get("time") or 0) <= until)
+        if len(page) < GAP_FILL_LIMIT or min(t.get("time") or 0 for t in page) <= since:
+            break
+        offset += GAP_FILL_LIMIT
+    trades.sort(key=lambda t: t.get("time") or 0)
+    return trades
+
+def gap_fill(sdk, symbols: List[str], since: Dict[str, int], until: int, emit) -> int:
+    """
+    補回斷線期間的成交：每檔查 since[sym] 之後、until 以前的成交，
+    依時間順序包成與 WebSocket 相同格式的訊息交給 emit(msg)（標記 backfill），回傳補回筆數
+    """
+    total = 0
+
+    def on_done(sym, trades):
+        nonlocal total
+        for t in trades or []:
+            emit({"event": "data", "channel": CHANNEL_TICK, "backfill": True, "data": dict(t, symbol=sym)})
+        total += len(trades or [])
+
+    fetcher = AsyncFetcher()
+    fetcher.run([(sym, fetch_trades_between, (sdk, sym, since.get(sym) or until, until), {}) for sym in symbols],
+                on_done=on_done)
+    return total
+
+# ── MA 資料查詢（日K庫與快取都沒有的股票，訂閱後背景執行） ────────────────
+def preload_ma_data(sdk, symbols: List[str], on_ready=None) -> Dict[str, Dict[str, float]]:
+    """
+    查詢 MA5/MA20（多檔同時在途，速率由 quota_broker 控制）
+    on_ready(sym, ma) 在每檔取得後回呼（背景補查時即時更新觸價索引）
+    """
     ma_cache = {}
-    for sym in symbols:
-        log(f"INFO: 查詢 MA: {sym}")
-        ma = get_ma5_ma20(sdk, sym)
+
+    def on_done(sym, ma):
         if ma:
             ma_cache[sym] = ma
             log(f"  {sym}: MA5={ma['ma5']:.2f} MA20={ma['ma20']:.2f} gap={(ma['ma20']-ma['ma5'])/ma['ma20']*100:.3f}%")
+            if on_ready:
+                on_ready(sym, ma)
         else:
             log(f"  {sym}: MA 資料不足")
+
+    log(f"INFO: 查詢 MA: {len(symbols)} 檔")
+    fetcher = AsyncFetcher()
+    fetcher.run([(sym, get_ma5_ma20, (sdk, sym), {}) for sym in symbols], on_done=on_done)
     return ma_cache
 
 # ── WebSocket 管理 ─────────────────────────────────────────────────────────
 class WebSocketManager:
     """WebSocket 連線管理，支援自動重連"""
 
-    def __init__(self, sdk, name: str = "ws"):
+    def __init__(self, sdk, name: str = "ws", queue: TickQueue = None, client=None):
         self.sdk = sdk
         self.name = name
-        self.ws = sdk.marketdata.websocket_client.stock
+        self.queue = queue       # 有佇列時收訊執行緒只解析 + 排入，handler 在 worker 執行
+        self.ws = client if client is not None else sdk.marketdata.websocket_client.stock
         self.connected = False
-        self._retry_count = 0
+        self.disconnected_at = None   # 斷線時間（微秒，補資料的預設起點）
+        self.on_disconnected = None   # 斷線當下回呼 on_disconnected(manager)（保存各檔最後成交時間）
+        self.on_reconnected = None    # 重連成功回呼 on_reconnected(manager)，在重連執行緒執行
+        self.gap_since = {}           # 斷線當下各檔的最後成交時間（微秒），由 on_disconnected 填入
+        self._reconnecting = None     # 重連執行緒
+        self._closing = threading.Event()
         self._handlers = {}
-        self._pending_subs = []  # 等待連線後的訂閱
+        self._subs = {}          # 已訂閱的頻道（連線 / 重連成功後全部重送）
+        self.gave_up = False     # 非交易時段重連失敗，停止重連
 
     def connect(self):
         """建立 WebSocket 連線"""
@@ -217,20 +315,30 @@ class WebSocketManager:
                     return True
             time.sleep(0.1)
         log(f"WARNING: [{self.name}] 認證超時")
+        self._mark_disconnected()
         return False
 
+    def _mark_disconnected(self):
+        """記錄斷線時間（每次斷線只記第一次），並呼叫 on_disconnected 保存補資料起點"""
+        if self.disconnected_at is not None:
+            return
+        self.disconnected_at = int(time.time() * 1_000_000)
+        if self.on_disconnected:
+            try:
+                self.on_disconnected(self)
+            except Exception as e:
+                log(f"ERROR: [{self.name}] 斷線處理失敗: {e}")
+
     def _flush_subscriptions(self):
-        """發送等待中的訂閱"""
-        for params in self._pending_subs:
+        """（重新）發送所有訂閱：新連線的伺服器端沒有任何訂閱"""
+        for params in list(self._subs.values()):
             self._do_subscribe(params)
-        self._pending_subs = []
 
     def subscribe(self, params: dict):
-        """訂閱頻道（連線中直接發送，否則排入佇列）"""
+        """訂閱頻道（連線中直接發送；未連線時於連線成功後發送）"""
+        self._subs[(params.get("channel"), params.get("symbol"))] = params
         if self.connected:
             self._do_subscribe(params)
-        else:
-            self._pending_subs.append(params)
 
     def _do_subscribe(self, params: dict):
         sym = params.get("symbol", "?")
@@ -238,12 +346,15 @@ class WebSocketManager:
         log(f"INFO: [{self.name}] 訂閱 {params.get('channel')} {sym}")
 
     def unsubscribe(self, params: dict):
-        self.ws.unsubscribe(params)
+        self._subs.pop((params.get("channel"), params.get("symbol")), None)
+        if self.connected:
+            self.ws.unsubscribe(params)
 
     def add_handler(self, event: str, handler):
-        """設定事件回調（規格要求的 add_handler 等價於 on）"""
+        """設定事件回調（規格要求的 add_handler 等價於 on；message 一律經 _on_message 派發）"""
         self._handlers[event] = handler
-        self.ws.on(event, handler)
+        if event != "message":
+            self.ws.on(event, handler)
 
     def _on_connect(self, *args):
         log(f"DEBUG: [{self.name}] 連線開啟")
@@ -251,7 +362,10 @@ class WebSocketManager:
 
     def _on_disconnect(self, *args):
         log(f"DEBUG: [{self.name}] 連線斷開")
+        self._mark_disconnected()
         self.connected = False
+        if not self._closing.is_set():
+            self.start_reconnect()
 
     def _on_message(self, data):
         # data 是原始 bytes，需解析
@@ -259,97 +373,77 @@ class WebSocketManager:
             import orjson
             msg = orjson.loads(data)
             event = msg.get("event", "")
-            # 派發到一般 handler
+            # 派發到一般 handler（有佇列時排入，由 worker 執行緒處理）
             handler = self._handlers.get("message")
             if handler:
-                handler(msg)
+                if self.queue is not None:
+                    data = msg.get("data")
+                    sym = data.get("symbol") if isinstance(data, dict) else None
+                    self.queue.put((handler, msg), key=(self.name, sym) if sym else None)
+                else:
+                    handler(msg)
         except Exception as e:
             log(f"ERROR: [{self.name}] 訊息解析錯誤: {e}")
 
     def _on_error(self, err):
         log(f"ERROR: [{self.name}] WebSocket 錯誤: {err}")
 
-    def reconnect(self):
-        """斷線重連（最多 3 次）"""
-        if self._retry_count >= MAX_RETRIES:
-            log(f"ERROR: [{self.name}] 超過最大重連次數")
+    def start_reconnect(self) -> bool:
+        """在背景執行緒重連（已在重連中則不重複啟動），不阻塞呼叫端"""
+        if self._closing.is_set() or (self._reconnecting and self._reconnecting.is_alive()):
             return False
-        self._retry_count += 1
-        wait = RETRY_WAIT * self._retry_count
-        log(f"INFO: [{self.name}] 等待 {wait} 秒後重連（第 {self._retry_count} 次）...")
-        time.sleep(wait)
-        try:
-            self.ws.disconnect()
-        except Exception:
-            pass
-        return self.connect()
+        self._mark_disconnected()
+        self._reconnecting = threading.Thread(target=self._reconnect_loop, name=f"{self.name}-reconnect", daemon=True)
+        self._reconnecting.start()
+        return True
+
+    def _reconnect_loop(self):
+        """
+        指數退避 + 隨機抖動重連；交易時段不設次數上限，非交易時段最多 MAX_RETRIES 次
+        成功後呼叫 on_reconnected(self)（補訂閱、補資料）
+        """
+        attempt = 0
+        while not self._closing.is_set():
+            attempt += 1
+            if attempt > MAX_RETRIES and not is_session_hours():
+                log(f"ERROR: [{self.name}] 非交易時段重連 {MAX_RETRIES} 次失敗，停止重連")
+                self.gave_up = True
+                return
+            wait = backoff_delay(attempt)
+            log(f"INFO: [{self.name}] {wait:.1f} 秒後重連（第 {attempt} 次）...")
+            if self._closing.wait(wait):
+                return
+            try:
+                self.ws.disconnect()
+            except Exception:
+                pass
+            if self.connect():
+                log(f"OK: [{self.name}] 重連成功（第 {attempt} 次）")
+                if self.on_reconnected:
+                    try:
+                        self.on_reconnected(self)
+                    except Exception as e:
+                        log(f"ERROR: [{self.name}] 重連後處理失敗: {e}")
+                self.disconnected_at = None
+                self.gap_since = {}
+                return
 
     def disconnect(self):
+        self._closing.set()
         self.connected = False
         try:
             self.ws.disconnect()
         except Exception:
             pass
 
-# ── 進場條件檢查 ───────────────────────────────────────────────────────────
-class SignalChecker:
-    """檢查進場信號"""
-
-    def __init__(self, sdk, ma_cache: Dict[str, Dict[str, float]]):
-        self.sdk = sdk
-        self.ma_cache = ma_cache  # 預先載入的 MA 資料
-
-    def check_entry(self, symbol: str, last_price: float) -> Optional[Dict]:
-        """
-        檢查進場條件：
-        1. MA5 > MA20（黃金交叉）
-        2. 現價 > MA5
-        """
-        ma = self.ma_cache.get(symbol)
-        if not ma:
-            return None
-
-        ma5 = ma["ma5"]
-        ma20 = ma["ma20"]
-
-        cond1 = ma5 > ma20            # 黃金交叉
-        cond2 = last_price > ma5      # 價格 > MA5
-
-        signal = cond1 and cond2
-
-        return {
-            "symbol": symbol,
-            "price": last_price,
-            "ma5": ma5,
-            "ma20": ma20,
-            "gap_pct": (ma20 - ma5) / ma20 * 100 if ma20 else 0,
-            "cond1_ma5_gt_ma20": cond1,
-            "cond2_price_gt_ma5": cond2,
-            "signal": signal,
-        }
-
-# ── 持倉監控 ───────────────────────────────────────────────────────────────
-class PositionMonitor:
-    """持倉監控，停損/目標檢查"""
-
-    @staticmethod
-    def check(position: Dict, last_price: float) -> Optional[str]:
-        """
-        檢查持倉狀態
-        回傳：'STOP_LOSS' | 'TARGET' | None
-        """
-        entry = position.get("entry", 0)
-        stop = position.get("stop", 0)
-        target = position.get("target", 0)
-
-        if not entry or not last_price:
-            return None
-
-        if stop > 0 and last_price <= stop:
-            return "STOP_LOSS"
-        if target > 0 and last_price >= target:
-            return "TARGET"
-        return None
+def new_stock_client(sdk, i: int):
+    """
+    第 i 條連線的行情 WebSocket client：第一條沿用登入時的 client，
+    其後每條重新 init_realtime() 取得獨立的 client（同一 client 的 handler 會互相覆蓋）
+    """
+    if i > 0:
+        sdk.init_realtime()
+    return sdk.marketdata.websocket_client.stock
 
 # ── 訂單執行 ───────────────────────────────────────────────────────────────
 def place_market_sell(sdk, symbol: str, quantity: int = 1):
@@ -373,8 +467,23 @@ def place_market_sell(sdk, symbol: str, quantity: int = 1):
         log(f"ERROR: 卖出 {symbol} 失敗: {e}")
         return None
 
+def query_order(sdk, order_no: str):
+    """
+    查詢委託的累計成交股數 → (成交股數, 委託是否已結束)
+    IOC 單未成交的部分由交易所自動取消；狀態 30（已取消）/ 50（完全成交）/ 90（失敗）視為結束
+    """
+    result = sdk.order.rest_client.get_order_results(account=sdk.accounting.account())
+    for o in getattr(result, "data", None) or []:
+        if getattr(o, "order_no", None) == order_no:
+            return int(getattr(o, "filled_qty", 0) or 0), getattr(o, "status", None) in ORDER_DONE_STATUS
+    raise LookupError(f"查無委託 {order_no}")
+
 # ── 狀態初始化 ──────────────────────────────────────────────────────────────
-def load_watchlist() -> dict:
+def load_watchlist(db: ResultsStore) -> dict:
+    """追蹤清單與持倉（結果庫沒有資料時讀舊的 tracking_list.json）"""
+    data = db.load_tracking()
+    if data is not None:
+        return data
     if os.path.exists(WATCHLIST_FILE):
         with open(WATCHLIST_FILE) as f:
             return json.load(f)
@@ -392,36 +501,28 @@ def parse_tick(msg) -> Optional[dict]:
         data = msg.get("data", {})
         if isinstance(data, dict):
             symbol = data.get("symbol", "")
-            # trades channel: price, volume
+            # trades channel: price, size, volume, bid, ask, isTrial（上市櫃股票 size / volume 單位為張）
             # tick channel: lastPrice, volume, insideVolume, outsideVolume
             last_price = float(data.get("price") or data.get("lastPrice") or 0)
             volume = int(data.get("volume") or 0)
+            size = data.get("size")
             return {
                 "symbol": symbol,
                 "lastPrice": last_price,
                 "volume": volume,
+                "time": int(data.get("time") or 0),   # 成交時間（微秒）
+                "size": int(size) if size is not None else None,
+                "bid": float(data.get("bid") or 0),
+                "ask": float(data.get("ask") or 0),
+                "trial": bool(data.get("isTrial")),
             }
     except Exception as e:
         log(f"ERROR: parse_tick 錯誤: {e}")
     return None
 
-# ── 主程式 ─────────────────────────────────────────────────────────────────
-def main():
-    log("=" * 60)
-    log("🌙 盤中 WebSocket 監控系統啟動")
-    log("=" * 60)
-
-    # 初始化 SDK
-    sdk = init_sdk()
-    atexit.register(lambda: logout_sdk(sdk))
-    log("✅ SDK 登入成功")
-
-    # 載入 watchlist
-    wl_data = load_watchlist()
-    holdings_raw = wl_data.get("holdings", {})
-    watchlist = wl_data.get("watchlist", [])
-
-    # 整理持倉（支援 list 和 dict 兩種格式）
+# ── 持倉整理 ─────────────────────────────────────────────────────────────
+def parse_holdings(holdings_raw) -> List[dict]:
+    """追蹤清單的持倉（支援 list 和 dict 兩種格式）→ [{code, entry, qty, stop, target, name}]"""
     holdings = []
     if isinstance(holdings_raw, list):
         # list 格式：[{"code": "2536", "entry_price": 22.532, ...}]
@@ -447,215 +548,433 @@ def main():
                     "target": h.get("target_price", 0),
                     "name": h.get("name", code),
                 })
+    return holdings
+
+# ── 盤中判斷（與 SDK / WebSocket 無關，replay_monitor 可離線重播）──────────
+class MonitorSession:
+    """
+    持倉 / 觀察名單 / 接近符合股票的盤中判斷狀態與 tick handler
+    db / recorder / writer 為 None 時略過寫入；clock 取代 datetime.now（重播時注入模擬時鐘），logger 取代 log
+    bars：成交彙總的 1 / 5 分K、VWAP 與內外盤量（position_vol / signal_vol 由此更新）
+    executor：停損 / 目標觸發時排入賣出委託（None 時只記錄；每檔只記一次）
+    board：共享記憶體價格看板（每筆成交更新，monitor_worker / premarket_check 直接讀）
+    """
+
+    def __init__(self, holdings: List[dict], watchlist_codes: List[str], near_miss: Dict[str, dict] = None,
+                 live_ma: IntradayMA = None, ma_cache: Dict[str, dict] = None, db: ResultsStore = None,
+                 recorder: TickRecorder = None, writer: StatusWriter = None, clock=datetime.now, logger=None,
+                 bars: BarAggregator = None, executor: OrderExecutor = None, board: PriceBoard = None):
+        self.holdings = holdings
+        self.holding_codes = set(h["code"] for h in holdings)
+        self.watchlist_codes = watchlist_codes
+        self.watchlist_set = set(watchlist_codes)
+        self.near_miss = near_miss or {}
+        self.watch_set = self.watchlist_set | set(self.near_miss)
+        self.live_ma = live_ma if live_ma is not None else IntradayMA([], np.zeros((0, 19)))
+        self.ma_cache = ma_cache if ma_cache is not None else {}
+        self.db = db
+        self.recorder = recorder
+        self.writer = writer
+        self.clock = clock
+        self.log = logger or log
+        self.bars = bars if bars is not None else BarAggregator(list(self.holding_codes | self.watch_set))
+        self.executor = executor
+        self.board = board
+
+        # 狀態
+        self.position_prices = {}   # code -> lastPrice
+        self.position_vol = {}      # code -> {inside, outside}
+        self.signal_prices = {}     # code -> lastPrice
+        self.signal_vol = {}        # code -> {inside, outside}
+        self.holding_status = {}    # code -> status["holdings"] 項目
+        self.actions_taken = []     # (code, action, pos)：已排入委託（或無 executor 時已記錄）的觸發
+        self._acted = set()
+        self.latency = LatencyStats()   # tick → 判斷延遲
+        self.lock = threading.Lock()    # 修改 status / 持倉股數時持有（狀態檔寫入執行緒持鎖複製）
+
+        # 產出結構
+        self.status = {
+            "checked_at": clock().strftime("%Y-%m-%d %H:%M:%S"),
+            "holdings": [],
+            "signals": [],
+            "has_action": False,
+        }
 
-    # 觀察名單（排除已有部位的）
-    holding_codes = set(h["code"] for h in holdings)
-    watchlist_codes = [
-        w["code"] for w in watchlist
-        if w.get("code") not in holding_codes
-    ]
-
-    log(f"INFO: 持倉: {[h['code'] for h in holdings]}")
-    log(f"INFO: 觀察名單: {watchlist_codes}")
-
-    # ── 連線 1：持倉監控（最多 5 檔）───────────────────────────────
-    ws_positions = WebSocketManager(sdk, "positions")
-
-    # ── 連線 2：觀察名單監控（最多 200 檔）───────────────────────
-    ws_watchlist = WebSocketManager(sdk, "watchlist")
-
-    # 狀態
-    position_prices = {}   # code -> lastPrice
-    position_vol = {}      # code -> {inside, outside}
-    signal_prices = {}     # code -> lastPrice
-    signal_vol = {}        # code -> {inside, outside}
-
-    # 產出結構
-    status = {
-        "checked_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "holdings": [],
-        "signals": [],
-        "has_action": False,
-    }
-
-    # ── 預先載入 MA 資料（HTTP API）───────────────────────────────
-    all_codes = list(set(watchlist_codes + list(holding_codes)))
-    ma_cache = preload_ma_data(sdk, all_codes)
-
-    signal_checker = SignalChecker(sdk, ma_cache)
-    pos_monitor = PositionMonitor()
-
-    actions_taken = []
-
-    # ── Tick 處理（持倉連線）────────────────────────────────────
-    def on_position_tick(msg: dict):
+        # 觸價索引：停損 / 目標 / 進場門檻啟動時算好，tick 只查表比較
+        # 進場規則：MA5 > MA20 且 現價 > MA5
+        # - 盤中 MA：兩條件對現價是線性的，門檻 max((S19-4·S4)/3, S4/4) 整天固定
+        # - 只有 API 昨日 MA 的股票：MA5 > MA20 時，現價 > MA5
+        self.triggers = TriggerIndex()
+        for h in holdings:
+            self.triggers.add_position(h["code"], h["stop"], h["target"], h)
+        for sym in watchlist_codes:
+            if sym in self.live_ma:
+                self.triggers.set_entry(sym, self.live_ma.entry_threshold(sym))
+                continue
+            ma = self.ma_cache.get(sym)
+            if ma and ma["ma5"] > ma["ma20"]:
+                self.triggers.set_entry(sym, ma["ma5"])
+        # 接近符合：今日收盤落在 price_min < 價 < price_max 即通過六條件（量另需 ≥ volume_min_lots 張）
+        # 盤中高低超出 H8/L8 時條件5 上限會移動，索引上限放寬到漲停，觸價後由 _whatif_ok 以實際高低判斷
+        for sym, row in self.near_miss.items():
+            if row.get("price_min") is not None and row.get("price_max") is not None:
+                hi = row["prev_close"] * (1 + whatif_solver.LIMIT_PCT) if row.get("prev_close") else row["price_max"]
+                self.triggers.set_entry(sym, row["price_min"], max(hi, row["price_max"]))
+
+    def route(self, dispatcher: TickDispatcher):
+        """把持倉 / 觀察名單的 handler 登記到 dispatcher"""
+        for code in self.holding_codes:
+            dispatcher.route(code, self.on_position_tick)
+        for code in self.watch_set:
+            dispatcher.route(code, self.on_watchlist_tick)
+
+    def publish(self):
+        if self.writer is not None:
+            self.writer.publish(self.status, self.lock)
+
+    def _on_trade(self, tick: dict, last: float):
+        """記錄 tick 並併入分K、更新價格看板（試撮不計），回傳該檔累計內外盤量"""
+        sym = tick["symbol"]
+        if self.recorder is not None:
+            self.recorder.record(tick["time"], sym, last, tick["volume"])
+        if not tick["trial"] and last:
+            ts = tick["time"] or int(self.clock().timestamp() * 1_000_000)
+            self.bars.update(sym, ts, last, tick["volume"], tick["bid"], tick["ask"], tick["size"])
+            if self.board is not None:
+                self.board.update(sym, last, tick["volume"], ts)
+        return self.bars.volume_split(sym)
+
+    def _whatif_ok(self, sym: str, row: dict, last: float, cum_volume: int) -> bool:
+        """
+        接近符合：累計量 ≥ volume_min_lots，且現價在通過區間（條件5 上限以盤中實際高低重算）
+        cum_volume 是 trades 的累計量（張）；whatif 的 volume_min 來自日K（股），比對用張數
+        """
+        if row.get("volume_min_lots") is not None and cum_volume < row["volume_min_lots"]:
+            return False
+        if any(row.get(k) is None for k in ("h8", "l8", "rsv_max", "prev_close")):
+            return row["price_min"] < last < row["price_max"]
+        high, low = self.bars.day_range(sym)
+        return whatif_solver.price_ok(row, last, high, low)
+
+    def _add_signal(self, sym: str, kind: str, price: float, data: dict):
+        if self.db is not None:
+            self.db.add_signal(sym, kind, price, data, source="monitor_websocket")
+
+    # ── Tick 處理（持倉）────────────────────────────────────
+    def on_position_tick(self, msg: dict):
+        t0 = time.perf_counter_ns()
         tick = parse_tick(msg)
         if not tick:
             return
         sym = tick["symbol"]
-        if sym not in holding_codes:
+        trig = self.triggers.get(sym)
+        if trig is None or trig.position is None:
             return
 
         last = float(tick["lastPrice"] or 0)
-        position_prices[sym] = last
+        self.position_vol[sym] = self._on_trade(tick, last)
+        self.position_prices[sym] = last
+        pos = trig.position
 
-        # 找持倉
-        pos = next((p for p in holdings if p["code"] == sym), None)
-        if not pos:
-            return
-
-        if not is_market_open():
+        if not is_market_open(self.clock()):
             return  # 模擬盤時間（08:30-09:00）不交易
-        
-        action = pos_monitor.check(pos, last)
-        if action:
-            # 模擬盤時間不停損/不了結，僅記錄
-            log(f"INFO: {sym} 達到 {action} 條件（模擬盤，暫不執行）現價={last}")
-            action = None  # 清除行動
+
+        action = trig.check(last) if last else None
+        self.latency.add(time.perf_counter_ns() - t0)
+        with self.lock:
+            qty = pos.get("qty", 1)     # 部分成交時由委託執行緒減少（持鎖）
         pos_entry = {
             "code": sym,
             "name": pos.get("name", sym),
             "entry": pos["entry"],
-            "qty": pos.get("qty", 1),
+            "qty": qty,
             "last": last,
             "pnl": round((last - pos["entry"]) / pos["entry"] * 100, 2) if pos["entry"] else 0,
             "stop": pos["stop"],
             "target": pos["target"],
             "action": action,
+            **self.bars.snapshot(sym),
+            "bar_1m": self.bars.latest(sym, 1),
+            "bar_5m": self.bars.latest(sym, 5),
         }
 
-        # 移除舊的，加入新的
-        status["holdings"] = [p for p in status["holdings"] if p["code"] != sym]
-        status["holdings"].append(pos_entry)
+        # 覆蓋該檔的狀態
+        with self.lock:
+            self.holding_status[sym] = pos_entry
+            self.status["holdings"] = list(self.holding_status.values())
+            if action:
+                self.status["has_action"] = True
 
         if action:
-            log(f"INFO: {sym} 觸發 {action}！現價={last} 停損={pos['stop']} 目標={pos['target']}")
-            status["has_action"] = True
-            actions_taken.append((sym, action, pos))
+            # 每次觸價都會回來；executor 依股票去重（失敗的委託才重送）
+            if self.executor is not None:
+                accepted = self.executor.request(sym, action, qty, last, signal_ns=t0, data=pos)
+            else:
+                accepted = sym not in self._acted
+            if accepted:
+                self._acted.add(sym)
+                self.log(f"INFO: {sym} 觸發 {action}！現價={last} 停損={pos['stop']} 目標={pos['target']}")
+                self.actions_taken.append((sym, action, pos))
 
-        write_status(status)
+        self.publish()
 
-    # ── Tick 處理（觀察名單連線）────────────────────────────────
-    def on_watchlist_tick(msg: dict):
+    # ── Tick 處理（觀察名單 / 接近符合）────────────────────────
+    def on_watchlist_tick(self, msg: dict):
+        t0 = time.perf_counter_ns()
         tick = parse_tick(msg)
         if not tick:
             return
         sym = tick["symbol"]
-        if sym not in watchlist_codes:
+        if sym not in self.watch_set:
             return
 
         last = float(tick["lastPrice"] or 0)
-        signal_prices[sym] = last
+        self.signal_vol[sym] = self._on_trade(tick, last)
+        self.signal_prices[sym] = last
+        self.live_ma.update(sym, last)
 
-        if not is_market_open():
+        if not is_market_open(self.clock()):
             return  # 模擬盤時間（08:30-09:00）不進場
-        
-        result = signal_checker.check_entry(sym, last)
-        if result and result["signal"]:
-            log(f"INFO: 進場信號！{sym} 現價={last} MA5={result['ma5']:.2f} MA20={result['ma20']:.2f}")
-
-            # 更新 signals
-            status["signals"] = [s for s in status["signals"] if s["code"] != sym]
-            status["signals"].append({
+
+        status = self.status
+        action = self.triggers.check(sym, last)
+        self.latency.add(time.perf_counter_ns() - t0)
+        if action == "ENTRY" and sym in self.near_miss:
+            row = self.near_miss[sym]
+            if (all(s["code"] != sym for s in status["signals"])
+                    and self._whatif_ok(sym, row, last, tick["volume"] or 0)):
+                self.log(f"INFO: 接近符合股票進入通過區間 {sym} 現價={last} "
+                    f"區間=({row['price_min']}, {row['price_max']}) 需量≥{row.get('volume_min_lots')}張")
+                entry = {
+                    "code": sym,
+                    "price": last,
+                    "price_min": row["price_min"],
+                    "price_max": row["price_max"],
+                    "volume_min_lots": row.get("volume_min_lots"),
+                    **self.bars.snapshot(sym),
+                    "note": "量已足，收盤維持此價即通過六條件（whatif）",
+                }
+                with self.lock:
+                    status["signals"].append(entry)
+                self.publish()
+                self._add_signal(sym, "WHATIF", last, entry)
+        elif action == "ENTRY":
+            result = self.live_ma.snapshot(sym)
+            if result is None:
+                ma = self.ma_cache[sym]
+                result = {"ma5": ma["ma5"], "ma20": ma["ma20"], "gap_pct": (ma["ma20"] - ma["ma5"]) / ma["ma20"] * 100}
+            self.log(f"INFO: 進場信號！{sym} 現價={last} MA5={result['ma5']:.2f} MA20={result['ma20']:.2f}")
+
+            # 更新 signals（每檔當次執行第一次出現時寫入結果庫）
+            is_new = all(s["code"] != sym for s in status["signals"])
+            entry = {
                 "code": sym,
                 "price": last,
                 "ma5": result["ma5"],
                 "ma20": result["ma20"],
                 "gap_pct": round(result["gap_pct"], 3),
-                "note": "MA5>MA20 且 現價>MA5",
-            })
-            write_status(status)
+                **self.bars.snapshot(sym),
+                "note": "MA5>MA20 且 現價>MA5" + ("（盤中MA）" if sym in self.live_ma else "（昨日MA）"),
+            }
+            with self.lock:
+                status["signals"] = [s for s in status["signals"] if s["code"] != sym] + [entry]
+            self.publish()
+            if is_new:
+                self._add_signal(sym, "ENTRY", last, entry)
+
+    # ── 背景補查的 MA 到達：加入觸價索引並寫回快取 ─────────────
+    def on_ma_ready(self, sym: str, ma: dict):
+        self.ma_cache[sym] = ma
+        if sym in self.watchlist_set and ma["ma5"] > ma["ma20"]:
+            self.triggers.set_entry(sym, ma["ma5"])
+        if self.db is not None:
+            self.db.save_ma_cache([dict(ma, code=sym)], source="monitor_websocket")
+
+# ── 主程式 ─────────────────────────────────────────────────────────────────
+def main():
+    log("=" * 60)
+    log("🌙 盤中 WebSocket 監控系統啟動")
+    log("=" * 60)
+
+    # 初始化 SDK
+    sdk = init_sdk()
+    atexit.register(lambda: logout_sdk(sdk))
+    log("✅ SDK 登入成功")
+
+    # 載入 watchlist
+    db = ResultsStore(RESULTS_DB)
+    wl_data = load_watchlist(db)
+    holdings = parse_holdings(wl_data.get("holdings", {}))
+    watchlist = wl_data.get("watchlist", [])
+
+    # 觀察名單（排除已有部位的）
+    holding_codes = set(h["code"] for h in holdings)
+    watchlist_codes = [
+        w["code"] for w in watchlist
+        if w.get("code") not in holding_codes
+    ]
+    watchlist_set = set(watchlist_codes)
+
+    # 策略A 接近符合股票（前一交易日收盤後解出的明日門檻，明日有機會通過者）
+    near_miss = {code: row for code, row in db.load_whatif_latest(before=date.today().isoformat()).items()
+                 if code not in holding_codes and code not in watchlist_set}
+
+    log(f"INFO: 持倉: {[h['code'] for h in holdings]}")
+    log(f"INFO: 觀察名單: {watchlist_codes}")
+    log(f"INFO: 接近符合: {len(near_miss)} 檔")
+
+    # ── 收訊 → 判斷佇列：SDK 收訊執行緒只排入，tick 處理在 worker 執行緒 ──
+    tick_queue = TickQueue(TICK_QUEUE_SIZE, TICK_QUEUE_POLICY, TICK_BATCH,
+                           on_error=lambda e: log(f"ERROR: tick 處理錯誤: {e}"))
+
+    # ── 連線池：持倉 + 觀察名單 + 接近符合，超過單一連線上限時自動分片 ──
+    dispatcher = TickDispatcher()
+    pool = ConnectionPool(lambda i: new_connection(i), dispatcher, log=log)
+
+    # 每筆 tick 寫入當日紀錄檔（緩衝後由背景執行緒寫出，可事後重播）
+    recorder = TickRecorder()
+    # 最新成交價寫入共享記憶體看板（其他程序直接讀，不必查 intraday.quote）
+    board = PriceBoard(create=True)
+    # 狀態檔由背景執行緒合併寫入（tick 回呼只登記，不做檔案 I/O）
+    writer = StatusWriter(STATUS_FILE, STATUS_INTERVAL_MS, on_error=lambda e: log(f"ERROR: 狀態檔寫入失敗: {e}"))
+
+    # ── 盤中 MA：本地日K庫有前19日收盤的股票即時計算，其餘才查 HTTP API ──
+    all_codes = list(set(watchlist_codes + list(holding_codes) + list(near_miss)))
+    live_ma = IntradayMA.from_store(CandleStore(CANDLE_DIR, readonly=True), all_codes)
+    misses = [c for c in all_codes if c not in live_ma]
+    if live_ma.stale:
+        log(f"WARNING: 日K庫缺前一交易日，{len(live_ma.stale)} 檔不用盤中 MA（改用快取 / API）")
+    # 其次用結果庫的 MA 快取（screener 收盤後 / premarket_check 盤前寫入）
+    ma_cache = db.load_ma_cache(misses)
+    misses = [c for c in misses if c not in ma_cache]
+    log(f"INFO: 盤中 MA 由日K庫計算 {len(live_ma)} 檔，快取 {len(ma_cache)} 檔，"
+        f"訂閱後背景查詢 API {len(misses)} 檔")
+
+    # 停損 / 目標：tick handler 排入委託，由 executor 非同步送單（每檔去重、狀態寫入結果庫）；
+    # 全部成交才移除觸價，部分成交只減少持倉股數
+    def on_filled(order):
+        session.triggers.remove_position(order["code"])
+
+    def on_partial(order, remaining):
+        trig = session.triggers.get(order["code"])
+        if trig is not None and trig.position is not None:
+            with session.lock:      # tick 執行緒同時在讀 qty
+                trig.position["qty"] = remaining
+
+    executor = OrderExecutor(lambda o: place_market_sell(sdk, o["code"], o["qty"]),
+                             lambda o: query_order(sdk, o["order_no"]), db=db, log=log,
+                             on_filled=on_filled, on_partial=on_partial)
+
+    session = MonitorSession(holdings, watchlist_codes, near_miss, live_ma, ma_cache,
+                             db=db, recorder=recorder, writer=writer, executor=executor, board=board)
+    status = session.status
+    # session 建好才啟動：重啟時讀回的 ACKED 委託可能很快查到成交並呼叫 on_filled / on_partial
+    executor.start()
 
     # ── 連線並訂閱 ──────────────────────────────────────────────
-    # 連線 1：持倉監控
-    if holdings:
-        if ws_positions.connect():
-            for h in holdings[:5]:  # 最多 5 檔
-                ws_positions.subscribe({"channel": "trades", "symbol": h["code"]})
-            ws_positions.add_handler("message", on_position_tick)
-            log(f"INFO: 持倉監控已訂閱 {len(holdings[:5])} 檔")
-        else:
-            log("ERROR: 持倉 WebSocket 連線失敗")
-    else:
-        log("📋 無持倉，跳過持倉連線")
-
-    # 連線 2：觀察名單
-    if watchlist_codes:
-        if ws_watchlist.connect():
-            # 分批訂閱（每批 50 檔，避免單次太多）
-            batch = 50
-            for i in range(0, min(len(watchlist_codes), 200), batch):
-                batch_codes = watchlist_codes[i:i+batch]
-                for code in batch_codes:
-                    ws_watchlist.subscribe({"channel": "trades", "symbol": code})
-                log(f"INFO: 觀察名單已訂閱 {len(batch_codes)} 檔")
-            ws_watchlist.add_handler("message", on_watchlist_tick)
-        else:
-            log("ERROR: 觀察名單 WebSocket 連線失敗")
+    tick_queue.start(lambda item: item[0](item[1]))
+
+    # 重連成功（訂閱已由連線自行重送）：補回斷線期間的成交，經同一個 dispatcher 派發
+    def on_disconnected(conn):
+        # 斷線當下保存起點：重連後訂閱已重送，即時成交會把 last_time 往後推
+        syms = pool.symbols_of(conn)
+        conn.gap_since = {s: dispatcher.last_time.get(s, conn.disconnected_at) for s in syms}
+        dispatcher.begin_gap(syms)
+
+    def on_reconnected(conn):
+        until = int(time.time() * 1_000_000)
+        since = {s: conn.gap_since.get(s, conn.disconnected_at) for s in pool.symbols_of(conn)}
+        syms = sorted(since, key=lambda s: s not in holding_codes)  # 持倉優先
+        dispatcher.begin_gap(syms)
+        dropped = tick_queue.dropped
+        # 補資料一次湧入，佇列滿時等待（drop_oldest 會丟掉最舊的補資料，含停損價位的成交）
+        n = gap_fill(sdk, syms, since, until, emit=lambda m: tick_queue.put((dispatcher.dispatch, m), block=True))
+        tick_queue.put((dispatcher.end_gap, syms), block=True)    # 排在補資料之後，派發完才停止去重
+        dropped = tick_queue.dropped - dropped
+        gap = (until - conn.disconnected_at) / 1e6 if conn.disconnected_at else 0
+        log(f"INFO: [{conn.name}] 斷線 {gap:.1f} 秒，補回 {n} 筆成交（{len(syms)} 檔）"
+            + (f"，期間佇列丟棄 {dropped} 筆" if dropped else ""))
+
+    def new_connection(i):
+        conn = WebSocketManager(sdk, f"ws{i}", tick_queue, new_stock_client(sdk, i))
+        conn.on_disconnected = on_disconnected
+        conn.on_reconnected = on_reconnected
+        return conn
+
+    session.route(dispatcher)
+    # 訂閱優先順序：持倉 → 觀察名單 → 接近符合（超過連線池總容量時從尾端捨棄）
+    ordered = [h["code"] for h in holdings] + watchlist_codes + list(near_miss)
+    if ordered:
+        pool.subscribe_all(ordered)
+        log(f"INFO: 已訂閱 {len(pool.assign)} 檔（持倉 {len(holdings)}、觀察 {len(watchlist_codes)}、"
+            f"接近符合 {len(near_miss)}），{len(pool.conns)} 條連線 {pool.metrics()['per_connection']}")
     else:
-        log("📋 無觀察名單，跳過")
-
-    # ── 執行買賣 ────────────────────────────────────────────────
-    if actions_taken:
-        log(f"INFO: 執行 {len(actions_taken)} 筆交易...")
-        for sym, action, pos in actions_taken:
-            if action in ("STOP_LOSS", "TARGET"):
-                log(f"  {'🛑' if action=='STOP_LOSS' else '🏠'} {action} {sym}")
-                place_market_sell(sdk, sym, pos.get("qty", 1))
-
-                # 更新 watchlist.json 的 holdings
-                if sym in holdings_raw:
-                    holdings_raw[sym]["entry_price"] = 0
-                    holdings_raw[sym]["is_holding"] = False
-    else:
-        log("✅ 無需要執行的交易")
+        log("📋 無持倉與觀察名單，跳過訂閱")
+
+    # ── 背景補查快取沒有的 MA（不擋訂閱；取得後即時加入觸價索引並寫回快取）──
+    if misses:
+        threading.Thread(target=preload_ma_data, args=(sdk, misses), kwargs={"on_ready": session.on_ma_ready},
+                         name="ma-preload", daemon=True).start()
 
     # ── 定期寫入狀態 ─────────────────────────────────────────────
     # 讓 WebSocket 運行一段時間（主動中斷時結束）
     log("INFO: WebSocket 監控運行中（等待訊息，按 Ctrl-C 結束）...")
+    last_rebalance = time.monotonic()
     try:
         while True:
             time.sleep(5)
-            # 更新狀態時間戳
-            status["checked_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            write_status(status)
-
-            # 檢查持倉連線狀態
-            if holdings and not ws_positions.connected:
-                log("⚠️ 持倉連線已斷線，嘗試重連...")
-                if not ws_positions.reconnect():
-                    break
-                for h in holdings[:5]:
-                    ws_positions.subscribe({"channel": "trades", "symbol": h["code"]})
-                ws_positions.add_handler("message", on_position_tick)
-
-            if watchlist_codes and not ws_watchlist.connected:
-                log("⚠️ 觀察名單連線已斷線，嘗試重連...")
-                if not ws_watchlist.reconnect():
-                    break
-                for code in watchlist_codes[:200]:
-                    ws_watchlist.subscribe({"channel": "trades", "symbol": code})
-                ws_watchlist.add_handler("message", on_watchlist_tick)
+            board.heartbeat()
+            # 更新狀態時間戳（先算好再持鎖寫入，tick 執行緒同時在改 status）
+            stats = {
+                "checked_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "latency": session.latency.summary(),
+                "status_writer": writer.stats(),
+                "tick_queue": tick_queue.metrics(),
+                "ws_pool": pool.metrics(),
+                "tick_recorder": recorder.stats(),
+                "orders": executor.metrics(),
+            }
+            with session.lock:
+                status.update(stats)
+            writer.publish(status, session.lock)
+
+            # 訊息頻率不均時重新分配連線
+            if time.monotonic() - last_rebalance >= REBALANCE_INTERVAL:
+                pool.rebalance()
+                last_rebalance = time.monotonic()
+
+            # 檢查連線狀態：重連在背景執行緒進行，不阻塞主迴圈；非交易時段重連失敗才結束
+            for conn in pool.conns:
+                if not conn.connected and conn.start_reconnect():
+                    log(f"⚠️ 連線 {conn.name} 已斷線，背景重連中...")
+            if any(conn.gave_up for conn in pool.conns):
+                break
 
     except KeyboardInterrupt:
         log("\n🛑 收到中斷訊號，結束監控...")
 
     finally:
-        # 更新 watchlist.json
+        tick_queue.stop()
+        log(f"INFO: tick 佇列 {tick_queue.metrics()}")
+        executor.close()
+        log(f"INFO: 委託 {executor.metrics()}")
+        recorder.close()
+        log(f"INFO: tick 紀錄 {recorder.stats()}")
+        board.close()
+        log(f"INFO: tick → 判斷延遲 {session.latency.summary()}")
+        writer.close()
+        log(f"INFO: 狀態檔寫入 {writer.stats()}")
+
+        # 持倉已即時寫入結果庫；匯出 tracking_list.json 給舊工具
         try:
-            with open(WATCHLIST_FILE) as f:
-                wl_data_current = json.load(f)
-            wl_data_current["holdings"] = holdings_raw
-            wl_data_current["last_updated"] = datetime.now().isoformat()
-            with open(WATCHLIST_FILE, "w") as f:
-                json.dump(wl_data_current, f, ensure_ascii=False, indent=2)
-            log("✅ watchlist.json 已更新")
+            db.export_tracking(WATCHLIST_FILE)
+            log("✅ tracking_list.json 已匯出")
         except Exception as e:
-            log(f"INFO: watchlist 更新失敗: {e}")
+            log(f"INFO: tracking_list.json 匯出失敗: {e}")
+        db.close()
 
         # 結束連線
-        ws_positions.disconnect()
-        ws_watchlist.disconnect()
+        pool.disconnect_all()
         logout_sdk(sdk)
         log("👋 WebSocket 監控系統已結束")
 
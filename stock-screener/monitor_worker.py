@@ -2,10 +2,13 @@
 """
 盤中交易監控 Worker（由 Cron 呼叫）
 每5分鐘檢查一次，寫入狀態檔
+現價優先讀 monitor_websocket 的共享記憶體價格看板（price_board），監控沒在跑時才查 intraday.quote
 """
 import sys, json
 sys.path.insert(0, '/home/admin/.openclaw/workspace/fubon_sdk_complete')
 from fubon_complete import FubonComplete
+from status_writer import write_atomic
+from price_board import read_prices
 from datetime import datetime
 
 STATUS_FILE = "/tmp/trading_status.json"
@@ -18,9 +21,10 @@ def load_watchlist():
     except:
         return []
 
-def get_holdings(fc):
-    """用 unrealized_gains_and_loses 取得實際持倉"""
+def get_holdings(fc, live=None):
+    """用 unrealized_gains_and_loses 取得實際持倉（live：價格看板的現價，有的話取代由未實現損益反推的價格）"""
     holdings = []
+    live = live or {}
     try:
         result = fc.sdk.accounting.unrealized_gains_and_loses(account=fc.account)
         if result.is_success and result.data:
@@ -30,6 +34,8 @@ def get_holdings(fc):
                 qty = int(h.tradable_qty)
                 unreal = float(getattr(h, 'unrealized_profit', 0) or getattr(h, 'unrealized_loss', 0) or 0)
                 last_price = entry + unreal / qty if qty > 0 else entry
+                if sym in live:
+                    last_price = live[sym]['price']
                 stop = round(entry * 0.95, 2)
                 target = round(entry * 1.10, 2)
                 pnl = (last_price - entry) / entry * 100 if entry > 0 else 0
@@ -52,16 +58,20 @@ def get_holdings(fc):
         print(f"持倉查詢錯誤: {e}")
     return holdings
 
-def check_watchlist(fc, watchlist, holdings_codes):
-    """檢查觀察名單進場信號（排除已有持倉的）"""
+def check_watchlist(fc, watchlist, holdings_codes, live=None):
+    """檢查觀察名單進場信號（排除已有持倉的；live 沒有的股票才查 intraday.quote）"""
     signals = []
+    live = live or {}
     for w in watchlist:
         sym = w['code']
         if sym in holdings_codes:
             continue
         try:
-            q = fc.sdk.marketdata.rest_client.stock.intraday.quote(symbol=sym)
-            last = q.get('lastPrice', 0)
+            if sym in live:
+                last = live[sym]['price']
+            else:
+                q = fc._rest("intraday", fc.sdk.marketdata.rest_client.stock.intraday.quote, symbol=sym)
+                last = q.get('lastPrice', 0)
             if not last or last <= 0:
                 continue
             sma5 = fc.get_sma(sym, 5)
@@ -99,7 +109,7 @@ def check_watchlist(fc, watchlist, holdings_codes):
 
 def main():
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    fc = FubonComplete()
+    fc = FubonComplete(caller="monitor_worker")
     fc._load_config()
     ok = fc.login()
     if not ok:
@@ -107,9 +117,12 @@ def main():
         return
 
     watchlist = load_watchlist()
-    holdings = get_holdings(fc)
+    # 價格看板：monitor_websocket 執行中時直接讀共享記憶體（監控沒在跑時為空）
+    live = read_prices()
+    holdings = get_holdings(fc, live)
     holdings_codes = {h['code'] for h in holdings}
-    signals = check_watchlist(fc, watchlist, holdings_codes)
+    signals = check_watchlist(fc, watchlist, holdings_codes, live)
+    quoted = sum(1 for w in watchlist if w['code'] not in holdings_codes and w['code'] not in live)
 
     status = {
         'checked_at': now,
@@ -118,10 +131,9 @@ def main():
         'has_action': bool(holdings and any(h.get('action') for h in holdings)) or bool(signals)
     }
 
-    with open(STATUS_FILE, 'w') as f:
-        json.dump(status, f, ensure_ascii=False, indent=2)
+    write_atomic(STATUS_FILE, status)
 
-    print(f"[{now}] 監控完成")
+    print(f"[{now}] 監控完成（價格看板 {len(live)} 檔，查報價 {quoted} 檔）")
     if holdings:
         for h in holdings:
             act = f"→ {h['action']}" if h.get('action') else ""
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+OrderExecutor - 盤中停損 / 目標的即時下單
+==========================================
+tick handler 偵測到 STOP_LOSS / TARGET 時呼叫 request()，只排入佇列就返回；
+worker 執行緒取出後交給送單執行緒池（place_market_sell 是阻塞的 REST 呼叫），
+委託回報在送單執行緒回來後處理：
+
+- 每檔去重：同一檔已有排隊 / 送出中 / 已委託 / 已全部成交的委託時，後續觸價一律忽略（不會重複賣出）；
+  送單失敗的委託在下次觸價時重送，最多 MAX_ATTEMPTS 次
+- 委託成功（ACKED）不等於成交：市價 IOC 單可能只成交一部分或完全沒成交。
+  worker 每 FILL_POLL_INTERVAL 秒以 query(order) 查詢 ACKED 委託的累計成交股數，委託結束後：
+    全部成交  FILLED    寫 signals、結果庫持倉標記賣出，呼叫 on_filled（monitor 移除觸價索引的持倉）
+    部分成交  PARTIAL   呼叫 on_partial 減少持倉股數（觸價保留），剩餘股數立即重送
+    未成交    UNFILLED  同股數立即重送
+  重送同樣受 MAX_ATTEMPTS 限制；用完時持倉與觸價保留，記 ERROR 待人工處理
+- 狀態每次變化寫入結果庫 orders 表；重啟時讀回當日委託：ACKED 的繼續查成交，
+  SUBMITTED（回報未知）與 FILLED 的股票不再下單
+- 延遲：信號（tick 進入 handler）→ 送單、送單 → 回報，各自以 LatencyStats 統計，並記在每筆委託上
+
+submit(order) 回傳 SDK 的委託結果（None / is_success=False 視為失敗，例外亦同）；
+query(order) 回傳 (累計成交股數, 委託是否已結束)，查詢失敗時丟例外（下次再查）。
+
+用法：
+  executor = OrderExecutor(lambda o: place_market_sell(sdk, o["code"], o["qty"]),
+                           lambda o: query_order(sdk, o["order_no"]), db=db, log=log)
+  executor.start()
+  executor.request("2330", "STOP_LOSS", qty=1, price=570.0, signal_ns=time.perf_counter_ns())
+  executor.metrics()
+  executor.close()
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from trigger_index import LatencyStats
+
+SUBMIT_WORKERS = 4       # 同時在途的送單 / 查詢數
+MAX_ATTEMPTS = 3         # 同一檔最多送單次數（含第一次與未成交 / 部分成交的重送）
+FILL_POLL_INTERVAL = 0.5 # ACKED 委託的成交查詢間隔（秒）
+ACTIVE_STATES = ("QUEUED", "SUBMITTED", "ACKED", "FILLED")
+
+
+def _accepted(result) -> bool:
+    """SDK 委託結果是否成功（Fubon Result 有 is_success；其他非 None 物件視為成功）"""
+    return result is not None and bool(getattr(result, "is_success", True))
+
+
+def _order_no(result):
+    data = getattr(result, "data", None)
+    return getattr(data, "order_no", None) or getattr(result, "order_no", None)
+
+
+class OrderExecutor:
+    """佇列 + 每檔去重 + 非同步送單 + 回報 / 成交追蹤"""
+
+    def __init__(self, submit, query=None, db=None, log=print, on_filled=None, on_partial=None,
+                 workers: int = SUBMIT_WORKERS, max_attempts: int = MAX_ATTEMPTS, day: str = None,
+                 poll_interval: float = FILL_POLL_INTERVAL):
+        self.submit = submit
+        self.query = query
+        self.db = db
+        self.log = log
+        self.on_filled = on_filled
+        self.on_partial = on_partial
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.day = day or date.today().isoformat()
+        self._queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="order-submit")
+        self._lock = threading.Lock()
+        self._thread = None
+        self._polling = set()     # 查詢中的委託 id
+        self._polled_at = {}      # 委託 id → 上次查詢時間（monotonic）
+        self.orders = {}          # id → 委託
+        self.latest = {}          # code → 最新一筆委託（去重依據）
+        self.submit_latency = LatencyStats()   # 信號 → 送單
+        self.ack_latency = LatencyStats()      # 送單 → 回報
+        self.duplicates = 0
+        self._restore()
+
+    def _restore(self):
+        """讀回當日委託：ACKED 繼續查成交；回報未知 / 已成交的股票不再下單（QUEUED 未送出，視為失敗可重送）"""
+        if self.db is None:
+            return
+        for o in self.db.load_orders(self.day):
+            o.setdefault("filled_qty", 0)
+            if o["state"] == "QUEUED":
+                o["error"] = "重啟前未送出"
+                self._set_state(o, "FAILED")
+            self.orders[o["id"]] = o
+            self.latest[o["code"]] = o
+        pending = [c for c, o in self.latest.items() if o["state"] == "SUBMITTED"]
+        if pending:
+            self.log(f"WARNING: 上次執行有 {len(pending)} 筆委託未收到回報，不重送，請人工確認: {pending}")
+
+    # ========================
+    # tick 執行緒
+    # ========================
+
+    def request(self, code: str, action: str, qty: int = 1, price: float = None, signal_ns: int = None,
+                data: dict = None) -> bool:
+        """排入一筆賣出委託；同一檔已有進行中 / 已成交的委託或送單次數用完時回傳 False"""
+        with self._lock:
+            prev = self.latest.get(code)
+            if prev is not None and (prev["state"] in ACTIVE_STATES or prev["attempt"] >= self.max_attempts):
+                self.duplicates += 1
+                return False
+            self._enqueue(code, action, qty, price, signal_ns, data, prev["attempt"] + 1 if prev else 1)
+        return True
+
+    def _enqueue(self, code, action, qty, price, signal_ns, data, attempt):
+        """建立委託並排入佇列（呼叫端持有 _lock）"""
+        order = {
+            "id": f"{self.day}-{code}-{attempt}",
+            "date": self.day,
+            "code": code,
+            "action": action,
+            "qty": qty,
+            "filled_qty": 0,
+            "price": price,
+            "attempt": attempt,
+            "state": "QUEUED",
+            "signal_at": datetime.now().isoformat(timespec="milliseconds"),
+            "data": data,
+        }
+        self.orders[order["id"]] = order
+        self.latest[code] = order
+        self._queue.put((order, signal_ns or time.perf_counter_ns()))
+
+    # ========================
+    # worker / 送單執行緒
+    # ========================
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="order-executor", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                self._send(*item)
+            self._poll_fills()
+
+    def _send(self, order: dict, signal_ns: int):
+        t_submit = time.perf_counter_ns()
+        order["submit_ms"] = round((t_submit - signal_ns) / 1e6, 3)
+        order["submitted_at"] = datetime.now().isoformat(timespec="milliseconds")
+        self.submit_latency.add(t_submit - signal_ns)
+        self._set_state(order, "SUBMITTED")
+        future = self._pool.submit(self.submit, order)
+        future.add_done_callback(lambda f, o=order, t=t_submit: self._on_ack(o, t, f))
+
+    def _on_ack(self, order: dict, t_submit: int, future):
+        now = time.perf_counter_ns()
+        order["ack_ms"] = round((now - t_submit) / 1e6, 3)
+        self.ack_latency.add(now - t_submit)
+        try:
+            result = future.result()
+            error = None if _accepted(result) else (getattr(result, "message", None) or "委託失敗")
+        except Exception as e:
+            result, error = None, str(e)
+        code = order["code"]
+        if error is None:
+            # 委託成功只代表交易所接受，成交股數由 _poll_fills 確認後才處理持倉
+            order["order_no"] = _order_no(result)
+            order["result"] = str(result)
+            self._set_state(order, "ACKED")
+            self.log(f"INFO: {code} {order['action']} 委託成功 單號={order['order_no']} "
+                     f"信號→送單 {order['submit_ms']}ms 回報 {order['ack_ms']}ms")
+        else:
+            order["error"] = error
+            self._set_state(order, "FAILED")
+            left = self.max_attempts - order["attempt"]
+            self.log(f"ERROR: {code} {order['action']} 委託失敗（第 {order['attempt']} 次）: {error}"
+                     + (f"，下次觸價重送（剩 {left} 次）" if left > 0 else "，不再重送"))
+
+    # ========================
+    # 成交確認
+    # ========================
+
+    def _poll_fills(self):
+        """對每筆 ACKED 且未在查詢中的委託送出一次成交查詢"""
+        if self.query is None:
+            return
+        now = time.monotonic()
+        for order in list(self.orders.values()):
+            oid = order["id"]
+            if (order["state"] == "ACKED" and oid not in self._polling
+                    and now - self._polled_at.get(oid, 0) >= self.poll_interval):
+                self._polling.add(oid)
+                self._polled_at[oid] = now
+                future = self._pool.submit(self.query, order)
+                future.add_done_callback(lambda f, o=order: self._on_query(o, f))
+
+    def _on_query(self, order: dict, future):
+        try:
+            filled, done = future.result()
+        except Exception as e:
+            self.log(f"WARNING: {order['code']} 委託 {order.get('order_no')} 成交查詢失敗: {e}")
+            filled, done = order["filled_qty"], False
+        order["filled_qty"] = max(order["filled_qty"], int(filled or 0))
+        if done or order["filled_qty"] >= order["qty"]:
+            self._finish(order)
+        self._polling.discard(order["id"])
+
+    def _finish(self, order: dict):
+        """委託結束：依成交股數處理持倉，未成交部分重送"""
+        code, filled, qty = order["code"], order["filled_qty"], order["qty"]
+        if filled >= qty:
+            self._set_state(order, "FILLED")
+            self.log(f"INFO: {code} {order['action']} 全部成交 {filled} 股")
+            if self.db is not None:
+                self.db.add_signal(code, order["action"], order["price"],
+                                   {"order": order.get("result"), "order_id": order["id"], "filled_qty": filled},
+                                   source="monitor_websocket")
+                self.db.close_holding(code)
+            if self.on_filled is not None:
+                self.on_filled(order)
+            return
+        remaining = qty - filled
+        if filled > 0:
+            self._set_state(order, "PARTIAL")
+            if self.db is not None:
+                self.db.set_holding_qty(code, remaining)
+            if self.on_partial is not None:
+                self.on_partial(order, remaining)
+        else:
+            self._set_state(order, "UNFILLED")
+        with self._lock:
+            if self.latest.get(code) is not order:
+                return
+            if order["attempt"] >= self.max_attempts:
+                self.log(f"ERROR: {code} {order['action']} 成交 {filled}/{qty} 股，送單次數已用完，"
+                         f"剩餘 {remaining} 股請人工處理（持倉與觸價保留）")
+                return
+            self.log(f"WARNING: {code} {order['action']} 成交 {filled}/{qty} 股，剩餘 {remaining} 股立即重送")
+            self._enqueue(code, order["action"], remaining, order["price"], None, order["data"], order["attempt"] + 1)
+
+    def _set_state(self, order: dict, state: str):
+        order["state"] = state
+        if self.db is not None:
+            try:
+                self.db.save_order(order)
+            except Exception as e:
+                self.log(f"ERROR: 委託 {order['id']} 狀態寫入失敗: {e}")
+
+    def close(self, timeout: float = 10.0):
+        """送出佇列內剩餘委託並等待回報（未結束的委託留待下次啟動時繼續查成交）"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+        self._pool.shutdown(wait=True)
+
+    def metrics(self) -> dict:
+        states = {}
+        for o in list(self.orders.values()):
+            states[o["state"]] = states.get(o["state"], 0) + 1
+        return {
+            "orders": len(self.orders),
+            "states": states,
+            "queued": self._queue.qsize(),
+            "duplicates": self.duplicates,
+            "signal_to_submit": self.submit_latency.summary(),
+            "submit_to_ack": self.ack_latency.summary(),
+        }
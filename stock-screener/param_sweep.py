@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+策略A 參數掃描（多程序）
+========================
+策略A 篩選的門檻（Gap < 2.0%、K/D < 25、均量 1000 張、MA5 上升 3 天）與
+追蹤清單 20 檔上限都是寫死的。這裡以 backtest_a 的向量化回測評估大量門檻組合：
+
+- 主程序從日K庫載入歷史矩陣，並一次算好與門檻無關的指標（MA5 / MA20 / Gap / K / D）
+- 所有矩陣放進 multiprocessing.shared_memory，worker 直接掛上同一塊記憶體（不 pickle 陣列）
+- 每個組合只需重算六條件布林矩陣 + simulate，依命中率 / 報酬排序
+
+用法：
+  python param_sweep.py --years 5                     # 網格搜尋（GRID 全組合）
+  python param_sweep.py --random 2000 --workers 8     # 隨機抽樣 2000 組
+  python param_sweep.py --out /tmp/sweep.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import backtest_a
+import indicators
+from candle_store import CandleStore, DEFAULT_ROOT
+
+# 掃描範圍（網格搜尋取全組合；隨機搜尋在同一組候選值中抽樣）
+GRID = {
+    "gap_max": [1.0, 1.5, 2.0, 2.5, 3.0],
+    "kd_max": [20, 25, 30, 35],
+    "min_lots": [500, 1000, 2000],
+    "slope_days": [2, 3, 4],
+    "top_n": [5, 10, 20],
+}
+MIN_TRADES = 30          # 交易筆數少於此值不列入排名
+RANK_KEYS = ("hit_rate", "avg_return", "total_return", "win_rate")
+SHARED_FIELDS = ("open", "high", "low", "close", "volume", "ma5", "ma20", "gap", "k", "d")
+
+# worker 端：掛上的共享記憶體（保留參照，避免被回收）與矩陣
+_SHM = []
+_DATA = {}
+
+
+def share_arrays(arrays: dict):
+    """把矩陣複製到共享記憶體，回傳 (SharedMemory 列表, {欄位: (名稱, shape, dtype)})"""
+    blocks, spec = [], {}
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        blocks.append(shm)
+        spec[name] = (shm.name, arr.shape, arr.dtype.str)
+    return blocks, spec
+
+
+def attach_arrays(spec: dict):
+    """worker initializer：依 spec 掛上共享記憶體（唯讀使用）"""
+    for name, (shm_name, shape, dtype) in spec.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        arr.flags.writeable = False
+        _SHM.append(shm)
+        _DATA[name] = arr
+
+
+def evaluate(config: dict, data: dict = None) -> dict:
+    """以一組門檻回測，回傳 config + 摘要"""
+    data = data or _DATA
+    params = {k: v for k, v in config.items() if k in indicators.STRATEGY_A_PARAMS}
+    a = indicators.strategy_a_conditions(data, data["volume"], params)
+    signal, rank_key = backtest_a.entry_signals(data, analysis=a)
+    trades = backtest_a.simulate(data, signal, rank_key, top_n=config.get("top_n", backtest_a.TOP_N))
+    equity = backtest_a.equity_curve(trades, data["close"].shape[1])
+    return {"config": config, "summary": backtest_a.summarize(trades, equity)}
+
+
+def grid_configs(grid: dict = None) -> list:
+    grid = grid or GRID
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def random_configs(n: int, grid: dict = None, seed: int = None) -> list:
+    """從候選值中抽樣 n 組（不重複；n 超過全組合數時回傳全組合）"""
+    configs = grid_configs(grid)
+    if n >= len(configs):
+        return configs
+    return random.Random(seed).sample(configs, n)
+
+
+def rank(results: list, key: str = "hit_rate", min_trades: int = MIN_TRADES) -> list:
+    """依 key 由高到低排序（同分再比平均報酬、總報酬），排除交易筆數不足的組合"""
+    rows = [r for r in results if r["summary"].get("trades", 0) >= min_trades]
+    order = [key] + [k for k in ("avg_return", "total_return") if k != key]
+    return sorted(rows, key=lambda r: tuple(r["summary"][k] for k in order), reverse=True)
+
+
+def sweep(store: CandleStore, configs: list, years: float = None, workers: int = None) -> list:
+    """在 ProcessPoolExecutor 上評估所有組合（矩陣經共享記憶體傳給 worker）"""
+    data = backtest_a.load_history(store, years)
+    base = indicators.strategy_a_base(data["high"], data["low"], data["close"])
+    arrays = {f: data[f] for f in store.FIELDS}
+    arrays.update(base)
+
+    blocks, spec = share_arrays({f: arrays[f] for f in SHARED_FIELDS})
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=attach_arrays, initargs=(spec,)) as executor:
+            chunk = max(1, len(configs) // ((workers or os.cpu_count() or 1) * 4))
+            return list(executor.map(evaluate, configs, chunksize=chunk))
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="策略A 參數掃描")
+    parser.add_argument("--store", default=DEFAULT_ROOT, help="日K庫目錄")
+    parser.add_argument("--years", type=float, default=5, help="回測年數（0 = 全部歷史）")
+    parser.add_argument("--random", type=int, default=0, help="隨機抽樣組數（0 = 網格全組合）")
+    parser.add_argument("--seed", type=int, help="隨機抽樣種子")
+    parser.add_argument("--workers", type=int, help="worker 程序數（預設 CPU 核心數）")
+    parser.add_argument("--rank-by", choices=RANK_KEYS, default="hit_rate", help="排序依據")
+    parser.add_argument("--min-trades", type=int, default=MIN_TRADES, help="列入排名的最少交易筆數")
+    parser.add_argument("--top", type=int, default=20, help="顯示前幾名")
+    parser.add_argument("--out", help="輸出 JSON（全部組合結果）")
+    args = parser.parse_args()
+
+    configs = random_configs(args.random, seed=args.seed) if args.random else grid_configs()
+    store = CandleStore(args.store, readonly=True)
+
+    t0 = time.perf_counter()
+    results = sweep(store, configs, years=args.years or None, workers=args.workers)
+    elapsed = time.perf_counter() - t0
+    ranked = rank(results, args.rank_by, args.min_trades)
+
+    print(f"[掃描] {len(configs)} 組，耗時 {elapsed:.1f} 秒（{len(configs) / elapsed:.1f} 組/秒），"
+          f"{len(ranked)} 組交易數 ≥ {args.min_trades}")
+    for i, r in enumerate(ranked[:args.top], 1):
+        s = r["summary"]
+        print(f"{i:3d}. {json.dumps(r['config'])}  交易 {s['trades']}  命中 {s['hit_rate']:.1%}  "
+              f"勝率 {s['win_rate']:.1%}  平均 {s['avg_return']:.2%}  總報酬 {s['total_return']:.1%}  "
+              f"MDD {s['max_drawdown']:.1%}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"rank_by": args.rank_by, "ranked": ranked, "all": results}, f, ensure_ascii=False, indent=2)
+        print(f"[檔案] {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,20 +3,27 @@
 盤前準備腳本
 每日 08:30 執行（平日）
 產出: /tmp/premarket_status.json
+持倉現價優先讀 monitor_websocket 的共享記憶體價格看板（監控已啟動時），否則由未實現損益反推
 """
 import sys
 import json
 import os
 sys.path.insert(0, '/home/admin/.openclaw/workspace/fubon_sdk_complete')
 from fubon_complete import FubonComplete
+from results_store import ResultsStore
+from candle_store import CandleStore, DEFAULT_ROOT as CANDLE_DIR
+from intraday_ma import IntradayMA
+from price_board import read_prices
 from datetime import datetime
 
 OUTPUT = '/tmp/premarket_status.json'
+RESULTS_DB = '/home/admin/.openclaw/workspace/stock-screener/data/results.db'
+TRACKING_FILE = '/home/admin/pCloudDrive/openclaw/stock-screener/data/tracking_list.json'
 
 def main():
     print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 盤前準備啟動")
     
-    fc = FubonComplete()
+    fc = FubonComplete(caller="premarket_check")
     
     # 登入
     if not fc.login():
@@ -38,6 +45,7 @@ def main():
     
     # 2. 查詢持倉
     holdings = []
+    live = read_prices()
     try:
         result = fc.sdk.accounting.unrealized_gains_and_loses(account=fc.account)
         if result.is_success and result.data:
@@ -49,7 +57,7 @@ def main():
                     stop = round(entry * 0.95, 2)
                     target = round(entry * 1.10, 2)
                     unreal = float(getattr(h, 'unrealized_profit', 0) or getattr(h, 'unrealized_loss', 0) or 0)
-                    last = entry + unreal / qty if qty > 0 else entry
+                    last = live[code]['price'] if code in live else entry + unreal / qty
                     pnl = (last - entry) / entry * 100 if entry > 0 else 0
                     holdings.append({
                         'code': code,
@@ -62,22 +70,47 @@ def main():
                         'target': target,
                         'status': 'HOLDING'
                     })
-        print(f"[持倉] {len(holdings)} 檔")
+        print(f"[持倉] {len(holdings)} 檔（價格看板 {sum(1 for h in holdings if h['code'] in live)} 檔）")
     except Exception as e:
         print(f"[錯誤] 查詢持倉失敗: {e}")
     
-    # 3. 讀取追蹤清單
+    # 3. 讀取追蹤清單（結果庫沒有資料時讀舊的 tracking_list.json）
     watchlist = []
+    data = None
+    db = None
     try:
-        tracking_file = '/home/admin/pCloudDrive/openclaw/stock-screener/data/tracking_list.json'
-        if os.path.exists(tracking_file):
-            with open(tracking_file) as f:
+        db = ResultsStore(RESULTS_DB)
+        data = db.load_tracking()
+        if data is None and os.path.exists(TRACKING_FILE):
+            with open(TRACKING_FILE) as f:
                 data = json.load(f)
-                watchlist = data.get('watchlist', [])[:10]  # 取前10檔
+        if data:
+            watchlist = data.get('watchlist', [])[:10]  # 取前10檔
         print(f"[追蹤] {len(watchlist)} 檔")
     except Exception as e:
         print(f"[錯誤] 讀取追蹤清單失敗: {e}")
     
+    # 3b. 盤中監控用的 MA 快取：日K庫與快取都沒有的股票才查 API
+    try:
+        codes = [w['code'] for w in (data or {}).get('watchlist', []) if w.get('code')] + [h['code'] for h in holdings]
+        live_ma = IntradayMA.from_store(CandleStore(CANDLE_DIR, readonly=True), codes)
+        cached = db.load_ma_cache(codes)
+        misses = [c for c in dict.fromkeys(codes) if c not in live_ma and c not in cached]
+        rows = []
+        for code in misses:
+            sma5 = fc.get_sma(code, 5)
+            sma20 = fc.get_sma(code, 20)
+            if sma5 and sma20 and sma5[-1].get('sma') is not None and sma20[-1].get('sma') is not None:
+                rows.append({'code': code, 'date': str(sma20[-1].get('date', ''))[:10] or datetime.now().strftime('%Y-%m-%d'),
+                             'ma5': sma5[-1]['sma'], 'ma20': sma20[-1]['sma']})
+        db.save_ma_cache(rows, source='premarket_check')
+        print(f"[MA快取] 日K庫 {len(live_ma)} 檔、快取 {len(cached)} 檔，補查 {len(rows)}/{len(misses)} 檔")
+    except Exception as e:
+        print(f"[錯誤] MA 快取失敗: {e}")
+    finally:
+        if db is not None:
+            db.close()
+    
     # 4. 產出狀態檔
     status = {
         'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+PriceBoard - 盤中即時價格看板（共享記憶體，跨程序讀取）
+======================================================
+monitor_websocket 收到的成交寫進 /dev/shm 上的一個 memmap 檔，其他本機程序
+（monitor_worker、premarket_check ...）直接讀最新價，不必再呼叫 intraday.quote。
+
+檔案結構（固定大小，無 JSON）：
+  檔頭    HEADER_DTYPE：magic / version / capacity / count（已登記檔數）/ pid / started / heartbeat（微秒）
+  代號表  S8 × capacity（第 i 格 = 股票代號）
+  價格格  SLOT_DTYPE × capacity：seq / price / volume（累計量，張）/ ts（成交時間，微秒）
+
+- 寫入端只有一個（monitor_websocket），啟動時清空內容重用既有檔案（不截斷，其他程序可能還映射著）；
+  依第一次出現順序配發格位，先寫代號再更新 count，讀取端看到的 count 範圍內代號一定完整
+- 成交時間比格內舊的更新直接略過（斷線補資料的舊 tick 不會蓋掉較新的價格）
+- 每格一個 seqlock：寫入前 seq 加 1（奇數 = 寫入中），寫完再加 1；讀取端前後兩次 seq 相同且為偶數才採用，
+  否則重讀（x86 的寫入順序與程式順序一致，NumPy 單一元素寫入不會被重排）
+- heartbeat 由監控主迴圈定期更新；超過 STALE_SECONDS 沒更新視為監控沒在跑，read_prices 回空，呼叫端改走 API
+
+用法：
+  board = PriceBoard(create=True)            # 寫入端（monitor_websocket）
+  board.update("2330", 600.0, 12_345, ts_us)
+  board.heartbeat()
+
+  read_prices(["2330", "2317"])              # 讀取端：{code: {'price', 'volume', 'ts'}}，監控未執行時回 {}
+  python price_board.py show 2330 2317
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+DEFAULT_PATH = os.path.join(SHM_DIR, "stock_price_board")
+CAPACITY = 4096            # 最多登記檔數
+STALE_SECONDS = 30         # heartbeat 超過此秒數視為寫入端已停止
+READ_RETRIES = 100         # seqlock 讀取重試次數
+MAGIC = b"PXBOARD"
+VERSION = 1
+
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("version", "<u4"), ("capacity", "<u4"), ("count", "<u4"),
+                         ("pid", "<u4"), ("started", "<i8"), ("heartbeat", "<i8")])
+SLOT_DTYPE = np.dtype([("seq", "<u8"), ("price", "<f8"), ("volume", "<i8"), ("ts", "<i8")])
+CODE_DTYPE = np.dtype("S8")
+
+
+def _now_us() -> int:
+    return int(time.time() * 1_000_000)
+
+
+class PriceBoard:
+    """共享記憶體價格看板（create=True 為寫入端，清空重用檔案；否則唯讀開啟既有檔案）"""
+
+    def __init__(self, path: str = DEFAULT_PATH, create: bool = False, capacity: int = CAPACITY):
+        self.path = path
+        self.create = create
+        if create:
+            size = HEADER_DTYPE.itemsize + capacity * (CODE_DTYPE.itemsize + SLOT_DTYPE.itemsize)
+            # 只建立或加大，不用 w+：截斷會讓還映射著舊檔的讀取端 SIGBUS
+            with open(path, "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+            self._mm = np.memmap(path, dtype=np.uint8, mode="r+", shape=(size,))
+        else:
+            self._mm = np.memmap(path, dtype=np.uint8, mode="r")
+        self.header = np.ndarray((), HEADER_DTYPE, buffer=self._mm, offset=0)
+        if create:
+            self.header["count"] = 0            # 先收回代號表，再清空格位
+            self._mm[HEADER_DTYPE.itemsize:] = 0
+            self.header["magic"] = MAGIC
+            self.header["version"] = VERSION
+            self.header["capacity"] = capacity
+            self.header["pid"] = os.getpid()
+            self.header["started"] = self.header["heartbeat"] = _now_us()
+        elif self.header["magic"].item() != MAGIC or int(self.header["version"]) != VERSION:
+            raise ValueError(f"不是價格看板檔案或版本不符: {path}")
+        self.capacity = int(self.header["capacity"])
+        offset = HEADER_DTYPE.itemsize
+        self.codes = np.ndarray((self.capacity,), CODE_DTYPE, buffer=self._mm, offset=offset)
+        offset += self.capacity * CODE_DTYPE.itemsize
+        slots = np.ndarray((self.capacity,), SLOT_DTYPE, buffer=self._mm, offset=offset)
+        self._seq, self._price, self._volume, self._ts = (slots[f] for f in SLOT_DTYPE.names)
+        self.index = {}
+        self.overflow = 0
+        self.stale = 0          # 成交時間比格內舊而略過的更新數
+        self._refresh_index()
+
+    # ========================
+    # 寫入端
+    # ========================
+
+    def _add(self, symbol: str) -> int:
+        sid = len(self.index)
+        if sid >= self.capacity:
+            self.overflow += 1
+            return -1
+        self.codes[sid] = symbol.encode()
+        self.header["count"] = sid + 1      # 代號寫完才公開
+        self.index[symbol] = sid
+        return sid
+
+    def update(self, symbol: str, price: float, volume: int, ts: int = None):
+        """更新一檔最新成交（ts 微秒；None 時用目前時間）；比格內現有成交時間舊的略過"""
+        ts = ts or _now_us()
+        sid = self.index.get(symbol)
+        if sid is None:
+            sid = self._add(symbol)
+            if sid < 0:
+                return
+        elif ts < self._ts[sid]:
+            self.stale += 1
+            return
+        seq = int(self._seq[sid])
+        self._seq[sid] = seq + 1            # 奇數：寫入中
+        self._price[sid] = price
+        self._volume[sid] = volume
+        self._ts[sid] = ts
+        self._seq[sid] = seq + 2
+
+    def heartbeat(self):
+        self.header["heartbeat"] = _now_us()
+
+    def close(self):
+        if self.create:
+            self._mm.flush()
+        del self._seq, self._price, self._volume, self._ts, self.codes, self.header
+        self._mm = None
+
+    # ========================
+    # 讀取端
+    # ========================
+
+    def _refresh_index(self):
+        n = int(self.header["count"])
+        if n > len(self.index):
+            for sid in range(len(self.index), n):
+                self.index[self.codes[sid].decode()] = sid
+
+    def alive(self, stale: float = STALE_SECONDS) -> bool:
+        """寫入端 heartbeat 是否在 stale 秒內"""
+        return _now_us() - int(self.header["heartbeat"]) <= stale * 1_000_000
+
+    def get(self, symbol: str) -> dict:
+        """單檔最新成交 {'price', 'volume', 'ts'}；沒有資料（或一直讀到寫入中）回 None"""
+        sid = self.index.get(symbol)
+        if sid is None:
+            self._refresh_index()
+            sid = self.index.get(symbol)
+            if sid is None:
+                return None
+        seq = self._seq
+        for _ in range(READ_RETRIES):
+            s1 = int(seq[sid])
+            if s1 & 1:
+                continue
+            price, volume, ts = float(self._price[sid]), int(self._volume[sid]), int(self._ts[sid])
+            if int(seq[sid]) == s1:
+                return {"price": price, "volume": volume, "ts": ts} if s1 else None
+        return None
+
+    def snapshot(self, symbols: list = None) -> dict:
+        """多檔最新成交 {code: {...}}（symbols=None 時為所有已登記股票）"""
+        self._refresh_index()
+        out = {}
+        for s in (self.index if symbols is None else symbols):
+            q = self.get(s)
+            if q is not None:
+                out[s] = q
+        return out
+
+
+def read_prices(symbols: list = None, path: str = DEFAULT_PATH, stale: float = STALE_SECONDS) -> dict:
+    """
+    讀取端的便利函式：看板不存在、格式不符或寫入端已停止時回 {}（呼叫端改查 API）
+    """
+    try:
+        board = PriceBoard(path)
+    except (FileNotFoundError, ValueError):
+        return {}
+    try:
+        return board.snapshot(symbols) if board.alive(stale) else {}
+    finally:
+        board.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="盤中價格看板")
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("show", help="列出最新價（不指定代號時列出全部）")
+    p.add_argument("codes", nargs="*")
+    args = parser.parse_args()
+
+    try:
+        board = PriceBoard(args.path)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"[價格看板] 無法開啟: {e}")
+        return
+    t0 = time.perf_counter()
+    prices = board.snapshot(args.codes or None)
+    elapsed = (time.perf_counter() - t0) * 1e6
+    for code, q in prices.items():
+        t = time.strftime("%H:%M:%S", time.localtime(q["ts"] / 1e6))
+        print(f"  {code}: {q['price']:.2f}  量={q['volume']}張  {t}")
+    age = (_now_us() - int(board.header["heartbeat"])) / 1e6
+    print(f"[價格看板] {len(prices)}/{len(board.index)} 檔，寫入端 pid={int(board.header['pid'])} "
+          f"heartbeat {age:.1f} 秒前{'' if board.alive() else '（已停止）'}，讀取 {elapsed:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Fubon API 額度代理（跨程序 Token Bucket）
+==========================================
+screener / monitor_websocket / monitor_worker 共用同一組 Fubon REST 額度，
+各自節流會在重疊時觸發 429。本服務在 Unix socket 上統一發放 token：
+
+- historical：歷史行情 + 技術指標，60 次/分鐘
+- intraday：日內行情（quote / trades），300 次/分鐘
+
+發放採「預約」方式：broker 扣 token 後回傳需等待的秒數，由呼叫端自行 sleep，
+broker 本身不阻塞。Token bucket 容量 = BURST，補充速率 = (上限 - BURST) / 60 秒，
+因此任意 60 秒內發出的 token 數不會超過上限。
+
+用法：
+  python quota_broker.py serve    # 啟動 broker（建議開機常駐）
+  python quota_broker.py stats    # 查詢各程序使用量
+
+broker 未啟動時，QuotaClient 自動退回程序內的 token bucket（僅保護單一程序）。
+"""
+
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+QUOTA_SOCKET = "/tmp/fubon_quota.sock"
+
+# bucket 名稱 → 每分鐘上限（對應 STRATEGY_A_SPEC.md Rate Limit 速查表）
+BUCKET_LIMITS = {
+    "historical": 60,
+    "intraday": 300,
+}
+PERIOD = 60.0
+BURST = 5
+
+
+class TokenBucket:
+    """Token bucket（可預約：token 不足時回傳需等待秒數）"""
+
+    def __init__(self, limit: int, period: float = PERIOD, burst: int = BURST):
+        self.limit = limit
+        self.capacity = burst
+        self.rate = (limit - burst) / period
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, n: int = 1) -> float:
+        """扣 n 個 token，回傳需等待的秒數"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= n
+            return max(0.0, -self.tokens / self.rate)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            now = time.monotonic()
+            tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        return {"limit_per_min": self.limit, "tokens": round(tokens, 2)}
+
+
+# ── Broker 服務端 ──────────────────────────────────────────────────────────
+class QuotaBroker:
+    """統一發放 token 並記錄各程序使用量"""
+
+    def __init__(self, limits: dict = None):
+        self.buckets = {name: TokenBucket(limit) for name, limit in (limits or BUCKET_LIMITS).items()}
+        self.usage = {}  # caller -> bucket -> {granted, waited, last}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def acquire(self, caller: str, bucket: str, n: int = 1) -> float:
+        tb = self.buckets.get(bucket)
+        if tb is None:
+            raise ValueError(f"未知的 bucket: {bucket}")
+        wait = tb.reserve(n)
+        with self.lock:
+            u = self.usage.setdefault(caller, {}).setdefault(bucket, {"granted": 0, "waited": 0.0, "last": None})
+            u["granted"] += n
+            u["waited"] = round(u["waited"] + wait, 3)
+            u["last"] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time() + wait))
+        return wait
+
+    def stats(self) -> dict:
+        with self.lock:
+            usage = json.loads(json.dumps(self.usage))
+        return {
+            "since": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+            "buckets": {name: tb.snapshot() for name, tb in self.buckets.items()},
+            "callers": usage,
+        }
+
+    def handle(self, req: dict) -> dict:
+        op = req.get("op")
+        if op == "acquire":
+            wait = self.acquire(req.get("caller", "?"), req.get("bucket", "historical"), int(req.get("n", 1)))
+            return {"ok": True, "wait": wait}
+        if op == "stats":
+            return {"ok": True, "stats": self.stats()}
+        return {"ok": False, "error": f"未知的 op: {op}"}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                resp = self.server.broker.handle(json.loads(line))
+            except Exception as e:
+                resp = {"ok": False, "error": str(e)}
+            self.wfile.write(json.dumps(resp, ensure_ascii=False).encode() + b"\n")
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(path: str = QUOTA_SOCKET):
+    if os.path.exists(path):
+        os.unlink(path)
+    server = _Server(path, _Handler)
+    server.broker = QuotaBroker()
+    os.chmod(path, 0o600)
+    print(f"[quota] broker 啟動: {path} {BUCKET_LIMITS}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+# ── 用戶端 ─────────────────────────────────────────────────────────────────
+class QuotaClient:
+    """
+    向 broker 取得 token（每次 Fubon REST 呼叫前呼叫 acquire）
+    broker 不在時退回程序內 token bucket
+    """
+
+    def __init__(self, caller: str = None, path: str = QUOTA_SOCKET):
+        self.caller = caller or os.path.basename(sys.argv[0]) or "python"
+        self.path = path
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+        self._local = None
+        self._warned = False
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(5)
+        sock.connect(self.path)
+        self._sock = sock
+        self._file = sock.makefile("rwb")
+
+    def _close(self):
+        try:
+            if self._sock:
+                self._sock.close()
+        except OSError:
+            pass
+        self._sock = None
+        self._file = None
+
+    def _request(self, req: dict) -> dict:
+        """送出請求（連線中斷時重連一次）"""
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    self._file.write(json.dumps(req).encode() + b"\n")
+                    self._file.flush()
+                    line = self._file.readline()
+                    if not line:
+                        raise ConnectionError("broker 關閉連線")
+                    return json.loads(line)
+                except OSError:
+                    self._close()
+                    if attempt:
+                        raise
+
+    def _local_wait(self, bucket: str, n: int) -> float:
+        with self._lock:
+            if not self._warned:
+                print(f"[quota] broker 未啟動（{self.path}），改用程序內限流")
+                self._warned = True
+            if self._local is None:
+                self._local = QuotaBroker()
+        return self._local.acquire(self.caller, bucket, n)
+
+    def acquire(self, bucket: str = "historical", n: int = 1) -> float:
+        """取得 token（必要時 sleep），回傳等待秒數"""
+        try:
+            resp = self._request({"op": "acquire", "caller": self.caller, "bucket": bucket, "n": n})
+            wait = resp["wait"] if resp and resp.get("ok") else self._local_wait(bucket, n)
+        except OSError:
+            wait = self._local_wait(bucket, n)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def stats(self) -> dict:
+        """查詢 broker 統計（broker 不在時回傳程序內統計）"""
+        try:
+            resp = self._request({"op": "stats"})
+            if resp and resp.get("ok"):
+                return resp["stats"]
+        except OSError:
+            pass
+        return self._local.stats() if self._local else {}
+
+
+def main():
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "serve"
+    if cmd == "serve":
+        serve()
+    elif cmd == "stats":
+        print(json.dumps(QuotaClient("stats").stats(), ensure_ascii=False, indent=2))
+    else:
+        print(f"用法: {sys.argv[0]} [serve|stats]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+自適應限流（AIMD）+ 429 重試
+==============================
+固定 sleep 120 秒 / 60 秒的重試方式學不到真正的可用速率。這裡改成：
+
+- 遇到 429：速率減半（multiplicative decrease），並依錯誤內的重置提示
+  （Retry-After / reset / 「N 秒後」）等待；沒有提示時指數退避
+- 呼叫成功：速率每分鐘加 INCREASE_PER_MIN 次（additive increase），慢慢試探上限
+- 每次呼叫前先向 quota_broker 取 token（整體額度），再依目前速率排隊（程序內節奏）
+
+長時間掃描會收斂在實際可持續的速率，而不是過度 sleep。
+"""
+
+import json
+import re
+import threading
+import time
+
+MAX_RETRIES = 3
+INCREASE_PER_MIN = 2.0   # 成功時每分鐘增加的速率（次/分鐘）
+DECREASE_FACTOR = 0.5    # 429 時速率乘上的倍數
+MIN_RATE = 6.0           # 速率下限（次/分鐘）
+BASE_WAIT = 5.0          # 沒有重置提示時的第一次等待秒數
+MAX_WAIT = 120.0         # 單次等待上限（一個完整時間窗口 + 緩衝）
+
+
+def is_rate_limit(err) -> bool:
+    """是否為 429 Rate Limit 錯誤（FugleAPIError 或 SDK 包裝過的例外）"""
+    if getattr(err, "status_code", None) == 429:
+        return True
+    text = str(err).lower()
+    return "429" in text or "rate limit" in text or "too many requests" in text
+
+
+def retry_after_hint(err):
+    """
+    從錯誤中讀出「多久後可重試」（秒），讀不到回 None
+    依序檢查：headers（Retry-After / X-RateLimit-Reset）、response_text JSON、訊息文字
+    """
+    headers = getattr(err, "headers", None) or {}
+    try:
+        headers = {str(k).lower(): v for k, v in dict(headers).items()}
+    except (TypeError, ValueError):
+        headers = {}
+    if "retry-after" in headers:
+        try:
+            return max(0.0, float(headers["retry-after"]))
+        except (TypeError, ValueError):
+            pass
+    for key in ("x-ratelimit-reset", "ratelimit-reset"):
+        if key in headers:
+            try:
+                reset = float(headers[key])
+                # 大於一年的秒數視為 epoch 時間
+                return max(0.0, reset - time.time()) if reset > 365 * 86400 else reset
+            except (TypeError, ValueError):
+                pass
+
+    text = getattr(err, "response_text", None) or str(err)
+    try:
+        body = json.loads(text)
+        if isinstance(body, dict):
+            for key in ("retryAfter", "retry_after", "reset", "resetAfter"):
+                if key in body:
+                    return max(0.0, float(body[key]))
+    except (ValueError, TypeError):
+        pass
+    m = re.search(r"(?:retry[- ]after|reset(?:s)? in|after)\D{0,5}(\d+(?:\.\d+)?)", text, re.I) \
+        or re.search(r"(\d+(?:\.\d+)?)\s*(?:秒|seconds?|s\b)", text, re.I)
+    if m:
+        return float(m.group(1))
+    return None
+
+
+class AdaptiveRateController:
+    """AIMD 速率控制 + 429 重試（可跨執行緒共用）"""
+
+    def __init__(self, name: str, max_rate: float, quota=None, bucket: str = None, logger=print):
+        self.name = name
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.quota = quota
+        self.bucket = bucket or name
+        self.logger = logger
+        self._next = 0.0
+        self._lock = threading.Lock()
+        self._limited = 0  # 連續 429 次數
+        self.stats = {"calls": 0, "limited": 0, "waited": 0.0}
+
+    @property
+    def effective_rate(self) -> float:
+        """目前有效速率（次/分鐘）"""
+        return round(self.rate, 2)
+
+    def pace(self):
+        """呼叫前排隊：先取整體額度，再依目前速率預約時段"""
+        if self.quota is not None:
+            self.quota.acquire(self.bucket)
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + 60.0 / self.rate
+        if slot > now:
+            time.sleep(slot - now)
+
+    def on_success(self):
+        with self._lock:
+            self._limited = 0
+            self.stats["calls"] += 1
+            # 每次成功加 INCREASE_PER_MIN / rate，一分鐘約加 INCREASE_PER_MIN
+            self.rate = min(self.max_rate, self.rate + INCREASE_PER_MIN / self.rate)
+
+    def on_limit(self, err) -> float:
+        """遇到 429：速率減半，回傳應等待秒數"""
+        hint = retry_after_hint(err)
+        with self._lock:
+            self._limited += 1
+            self.stats["limited"] += 1
+            self.rate = max(MIN_RATE, self.rate * DECREASE_FACTOR)
+            wait = hint if hint is not None else BASE_WAIT * 2 ** (self._limited - 1)
+            wait = min(MAX_WAIT, wait)
+            self.stats["waited"] += wait
+            # 等待期間不讓其他執行緒插隊
+            self._next = max(self._next, time.monotonic() + wait)
+        return wait
+
+    def call(self, fn, *args, retries: int = MAX_RETRIES, **kwargs):
+        """帶 AIMD 限流的呼叫；429 超過重試次數時拋出最後的錯誤，其他錯誤直接拋出"""
+        for attempt in range(retries + 1):
+            self.pace()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limit(e) or attempt == retries:
+                    raise
+                wait = self.on_limit(e)
+                self.logger(f"[rate] {self.name} 429，速率降為 {self.effective_rate}/分鐘，"
+                            f"{wait:.1f} 秒後重試（第 {attempt+1} 次）")
+                time.sleep(wait)
+                continue
+            self.on_success()
+            return result
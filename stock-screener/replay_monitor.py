@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+盤中監控離線重播
+================
+把 tick_recorder 記錄的成交（或合成的隨機走勢）餵進 monitor_websocket.MonitorSession，
+走與盤中相同的 TickDispatcher → on_position_tick / on_watchlist_tick，不需要 SDK 與 WebSocket。
+
+- 模擬時鐘：is_market_open 用 tick 的成交時間判斷，收盤後也能重播
+- 速度：--speed 0 盡快送（壓測），1 = 實際速度，10 = 十倍速
+- --queue：經 TickQueue 由 worker 執行緒處理（與盤中相同路徑），延遲含排隊時間
+- 報告：吞吐量（tick/秒）、每筆端到端延遲分布（送出 → handler 完成）、判斷延遲、信號 / 觸發數
+
+持倉、觀察名單與接近符合股票預設讀結果庫（唯讀，不寫 signals），
+合成模式則把前 --holdings 檔當持倉、其餘當觀察名單。
+
+用法：
+  python replay_monitor.py --day 2026-04-14                  # 重播當日紀錄（盡快）
+  python replay_monitor.py --day 2026-04-14 --speed 1        # 實際速度
+  python replay_monitor.py --synthetic --symbols 500 --ticks 500000 --queue
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, date
+
+import numpy as np
+
+import monitor_websocket as mw
+import tick_recorder
+from candle_store import CandleStore, DEFAULT_ROOT as CANDLE_DIR
+from intraday_ma import IntradayMA
+from results_store import ResultsStore
+from tick_queue import TickQueue
+from trigger_index import LatencyStats
+from ws_pool import TickDispatcher
+
+OPEN_TIME = (9, 0)          # 合成走勢的開始時間
+SESSION_SECONDS = 4.5 * 3600
+
+
+def _quiet(msg: str):
+    """重播時不寫盤中 log（信號 / 觸發數由報告統計）"""
+
+
+class SimClock:
+    """模擬時鐘：目前時間 = 最後送出的 tick 成交時間"""
+
+    def __init__(self, ts: int = 0):
+        self.ts = ts
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.ts / 1_000_000)
+
+
+def synthetic_stream(n_symbols: int, n_ticks: int, day: str = None, seed: int = 0):
+    """
+    隨機走勢：n_symbols 檔 × 共 n_ticks 筆，成交時間平均分布在 09:00-13:30
+    回傳 (結構化陣列（tick_recorder.RECORD_DTYPE）, 代號表, 各檔開盤價)
+    """
+    rng = np.random.default_rng(seed)
+    day = day or date.today().isoformat()
+    start = datetime.strptime(day, "%Y-%m-%d").replace(hour=OPEN_TIME[0], minute=OPEN_TIME[1])
+    t0 = int(start.timestamp() * 1_000_000)
+    symbols = [f"{1101 + i}" for i in range(n_symbols)]
+    base = rng.uniform(20, 600, n_symbols).round(1)
+    ticks = np.zeros(n_ticks, dtype=tick_recorder.RECORD_DTYPE)
+    ticks["ts"] = t0 + np.sort(rng.integers(0, int(SESSION_SECONDS * 1_000_000), n_ticks))
+    ticks["sym"] = rng.integers(0, n_symbols, n_ticks)
+    # 每檔各自隨機漫步（每筆 ±0.1%）
+    steps = rng.normal(0, 0.001, n_ticks)
+    order = np.argsort(ticks["sym"], kind="stable")
+    walk = np.empty(n_ticks)
+    sym_sorted = ticks["sym"][order]
+    cum = np.cumsum(steps[order])
+    first = np.r_[0, np.flatnonzero(np.diff(sym_sorted)) + 1]
+    offset = np.repeat(cum[first] - steps[order][first], np.diff(np.r_[first, n_ticks]))
+    walk[order] = cum - offset
+    ticks["price"] = np.round(base[ticks["sym"]] * np.exp(walk), 2)
+    ticks["volume"] = rng.integers(1, 50, n_ticks)      # 單筆量（張）
+    # 累計量
+    vol = ticks["volume"][order]
+    csum = np.cumsum(vol)
+    ticks["volume"][order] = csum - np.repeat(csum[first] - vol[first], np.diff(np.r_[first, n_ticks]))
+    return ticks, symbols, dict(zip(symbols, base))
+
+
+def synthetic_session(symbols: list, base: dict, n_holdings: int, seed: int = 0) -> mw.MonitorSession:
+    """合成的持倉（停損 -3%、目標 +3%）與觀察名單（MA 在開盤價附近）"""
+    rng = np.random.default_rng(seed + 1)
+    holdings = [{"code": s, "entry": base[s], "qty": 1, "stop": round(base[s] * 0.97, 2),
+                 "target": round(base[s] * 1.03, 2), "name": s} for s in symbols[:n_holdings]]
+    ma_cache = {}
+    for s in symbols[n_holdings:]:
+        ma5 = base[s] * (1 + rng.normal(0, 0.01))
+        ma_cache[s] = {"ma5": ma5, "ma20": base[s] * (1 + rng.normal(0, 0.01))}
+    return mw.MonitorSession(holdings, symbols[n_holdings:], ma_cache=ma_cache, logger=_quiet)
+
+
+def recorded_session(symbols: list, day: str, db_path: str, store_root: str) -> mw.MonitorSession:
+    """結果庫的持倉 / 觀察名單 / 接近符合（唯讀），盤中 MA 由日K庫計算"""
+    db = ResultsStore(db_path)
+    data = db.load_tracking() or {}
+    holdings = mw.parse_holdings(data.get("holdings", {}))
+    holding_codes = {h["code"] for h in holdings}
+    watchlist_codes = [w["code"] for w in data.get("watchlist", []) if w.get("code") not in holding_codes]
+    near_miss = {c: r for c, r in db.load_whatif_latest(before=day).items()
+                 if c not in holding_codes and c not in set(watchlist_codes)}
+    codes = list(holding_codes | set(watchlist_codes) | set(near_miss))
+    live_ma = IntradayMA.from_store(CandleStore(store_root, readonly=True), codes, today=day)
+    ma_cache = db.load_ma_cache([c for c in codes if c not in live_ma], day=day)
+    db.close()
+    return mw.MonitorSession(holdings, watchlist_codes, near_miss, live_ma, ma_cache, logger=_quiet)
+
+
+def replay(session: mw.MonitorSession, ticks: np.ndarray, symbols: list, speed: float = 0,
+           use_queue: bool = False) -> dict:
+    """依 ts 順序送出 tick，回傳吞吐量與延遲統計"""
+    clock = SimClock(int(ticks["ts"][0]) if len(ticks) else 0)
+    session.clock = clock.now
+    dispatcher = TickDispatcher()
+    session.route(dispatcher)
+    e2e = LatencyStats(max(len(ticks), 1))
+
+    def handle(item):
+        msg, sent = item
+        dispatcher.dispatch(msg)
+        e2e.add(time.perf_counter_ns() - sent)
+
+    queue = None
+    if use_queue:
+        queue = TickQueue(policy="block")
+        queue.start(handle)
+
+    order = np.argsort(ticks["ts"], kind="stable")
+    ts_col, sym_col, price_col, vol_col = (ticks[f][order] for f in ("ts", "sym", "price", "volume"))
+    wall0 = time.perf_counter()
+    first_ts = int(ts_col[0]) if len(ts_col) else 0
+    for ts, sid, price, vol in zip(ts_col.tolist(), sym_col.tolist(), price_col.tolist(), vol_col.tolist()):
+        if speed > 0:
+            wait = (ts - first_ts) / 1_000_000 / speed - (time.perf_counter() - wall0)
+            if wait > 0:
+                time.sleep(wait)
+        clock.ts = ts
+        msg = {"event": "data", "channel": "trades",
+               "data": {"symbol": symbols[sid], "price": price, "volume": vol, "time": ts}}
+        sent = time.perf_counter_ns()
+        if queue is not None:
+            queue.put((msg, sent))
+        else:
+            handle((msg, sent))
+    if queue is not None:
+        queue.stop(timeout=60)
+    elapsed = time.perf_counter() - wall0
+
+    report = {
+        "ticks": int(len(ticks)),
+        "symbols": len(symbols),
+        "elapsed_s": round(elapsed, 3),
+        "ticks_per_sec": round(len(ticks) / elapsed, 1) if elapsed else None,
+        "end_to_end": e2e.summary(),
+        "decision": session.latency.summary(),
+        "dispatched": dispatcher.dispatched,
+        "unrouted": dispatcher.unrouted,
+        "signals": len(session.status["signals"]),
+        "actions": len(session.actions_taken),
+    }
+    if queue is not None:
+        report["tick_queue"] = queue.metrics()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="盤中監控離線重播")
+    parser.add_argument("--day", default=date.today().isoformat(), help="重播日期（tick 紀錄 / 合成走勢的日期）")
+    parser.add_argument("--root", default=tick_recorder.DEFAULT_ROOT, help="tick 紀錄目錄")
+    parser.add_argument("--db", default=mw.RESULTS_DB, help="結果庫（唯讀）")
+    parser.add_argument("--store", default=CANDLE_DIR, help="日K庫目錄")
+    parser.add_argument("--synthetic", action="store_true", help="用合成隨機走勢")
+    parser.add_argument("--symbols", type=int, default=300, help="合成：股票數")
+    parser.add_argument("--ticks", type=int, default=200_000, help="合成：總筆數")
+    parser.add_argument("--holdings", type=int, default=5, help="合成：持倉檔數")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--speed", type=float, default=0, help="0 = 盡快，1 = 實際速度，N = N 倍速")
+    parser.add_argument("--queue", action="store_true", help="經 TickQueue / worker 執行緒處理")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        ticks, symbols, base = synthetic_stream(args.symbols, args.ticks, args.day, args.seed)
+        session = synthetic_session(symbols, base, args.holdings, args.seed)
+    else:
+        ticks, symbols = tick_recorder.load_day(args.day, args.root)
+        if not len(ticks):
+            print(f"[重播] {args.day} 沒有 tick 紀錄（{args.root}）")
+            return
+        session = recorded_session(symbols, args.day, args.db, args.store)
+
+    print(f"[重播] {args.day} {len(ticks)} 筆 / {len(symbols)} 檔，"
+          f"持倉 {len(session.holdings)}、觀察 {len(session.watch_set)}")
+    report = replay(session, ticks, symbols, args.speed, args.queue)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
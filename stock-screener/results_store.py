@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+策略A 結果庫（SQLite WAL）
+==========================
+取代每日 strategy_a_results_{date}.json 與多程序互相覆寫的 tracking_list.json：
+
+- screen_results：每日每檔的六條件結果（PK: date, code；另建 code, date 索引）
+- screen_runs：每日掃描摘要
+- tracking：每日追蹤清單（觀察名單，依排名）
+- holdings：目前持倉（screener / monitor 共用，賣出時由 monitor 標記）
+- signals：盤中信號與出場紀錄
+- whatif：接近符合股票的「明日通過門檻」（whatif_solver，盤中比對用）
+- ma_cache：每日 MA5 / MA20（盤中監控啟動時直接讀取，不必逐檔查 API；只採用前一交易日以後的資料）
+- orders：盤中委託（order_executor：狀態、委託回報、信號 → 送單延遲；重啟時據此避免重複賣出）
+
+WAL 模式下讀取不會被寫入擋住；寫入一律用 BEGIN IMMEDIATE + busy_timeout，
+screener / monitor_websocket / premarket_check 同時開啟也安全。
+資料庫放在本機磁碟（WAL 需要共享記憶體檔，不適合放在 pCloud 這類網路檔案系統）。
+
+tracking_list.json 仍由 export_tracking 匯出一份，給尚未改讀資料庫的工具使用。
+
+用法：
+  python results_store.py history 2330 --cond 3    # 2330 條件3 成立的所有交易日
+  python results_store.py history 2330 --ok        # 2330 六條件全過的交易日
+  python results_store.py tracking                  # 最新追蹤清單
+  python results_store.py orders                    # 今日委託
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from intraday_ma import previous_weekday
+
+DEFAULT_DB = "/home/admin/.openclaw/workspace/stock-screener/data/results.db"
+BUSY_TIMEOUT_MS = 10000
+
+# analyze_universe 結果欄位 → 資料表欄位 cond1 ~ cond6
+RESULT_CONDS = (
+    "cond1_ma5_slope",
+    "cond2_gap_2pct",
+    "cond3_gap_shrinking",
+    "cond4_volume_up",
+    "cond5_kd_below_25",
+    "cond6_volume_1k",
+)
+RESULT_VALUES = ("name", "close", "ma5", "ma20", "gap", "avg_volume_lots", "conditions_met", "confidence")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS screen_runs (
+    date TEXT PRIMARY KEY,
+    total INTEGER,
+    scanned INTEGER,
+    passed INTEGER,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS screen_results (
+    date TEXT NOT NULL,
+    code TEXT NOT NULL,
+    name TEXT,
+    close REAL,
+    ma5 REAL,
+    ma20 REAL,
+    gap REAL,
+    avg_volume_lots REAL,
+    cond1 INTEGER, cond2 INTEGER, cond3 INTEGER, cond4 INTEGER, cond5 INTEGER, cond6 INTEGER,
+    conditions_met INTEGER,
+    confidence REAL,
+    ok INTEGER,
+    PRIMARY KEY (date, code)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_results_code ON screen_results (code, date);
+CREATE TABLE IF NOT EXISTS tracking (
+    date TEXT NOT NULL,
+    code TEXT NOT NULL,
+    rank INTEGER,
+    name TEXT,
+    confidence REAL,
+    data TEXT,
+    PRIMARY KEY (date, code)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS holdings (
+    code TEXT PRIMARY KEY,
+    name TEXT,
+    entry_price REAL,
+    qty INTEGER,
+    stop_loss REAL,
+    target_price REAL,
+    is_holding INTEGER,
+    data TEXT,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS signals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts TEXT NOT NULL,
+    date TEXT NOT NULL,
+    code TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    price REAL,
+    source TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_signals_code ON signals (code, ts);
+CREATE INDEX IF NOT EXISTS idx_signals_date ON signals (date, kind);
+CREATE TABLE IF NOT EXISTS whatif (
+    date TEXT NOT NULL,
+    code TEXT NOT NULL,
+    price_min REAL,
+    price_max REAL,
+    volume_min INTEGER,
+    feasible INTEGER,
+    data TEXT,
+    PRIMARY KEY (date, code)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ma_cache (
+    date TEXT NOT NULL,
+    code TEXT NOT NULL,
+    ma5 REAL,
+    ma20 REAL,
+    source TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (date, code)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_ma_cache_code ON ma_cache (code, date);
+CREATE TABLE IF NOT EXISTS orders (
+    id TEXT PRIMARY KEY,
+    date TEXT NOT NULL,
+    code TEXT NOT NULL,
+    action TEXT NOT NULL,
+    qty INTEGER,
+    price REAL,
+    state TEXT NOT NULL,
+    attempt INTEGER,
+    order_no TEXT,
+    submit_ms REAL,
+    ack_ms REAL,
+    data TEXT,
+    updated_at TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_orders_date ON orders (date, code);
+"""
+
+
+def _now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def normalize_holdings(holdings) -> list:
+    """持倉轉成 list 格式（相容舊 tracking_list.json 的 {code: {...}} dict 格式）"""
+    if isinstance(holdings, dict):
+        return [dict(h, code=code) for code, h in holdings.items() if isinstance(h, dict)]
+    return [h for h in holdings or [] if isinstance(h, dict) and h.get("code")]
+
+
+class ResultsStore:
+    """策略A 結果 / 追蹤清單 / 持倉 / 信號（單一 SQLite 檔，可跨執行緒共用）"""
+
+    def __init__(self, path: str = DEFAULT_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # isolation_level=None：交易由 _write 明確控制
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        self._lock = threading.Lock()
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    @contextmanager
+    def _write(self):
+        """寫入交易（BEGIN IMMEDIATE：一開始就取得寫鎖，避免多程序升級鎖時互卡）"""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def _query(self, sql: str, args=()) -> list:
+        with self._lock:
+            return self.conn.execute(sql, args).fetchall()
+
+    # ── 篩選結果 ────────────────────────────────────────────────
+    def save_screen(self, day: str, results: list, total: int = None):
+        """寫入一天的篩選結果（同日重跑時整天覆蓋）"""
+        rows = [
+            (day, r["code"], *(r.get(k) for k in RESULT_VALUES[:6]),
+             *(int(bool(r.get(k))) for k in RESULT_CONDS),
+             r.get("conditions_met"), r.get("confidence"), int(bool(r.get("ok"))))
+            for r in results
+        ]
+        passed = sum(1 for r in results if r.get("ok"))
+        with self._write() as c:
+            c.execute("DELETE FROM screen_results WHERE date = ?", (day,))
+            c.executemany(f"INSERT INTO screen_results VALUES ({','.join('?' * 17)})", rows)
+            c.execute("INSERT OR REPLACE INTO screen_runs VALUES (?, ?, ?, ?, ?)",
+                      (day, total if total is not None else len(results), len(results), passed, _now()))
+
+    @staticmethod
+    def _result(row) -> dict:
+        """資料列轉回 analyze_universe 的結果格式"""
+        r = {"code": row["code"]}
+        r.update({k: row[k] for k in RESULT_VALUES})
+        r.update({k: bool(row[f"cond{i}"]) for i, k in enumerate(RESULT_CONDS, 1)})
+        r["ok"] = bool(row["ok"])
+        return r
+
+    def screen_results(self, day: str, ok: bool = None) -> list:
+        """某日的篩選結果（ok=True 只取六條件全過），依信心度排序"""
+        sql = "SELECT * FROM screen_results WHERE date = ?"
+        args = [day]
+        if ok is not None:
+            sql += " AND ok = ?"
+            args.append(int(ok))
+        return [self._result(r) for r in self._query(sql + " ORDER BY confidence DESC, code", args)]
+
+    def screen_run(self, day: str):
+        rows = self._query("SELECT * FROM screen_runs WHERE date = ?", (day,))
+        return dict(rows[0]) if rows else None
+
+    def history(self, code: str, cond: int = None, ok: bool = None, since: str = None) -> list:
+        """
+        某檔的歷史篩選結果（走 code, date 索引）
+        cond=3 → 只取條件3 成立的交易日；ok=True → 只取六條件全過的交易日
+        """
+        sql = "SELECT * FROM screen_results WHERE code = ?"
+        args = [code]
+        if since:
+            sql += " AND date >= ?"
+            args.append(since)
+        if cond is not None:
+            if not 1 <= int(cond) <= 6:
+                raise ValueError(f"cond 必須是 1~6: {cond}")
+            sql += f" AND cond{int(cond)} = 1"
+        if ok is not None:
+            sql += " AND ok = ?"
+            args.append(int(ok))
+        return [dict(self._result(r), date=r["date"]) for r in self._query(sql + " ORDER BY date", args)]
+
+    # ── 持倉 ────────────────────────────────────────────────────
+    def _save_holdings(self, c, holdings):
+        c.execute("DELETE FROM holdings")
+        c.executemany("INSERT INTO holdings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+            (h["code"], h.get("name", h["code"]), h.get("entry_price", 0), h.get("qty", 1),
+             h.get("stop_loss", 0), h.get("target_price", h.get("target", 0)),
+             int(h.get("is_holding", h.get("entry_price", 0) > 0)),
+             json.dumps(h, ensure_ascii=False), _now())
+            for h in normalize_holdings(holdings)
+        ])
+
+    def save_holdings(self, holdings):
+        """整批替換持倉（list 或 {code: {...}} dict 皆可）"""
+        with self._write() as c:
+            self._save_holdings(c, holdings)
+
+    def load_holdings(self) -> list:
+        """持倉列表（原始欄位 + 資料表欄位的最新值）"""
+        holdings = []
+        for r in self._query("SELECT * FROM holdings ORDER BY code"):
+            h = json.loads(r["data"]) if r["data"] else {}
+            h.update(code=r["code"], entry_price=r["entry_price"], qty=r["qty"], is_holding=bool(r["is_holding"]))
+            holdings.append(h)
+        return holdings
+
+    def close_holding(self, code: str):
+        """賣出後標記持倉結束（entry_price=0、is_holding=False）"""
+        with self._write() as c:
+            c.execute("UPDATE holdings SET entry_price = 0, is_holding = 0, updated_at = ? WHERE code = ?",
+                      (_now(), code))
+
+    def set_holding_qty(self, code: str, qty: int):
+        """部分成交後更新剩餘股數"""
+        with self._write() as c:
+            c.execute("UPDATE holdings SET qty = ?, updated_at = ? WHERE code = ?", (qty, _now(), code))
+
+    # ── 追蹤清單 ────────────────────────────────────────────────
+    def save_tracking(self, day: str, holdings, watchlist: list) -> dict:
+        """寫入當日追蹤清單與持倉（同一交易），回傳 tracking_list.json 格式"""
+        with self._write() as c:
+            self._save_holdings(c, holdings)
+            c.execute("DELETE FROM tracking WHERE date = ?", (day,))
+            c.executemany("INSERT INTO tracking VALUES (?, ?, ?, ?, ?, ?)", [
+                (day, s["code"], rank, s.get("name", s["code"]), s.get("confidence"),
+                 json.dumps(s, ensure_ascii=False))
+                for rank, s in enumerate(watchlist, 1)
+            ])
+        return self.load_tracking(day)
+
+    def load_tracking(self, day: str = None):
+        """
+        最新（或 day 當日以前最新）的追蹤清單，格式同 tracking_list.json：
+        {date, updated_at, holdings, watchlist, total}；沒有資料回傳 None
+        """
+        sql = "SELECT MAX(date) AS d FROM tracking"
+        rows = self._query(sql + " WHERE date <= ?", (day,)) if day else self._query(sql)
+        latest = rows[0]["d"] if rows else None
+        holdings = self.load_holdings()
+        if latest is None and not holdings:
+            return None
+        watchlist = [json.loads(r["data"]) for r in
+                     self._query("SELECT data FROM tracking WHERE date = ? ORDER BY rank", (latest,))]
+        return {
+            "date": latest,
+            "updated_at": _now(),
+            "holdings": holdings,
+            "watchlist": watchlist,
+            "total": len(holdings) + len(watchlist),
+        }
+
+    def export_tracking(self, path: str, day: str = None):
+        """匯出 tracking_list.json（先寫暫存檔再 rename，讀取端不會讀到半個檔案）"""
+        data = self.load_tracking(day)
+        if data is None:
+            return None
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+        return data
+
+    # ── 信號 ────────────────────────────────────────────────────
+    def add_signal(self, code: str, kind: str, price: float = None, data: dict = None, source: str = None):
+        """記錄一筆信號（ENTRY / STOP_LOSS / TARGET ...）"""
+        now = datetime.now()
+        with self._write() as c:
+            c.execute("INSERT INTO signals (ts, date, code, kind, price, source, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                      (now.isoformat(timespec="milliseconds"), now.date().isoformat(), code, kind, price, source,
+                       json.dumps(data, ensure_ascii=False) if data is not None else None))
+
+    def signals(self, day: str = None, code: str = None, kind: str = None) -> list:
+        sql, args = "SELECT * FROM signals WHERE 1 = 1", []
+        for col, val in (("date", day), ("code", code), ("kind", kind)):
+            if val is not None:
+                sql += f" AND {col} = ?"
+                args.append(val)
+        out = []
+        for r in self._query(sql + " ORDER BY ts", args):
+            s = dict(r)
+            s["data"] = json.loads(s["data"]) if s["data"] else None
+            out.append(s)
+        return out
+
+
+    # ── 明日門檻 ────────────────────────────────────────────────
+    def save_whatif(self, day: str, rows: list):
+        """寫入 day 收盤後解出的明日門檻（同日重跑時整天覆蓋）"""
+        with self._write() as c:
+            c.execute("DELETE FROM whatif WHERE date = ?", (day,))
+            c.executemany("INSERT INTO whatif VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                (day, r["code"], r.get("price_min"), r.get("price_max"), r.get("volume_min"),
+                 int(bool(r.get("feasible"))), json.dumps(r, ensure_ascii=False))
+                for r in rows
+            ])
+
+    def load_whatif(self, day: str = None, feasible: bool = True) -> dict:
+        """最新（或 day 當日以前最新）一次的明日門檻 {code: row}"""
+        sql = "SELECT MAX(date) AS d FROM whatif"
+        rows = self._query(sql + " WHERE date <= ?", (day,)) if day else self._query(sql)
+        return self._whatif_rows(rows[0]["d"] if rows else None, feasible)
+
+    def load_whatif_latest(self, before: str, feasible: bool = True) -> dict:
+        """
+        before 之前（不含當日）最近一次的明日門檻 {code: row}
+        盤中傳今天：取前一個有資料的交易日收盤後解出的門檻（跨週末 / 連假也找得到）
+        """
+        rows = self._query("SELECT MAX(date) AS d FROM whatif WHERE date < ?", (before,))
+        return self._whatif_rows(rows[0]["d"] if rows else None, feasible)
+
+    def _whatif_rows(self, latest: str, feasible: bool) -> dict:
+        if latest is None:
+            return {}
+        sql, args = "SELECT code, data FROM whatif WHERE date = ?", [latest]
+        if feasible:
+            sql += " AND feasible = 1"
+        return {r["code"]: dict(json.loads(r["data"]), date=latest) for r in self._query(sql, args)}
+
+
+    # ── MA 快取 ─────────────────────────────────────────────────
+    def save_ma_cache(self, rows: list, source: str = None):
+        """
+        寫入 MA5 / MA20（rows: [{'code', 'date', 'ma5', 'ma20'}]，date = MA 計算到的交易日）
+        """
+        now = _now()
+        with self._write() as c:
+            c.executemany("INSERT OR REPLACE INTO ma_cache VALUES (?, ?, ?, ?, ?, ?)", [
+                (r["date"], r["code"], r["ma5"], r["ma20"], r.get("source", source), now)
+                for r in rows if r.get("date") and r.get("ma5") is not None and r.get("ma20") is not None
+            ])
+
+    def load_ma_cache(self, codes: list = None, day: str = None) -> dict:
+        """
+        各股 day（預設今天）以前最新的 MA {code: {'date', 'ma5', 'ma20', 'source'}}
+        早於前一交易日（intraday_ma.previous_weekday，同日K庫的新鮮度檢查）的資料視為過期，不回傳（呼叫端重查）
+        """
+        day = day or str(date.today())
+        since = previous_weekday(day)
+        # SQLite：MAX() 聚合時其他欄位取自同一列
+        rows = self._query("SELECT code, MAX(date) AS date, ma5, ma20, source FROM ma_cache "
+                           "WHERE date <= ? AND date >= ? GROUP BY code", (day, since))
+        wanted = set(codes) if codes is not None else None
+        return {r["code"]: {"date": r["date"], "ma5": r["ma5"], "ma20": r["ma20"], "source": r["source"]}
+                for r in rows if wanted is None or r["code"] in wanted}
+
+
+    # ── 委託 ────────────────────────────────────────────────────
+    def save_order(self, order: dict):
+        """寫入 / 更新一筆委託（order_executor 每次狀態變化時呼叫）"""
+        with self._write() as c:
+            c.execute("INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                      (order["id"], order["date"], order["code"], order["action"], order.get("qty"),
+                       order.get("price"), order["state"], order.get("attempt"), order.get("order_no"),
+                       order.get("submit_ms"), order.get("ack_ms"),
+                       json.dumps(order, ensure_ascii=False, default=str), _now()))
+
+    def load_orders(self, day: str = None, code: str = None) -> list:
+        """某日（預設今天）的委託，依 id 排序"""
+        sql, args = "SELECT data FROM orders WHERE date = ?", [day or str(date.today())]
+        if code is not None:
+            sql += " AND code = ?"
+            args.append(code)
+        return [json.loads(r["data"]) for r in self._query(sql + " ORDER BY id", args)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="策略A 結果庫查詢")
+    parser.add_argument("--db", default=DEFAULT_DB, help="資料庫路徑")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("history", help="個股歷史篩選結果")
+    p.add_argument("code")
+    p.add_argument("--cond", type=int, help="只列條件 N 成立的交易日（1~6）")
+    p.add_argument("--ok", action="store_true", help="只列六條件全過的交易日")
+    p.add_argument("--since", help="起始日 YYYY-MM-DD")
+    p = sub.add_parser("day", help="某日篩選結果")
+    p.add_argument("date", nargs="?", default=str(date.today()))
+    p.add_argument("--ok", action="store_true", help="只列六條件全過")
+    sub.add_parser("tracking", help="最新追蹤清單")
+    p = sub.add_parser("signals", help="信號紀錄")
+    p.add_argument("--date", default=str(date.today()))
+    p.add_argument("--code")
+    p = sub.add_parser("orders", help="委託紀錄")
+    p.add_argument("--date", default=str(date.today()))
+    p.add_argument("--code")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.db)
+    if args.cmd == "history":
+        rows = store.history(args.code, cond=args.cond, ok=True if args.ok else None, since=args.since)
+        for r in rows:
+            print(f"{r['date']}  {r['conditions_met']}/6  收={r['close']} gap={r['gap']}% 量={r['avg_volume_lots']}張")
+        print(f"[結果庫] {args.code} 共 {len(rows)} 個交易日")
+    elif args.cmd == "day":
+        rows = store.screen_results(args.date, ok=True if args.ok else None)
+        for r in rows:
+            print(f"{r['code']} {r['name']}  {r['conditions_met']}/6  信心={r['confidence']}%")
+        print(f"[結果庫] {args.date} 共 {len(rows)} 檔")
+    elif args.cmd == "tracking":
+        print(json.dumps(store.load_tracking(), ensure_ascii=False, indent=2))
+    elif args.cmd == "signals":
+        for s in store.signals(day=args.date, code=args.code):
+            print(f"{s['ts']}  {s['code']}  {s['kind']}  {s['price']}  {s['source'] or ''}")
+    elif args.cmd == "orders":
+        for o in store.load_orders(day=args.date, code=args.code):
+            print(f"{o['id']}  {o['action']}  {o['qty']}  {o['state']}  送單={o.get('submit_ms')}ms "
+                  f"回報={o.get('ack_ms')}ms  {o.get('error') or o.get('order_no') or ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+StatusWriter - 狀態檔合併寫入
+==============================
+盤中監控每個 tick / 信號都會更新狀態，但狀態檔（/tmp/trading_status.json）只是給外部讀取的快照，
+不需要每次都落地。StatusWriter 以獨立執行緒寫檔：
+
+- publish(data, lock)：只記下「有新狀態」並喚醒寫入執行緒，tick 處理不碰檔案 I/O
+- 兩次寫入至少相隔 interval_ms；期間的多次 publish 合併成一次（coalesced 計數）
+- orjson 序列化（未安裝時退回 json），先寫 {path}.tmp 再 os.replace，讀取端不會讀到半份檔案
+
+data 由呼叫端持續修改：寫入執行緒在 lock（呼叫端修改 data 時持有的鎖）內逐層複製 dict / list，
+序列化的是複製品，不會遇到其他執行緒同時增刪鍵。
+
+用法：
+  writer = StatusWriter(STATUS_FILE, interval_ms=200)
+  writer.publish(status, lock)  # 任意執行緒、任意頻率
+  writer.stats()                # {'published', 'writes', 'coalesced', 'errors', 'last_write_ms'}
+  writer.close()                # 寫出最後狀態並停止
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+try:
+    import orjson
+except ImportError:  # 沒有 orjson 時用標準庫
+    orjson = None
+
+DEFAULT_INTERVAL_MS = 200
+
+
+def dumps(data) -> bytes:
+    """狀態 → UTF-8 JSON（縮排 2，中文不跳脫）"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, indent=2, default=str).encode("utf-8")
+
+
+def snapshot(data):
+    """dict / list 逐層複製（其他值共用），之後呼叫端再修改也不影響"""
+    if isinstance(data, dict):
+        return {k: snapshot(v) for k, v in data.items()}
+    if isinstance(data, list):
+        return [snapshot(v) for v in data]
+    return data
+
+
+def write_atomic(path: str, data) -> int:
+    """寫入暫存檔後 os.replace（同目錄，原子替換），回傳位元組數"""
+    payload = dumps(data)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(payload)
+    os.replace(tmp, path)
+    return len(payload)
+
+
+class StatusWriter:
+    """背景執行緒合併寫入狀態檔"""
+
+    def __init__(self, path: str, interval_ms: int = DEFAULT_INTERVAL_MS, on_error=None):
+        self.path = path
+        self.interval = interval_ms / 1000
+        self.on_error = on_error
+        self._data = None
+        self._lock = None
+        self._pending = 0          # 上次寫入後累積的 publish 次數
+        self._cond = threading.Condition()
+        self._closed = False
+        self.published = 0
+        self.writes = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.last_write_ms = 0.0
+        self._thread = threading.Thread(target=self._run, name="status-writer", daemon=True)
+        self._thread.start()
+
+    def publish(self, data: dict, lock=None):
+        """登記新狀態（不阻塞；實際寫入由背景執行緒處理）；lock 為呼叫端修改 data 時持有的鎖"""
+        with self._cond:
+            self._data = data
+            self._lock = lock
+            self._pending += 1
+            self.published += 1
+            self._cond.notify()
+
+    def _run(self):
+        last = 0.0
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+            # 距上次寫入不足 interval 時先等，期間的 publish 併入這次
+            wait = last + self.interval - time.monotonic()
+            if wait > 0 and not self._closed:
+                time.sleep(wait)
+            self._flush()
+            last = time.monotonic()
+
+    def _flush(self):
+        with self._cond:
+            data, lock, pending = self._data, self._lock, self._pending
+            self._pending = 0
+        if not pending:
+            return
+        t0 = time.perf_counter()
+        try:
+            with lock or nullcontext():
+                data = snapshot(data)
+            write_atomic(self.path, data)
+        except Exception as e:
+            self.errors += 1
+            if self.on_error:
+                self.on_error(e)
+            return
+        self.last_write_ms = round((time.perf_counter() - t0) * 1000, 3)
+        self.writes += 1
+        self.coalesced += pending - 1
+
+    def stats(self) -> dict:
+        return {
+            "published": self.published,
+            "writes": self.writes,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "last_write_ms": self.last_write_ms,
+        }
+
+    def close(self, timeout: float = 5.0):
+        """寫出最後一份狀態並結束執行緒"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
@@ -17,8 +17,9 @@
 
 【API】
 - TWSE: 股票清單 + 今日收盤價（1次）
-- Fubon SDK: sma(5) + sma(20) + kdj + candles（每檔4次）
-- Rate Limit: 60次/分鐘（每呼叫間隔 1 秒）
+- Fubon SDK: candles（每檔1次，只補本地缺少的日期）
+- MA5 / MA20 / KDJ 由本地日K庫（candle_store）計算（indicators）
+- Rate Limit: 60次/分鐘（由 quota_broker 與盤中監控共用額度）
 """
 import sys
 import json
@@ -26,271 +27,182 @@ import time
 import os
 from datetime import datetime, date, timedelta
 
+import numpy as np
+
+from twse_ingest import fetch_mi_index, parse_mi_index, ingest
+from quota_broker import BUCKET_LIMITS
+from async_fubon import AsyncFubonComplete
+from results_store import ResultsStore
+
 # ====== 設定 ======
 WORKSPACE = "/home/admin/.openclaw/workspace"
 PDRIVE = "/home/admin/pCloudDrive/openclaw/stock-screener"
-OUTPUT_FILE = f"{PDRIVE}/data/tracking_list.json"
-STATE_FILE = f"{WORKSPACE}/tmp/strategy_a_state.json"
+OUTPUT_FILE = f"{PDRIVE}/data/tracking_list.json"  # 相容匯出（主資料在 RESULTS_DB）
+RESULTS_DB = f"{WORKSPACE}/stock-screener/data/results.db"
+STATE_FILE = f"{WORKSPACE}/tmp/strategy_a_state.jsonl"  # 掃描進度日誌（append-only，--resume 用）
 LOG_FILE = f"{PDRIVE}/logs/strategy_a_screener.log"
-DELAY = 6   # 每檔間隔 6 秒（Rate limit: 60次/分鐘，每檔4次 = 15檔/分鐘，用6秒綽綽有餘）
-RETRY_WAIT = 120  # 遇到 429 時等候 120 秒（需等一個完整時間窗口）
-DATE_RANGE = 10  # 一次取10天日曆日
+CANDLE_DIR = f"{PDRIVE}/data/candles"
+CONDITION_DIR = f"{PDRIVE}/data/conditions"  # 每日六條件位元遮罩（condition_archive）
+DATE_RANGE = 10  # 本地已有資料時，往回重抓10天日曆日（覆蓋最後幾筆）
+HISTORY_RANGE = 90  # 本地無資料時，首次回補90天日曆日（約60個交易日，足夠 MA20 + KDJ 收斂）
+HISTORY_BARS = 60  # 本地計算指標時取最近60個交易日
+MIN_HISTORY_BARS = 30  # 本地累積滿30個交易日（MI_INDEX 每日匯入）就不再呼叫 Fubon
+
+# 預篩：用 MI_INDEX 當日資料，在呼叫 Fubon 之前排除「不可能通過」的股票
+PREFILTER = {
+    # 條件4 要求今日量是四日最大，條件6 要求四日均量 ≥ 1000張 ⇒ 今日量必須 ≥ 1000張
+    "min_today_lots": 1000,
+    # 價格區間（None = 不限；可填入 scripts/config.py screening_criteria 的 min_price / max_price）
+    "min_price": None,
+    "max_price": None,
+}
 
 # ====== TWSE 下載 ======
-def get_twse_today():
-    """從 TWSE 取得今日收盤資料（股票清單+價格）"""
-    import urllib.request
-    today = date.today()
-    date_str = today.strftime("%Y%m%d")
-    url = f"https://www.twse.com.tw/rwd/zh/afterTrading/MI_INDEX?date={date_str}&type=ALL&response=json"
+def get_twse_today(store=None):
+    """
+    從 TWSE 取得今日收盤資料（股票清單+價格）
+    同一份 MI_INDEX 順便把全市場日K（開高低收量）匯入本地日K庫
+    """
+    date_str = date.today().strftime("%Y%m%d")
     
     print(f"[TWSE] 下載資料: {date_str}")
-    req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-    with urllib.request.urlopen(req, timeout=30) as resp:
-        raw = json.loads(resp.read().decode('utf-8'))
-    
-    tables = raw.get('tables', [])
-    if not tables:
-        print("[TWSE] 無表格資料")
-        return {}
-    
-    # 找「每日收盤行情(全部)」表格
-    target_table = None
-    for t in tables:
-        title = t.get('title', '')
-        if '收盤行情' in title and '全部' in title:
-            target_table = t
-            break
+    raw = fetch_mi_index(date_str)
     
-    if not target_table:
+    if store is not None:
+        trade_date, bars = ingest(store, raw)
+    else:
+        trade_date, bars = parse_mi_index(raw)
+    if not bars:
         print("[TWSE] 找不到收盤行情表格")
         return {}
     
-    result = {}
-    skipped = 0
-    for row in target_table.get('data', []):
-        if len(row) < 9:
-            continue
-        code = row[0].strip()
-        name = row[1].strip() if len(row) > 1 else code
-        
-        # 過濾：只留上市櫃股票 + ETF
-        if not is_stock_or_etf(code):
-            skipped += 1
-            continue
-        
-        try:
-            close = float(row[8].replace(',', ''))
-            result[code] = {'name': name, 'close': close}
-        except (ValueError, IndexError):
-            continue
-    
-    print(f"[TWSE] 取得 {len(result)} 檔（已過濾 {skipped} 檔）")
+    result = {code: {'name': b['name'], 'close': b['close'], 'volume': b['volume']}
+              for code, b in bars.items()}
+    print(f"[TWSE] 取得 {len(result)} 檔（{trade_date}）" + ("，已匯入日K庫" if store is not None else ""))
     return result
 
 
-def is_stock_or_etf(code):
-    """過濾上市櫃股票 + ETF"""
-    if code.startswith('00') or code.startswith('02'):
-        return True
-    if len(code) >= 4 and len(code) <= 6 and code.isdigit():
-        first = int(code[0])
-        if first in [1, 2, 3, 4, 5, 6, 7, 8, 9]:
-            return True
-    return False
-
-
 # ====== Fubon SDK ======
 sys.path.insert(0, f"{WORKSPACE}/fubon_sdk_complete")
 from fubon_complete import FubonComplete
+from candle_store import CandleStore
+from condition_archive import ConditionArchive
+import indicators
+import whatif_solver
 
 
-def get_date_range():
-    """計算 API 查詢的日期區間（取10天）"""
+def get_date_range(last_date=None):
+    """
+    計算 API 查詢的日期區間
+    - 本地已有資料：從最後一筆往回 DATE_RANGE 天
+    - 本地無資料：回補 HISTORY_RANGE 天
+    """
     today = date.today()
-    start = today - timedelta(days=DATE_RANGE)
+    if last_date:
+        start = date.fromisoformat(last_date) - timedelta(days=DATE_RANGE)
+    else:
+        start = today - timedelta(days=HISTORY_RANGE)
     return start.strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')
 
 
-def get_technical_data(fc, code):
+# ====== 預篩 ======
+def prefilter(twse_data, codes, config=PREFILTER):
     """
-    取得技術指標資料（MA5, MA20, KDJ, 成交量）
-    一次取10天日曆日，回傳最近3-4個交易日的資料
-    遇到 429 Rate Limit：等候 60 秒後自動重試
+    依 PREFILTER 規則篩掉今日資料就能判定不可能通過的股票
+    回傳 (保留的 codes, {規則: 排除檔數})
     """
-    from_date, to_date = get_date_range()
-    results = {
-        'sma5': None,
-        'sma20': None,
-        'kdj': None,
-        'candles': None
-    }
-    
-    def safe_call(func, *args, **kwargs):
-        """帶有 429 重試機制的安全呼叫（不再這裡sleep，避免過度延遲）"""
-        for attempt in range(2):  # 最多重試 1 次
-            try:
-                result = func(*args, **kwargs)
-                return result
-            except Exception as e:
-                err_str = str(e)
-                if '429' in err_str or 'Rate limit' in err_str:
-                    print(f"\n  [RATE LIMIT] 等待 {RETRY_WAIT} 秒後重試...")
-                    time.sleep(RETRY_WAIT)
-                    continue
-                else:
-                    raise
-        return None
-    
-    # 1. MA5（帶日期區間）
-    sma5 = safe_call(fc.get_sma, code, period=5, from_date=from_date, to_date=to_date)
-    if sma5 and len(sma5) >= 4:
-        results['sma5'] = sma5[-4:]
-    else:
-        return results
-    
-    # 2. MA20（帶日期區間）
-    sma20 = safe_call(fc.get_sma, code, period=20, from_date=from_date, to_date=to_date)
-    if sma20 and len(sma20) >= 4:
-        results['sma20'] = sma20[-4:]
-    else:
-        return results
-    
-    # 3. KDJ（帶日期區間，回傳陣列）
-    kdj = safe_call(fc.get_kdj, code, from_date=from_date, to_date=to_date)
-    if kdj and len(kdj) >= 3:
-        results['kdj'] = kdj[-3:]
-    else:
-        return results
-    
-    # 4. 成交量（candles，帶日期區間）
-    candles = safe_call(fc.get_candles, code, from_date=from_date, to_date=to_date)
-    if candles and len(candles) >= 4:
-        results['candles'] = candles[-4:]
-    
-    return results
+    rules = []
+    if config.get("min_today_lots"):
+        min_shares = config["min_today_lots"] * 1000
+        rules.append(("today_lots", lambda d: d.get('volume') is None or d['volume'] >= min_shares))
+    if config.get("min_price") is not None:
+        rules.append(("min_price", lambda d: d['close'] >= config["min_price"]))
+    if config.get("max_price") is not None:
+        rules.append(("max_price", lambda d: d['close'] <= config["max_price"]))
+    
+    kept, dropped = [], {name: 0 for name, _ in rules}
+    for code in codes:
+        d = twse_data[code]
+        failed = next((name for name, rule in rules if not rule(d)), None)
+        if failed:
+            dropped[failed] += 1
+        else:
+            kept.append(code)
+    return kept, dropped
+
+
+def needs_sync(store, code):
+    """本地日K庫缺今日K線，或歷史不足以計算指標"""
+    return (store.last_date(code) != date.today().isoformat()
+            or store.count(code) < MIN_HISTORY_BARS)
+
+
+def candle_range(store, code):
+    """需要向 Fubon 補的 candles 日期區間（歷史不足就整段回補，否則只補最後一段）"""
+    last = store.last_date(code) if store.count(code) >= MIN_HISTORY_BARS else None
+    return get_date_range(last)
 
 
-def analyze_strategy_a(code, twse_data, tech_data):
+def analyze_universe(store, twse_data, codes):
     """
-    策略A分析
-    條件1: MA5 斜率 > 0（最近3個交易日連續上升）
-    條件2: Gap < 2%
-    條件3: Gap 三日縮小
-    條件4: 成交量連四日放大
-    條件5: K < 25 且 D < 25（最近3個交易日每天都滿足）
-    條件6: 日均成交張數 >= 1000
+    策略A 全市場向量化分析（條件見 indicators.strategy_a）
+    從日K庫取出 股票 × 交易日 矩陣，一次算出六條件布林遮罩
+    只分析今日K線已入庫的股票，回傳每檔結果 dict 的列表
     """
-    today_data = twse_data.get(code)
-    if not today_data:
-        return None
-    
-    close = today_data.get('close')
-    if not close or close <= 0:
-        return None
-    
-    sma5 = tech_data.get('sma5')
-    sma20 = tech_data.get('sma20')
-    kdj = tech_data.get('kdj')
-    candles = tech_data.get('candles')
-    
-    # 檢查基本資料
-    if not all([sma5, sma20, kdj, candles]):
-        return None
-    
-    if not (len(sma5) >= 3 and len(sma20) >= 3 and len(kdj) >= 3 and len(candles) >= 4):
-        return None
-    
-    # ===== 條件1: MA5 斜率 > 0（最近3個交易日連續上升）=====
-    # 取最近3個交易日的 MA5
-    ma5_d1 = sma5[-3]['sma']  # 三天前
-    ma5_d2 = sma5[-2]['sma']  # 兩天前
-    ma5_d3 = sma5[-1]['sma']  # 今天
-    cond1 = (ma5_d3 > ma5_d2 > ma5_d1)
-    
-    # ===== 條件2: Gap < 2% = (MA20 - MA5) / MA20 < 2% =====
-    m5 = sma5[-1]['sma']
-    m20 = sma20[-1]['sma']
-    if m20 <= 0:
-        return None
-    gap = (m20 - m5) / m20 * 100
-    cond2 = (gap < 2.0)
-    
-    # ===== 條件3: Gap 三日縮小 =====
-    # 取最近3個交易日的 Gap
-    gaps = []
-    for i in range(-4, 1):
-        idx = len(sma20) + i
-        if 0 <= idx < len(sma5):
-            m5i = sma5[idx]['sma']
-            m20i = sma20[idx]['sma']
-            if m20i > 0:
-                gaps.append((m20i - m5i) / m20i * 100)
-    
-    if len(gaps) < 4:
-        return None
-    # gaps[-4], gaps[-3], gaps[-2], gaps[-1] = 4天前的gap, 3天前的gap, 2天前的gap, 今天gap
-    # 條件: 今天 < 2天前 < 3天前 < 4天前（差距越來越小）
-    cond3 = (gaps[-1] < gaps[-2] < gaps[-3] < gaps[-4])
-    
-    # ===== 條件4: 成交量連四日放大 =====
-    # candles[-4], candles[-3], candles[-2], candles[-1] = 4天前, 3天前, 2天前, 今天
-    vol_1 = candles[-4]['volume']  # 大前日
-    vol_2 = candles[-3]['volume']  # 前日
-    vol_3 = candles[-2]['volume']  # 昨日
-    vol_4 = candles[-1]['volume']  # 今日
-    cond4 = (vol_4 > vol_3 > vol_2 > vol_1)
-    
-    # ===== 條件5: K < 25 且 D < 25（最近3個交易日每天都滿足）=====
-    cond5 = all(
-        k['k'] < 25 and k['d'] < 25
-        for k in kdj
-    )
-    
-    # ===== 條件6: 日均成交張數 >= 1000 =====
-    # candles volume 是股數，1張=1000股
-    total_vol = sum(c['volume'] for c in candles)
-    avg_vol_shares = total_vol / 4
-    avg_vol_lots = avg_vol_shares / 1000
-    cond6 = (avg_vol_lots >= 1000)
-    
-    # ===== 信心度 =====
-    conditions_met = sum([cond1, cond2, cond3, cond4, cond5, cond6])
-    confidence = conditions_met / 6 * 100
-    
-    return {
-        'code': code,
-        'name': today_data.get('name', code),
-        'close': close,
-        'ma5': round(m5, 2),
-        'ma20': round(m20, 2),
-        'gap': round(gap, 3),
-        'avg_volume_lots': round(avg_vol_lots, 1),
-        'cond1_ma5_slope': cond1,
-        'cond2_gap_2pct': cond2,
-        'cond3_gap_shrinking': cond3,
-        'cond4_volume_up': cond4,
-        'cond5_kd_below_25': cond5,
-        'cond6_volume_1k': cond6,
-        'conditions_met': conditions_met,
-        'confidence': round(confidence, 1),
-        'ok': conditions_met == 6
-    }
-
-
-# ====== 追蹤清單管理 ======
-def load_tracking_list():
-    """載入現有追蹤清單"""
-    if os.path.exists(OUTPUT_FILE):
+    today = date.today().isoformat()
+    today_col = store.date_index.get(today)
+    if today_col is None:
+        return []
+    codes = [c for c in codes if (twse_data.get(c) or {}).get('close', 0) > 0]
+    fresh = store.latest(codes) == today_col
+    codes = [c for c, ok in zip(codes, fresh) if ok]
+    if not codes:
+        return []
+    
+    m = {f: store.matrix(f, codes, HISTORY_BARS) for f in ('high', 'low', 'close', 'volume')}
+    a = indicators.strategy_a(m['high'], m['low'], m['close'], m['volume'])
+    
+    # 只看最後一欄（今日）
+    last = {key: val[:, -1] for key, val in a.items()}
+    results = []
+    for i in np.flatnonzero(last['valid'] & (last['ma20'] > 0)):
+        code = codes[i]
+        met = int(last['conditions_met'][i])
+        results.append({
+            'code': code,
+            'name': twse_data[code].get('name', code),
+            'close': twse_data[code]['close'],
+            'ma5': round(float(last['ma5'][i]), 2),
+            'ma20': round(float(last['ma20'][i]), 2),
+            'gap': round(float(last['gap'][i]), 3),
+            'avg_volume_lots': round(float(last['avg_lots'][i]), 1),
+            'cond1_ma5_slope': bool(last['cond1'][i]),
+            'cond2_gap_2pct': bool(last['cond2'][i]),
+            'cond3_gap_shrinking': bool(last['cond3'][i]),
+            'cond4_volume_up': bool(last['cond4'][i]),
+            'cond5_kd_below_25': bool(last['cond5'][i]),
+            'cond6_volume_1k': bool(last['cond6'][i]),
+            'conditions_met': met,
+            'confidence': round(met / 6 * 100, 1),
+            'ok': met == 6
+        })
+    return results
+
+
+def load_tracking_list(db):
+    """載入現有追蹤清單（結果庫沒有資料時讀舊的 tracking_list.json）"""
+    data = db.load_tracking()
+    if data is None and os.path.exists(OUTPUT_FILE):
         with open(OUTPUT_FILE, 'r') as f:
             data = json.load(f)
-            return data.get('holdings', []), data.get('watchlist', [])
-    return [], []
+    if data is None:
+        return [], []
+    return data.get('holdings', []), data.get('watchlist', [])
 
 
-def save_tracking_list(holdings, watchlist, new_filtered):
+def save_tracking_list(db, holdings, watchlist, new_filtered):
     """
-    保存追蹤清單
+    保存追蹤清單（寫入結果庫，並匯出 tracking_list.json）
     - 庫存股票自動保留
     - 新篩選結果按信心度排序加入
     - 總數最多20檔
@@ -307,64 +219,168 @@ def save_tracking_list(holdings, watchlist, new_filtered):
             tracking.append(stock)
     
     today = str(date.today())
-    output = {
-        'date': today,
-        'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        'holdings': holdings,
-        'watchlist': [s for s in tracking if s['code'] not in [h['code'] for h in holdings]],
-        'total': len(tracking)
-    }
-    
-    with open(OUTPUT_FILE, 'w') as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
-    
-    return output
+    holding_codes = [h['code'] for h in holdings]
+    db.save_tracking(today, holdings, [s for s in tracking if s['code'] not in holding_codes])
+    return db.export_tracking(OUTPUT_FILE, today)
+
+
+# ====== 掃描進度日誌（斷點續掃）======
+def load_scan_state(today):
+    """
+    讀取 STATE_FILE，回傳 (當日 TWSE 資料, {code: candles})
+    日誌不是今天的、或不存在時回傳 (None, {})
+    """
+    if not os.path.exists(STATE_FILE):
+        return None, {}
+    twse_data, done = None, {}
+    with open(STATE_FILE) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # 程式中斷時寫到一半的行
+            if entry.get('type') == 'start':
+                if entry.get('date') != today:
+                    return None, {}
+                twse_data = entry.get('twse')
+            elif entry.get('type') == 'symbol':
+                done[entry['code']] = entry.get('candles') or []
+    return twse_data, done
+
+
+def open_scan_state(today, twse_data, resume):
+    """開啟日誌：續掃時附加，否則重新開始並寫入表頭（含當日 TWSE 資料）"""
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    if resume:
+        # 上次中斷在行中間時先補換行，避免和下一筆黏在一起
+        broken = False
+        with open(STATE_FILE, 'rb') as f:
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                broken = f.read(1) != b'\n'
+        f = open(STATE_FILE, 'a')
+        if broken:
+            f.write('\n')
+        return f
+    f = open(STATE_FILE, 'w')
+    append_scan_state(f, {'type': 'start', 'date': today, 'twse': twse_data})
+    return f
+
+
+def append_scan_state(f, entry):
+    """附加一筆日誌並立即寫出（中斷時最多遺失當下這一檔）"""
+    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    f.flush()
 
 
 # ====== 主要流程 ======
 def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="策略A 技術動能篩選")
+    parser.add_argument("--resume", action="store_true", help="從今日中斷的進度繼續（不重新下載已取得的資料）")
+    parser.add_argument("--no-prefilter", action="store_true", help="不做預篩，全部股票都分析")
+    args = parser.parse_args()
+    
     now = datetime.now()
     print(f"\n[{'='*60}]")
     print(f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] 策略A篩選啟動")
     print(f"[{'='*60}]\n")
     
-    # Step 1: 從 TWSE 取得今日資料
-    twse_data = get_twse_today()
+    # 本地日K庫
+    store = CandleStore(CANDLE_DIR)
+    db = ResultsStore(RESULTS_DB)
+    
+    # Step 1: 從 TWSE 取得今日資料（同時匯入全市場日K）；續掃時沿用日誌中的資料
+    today = str(date.today())
+    twse_data, done = load_scan_state(today) if args.resume else (None, {})
+    resume = twse_data is not None
+    if resume:
+        # 日誌內的 candles 重新寫回日K庫（上次中斷前可能還沒 flush）
+        for code, candles in done.items():
+            store.upsert(code, candles)
+        store.flush()
+        print(f"[續掃] 沿用 {today} 進度：已完成 {len(done)} 檔")
+    else:
+        if args.resume:
+            print("[續掃] 沒有今日的進度日誌，重新開始")
+        twse_data = get_twse_today(store)
     if not twse_data:
         print("[ERROR] 無法取得 TWSE 資料，掃描終止")
         return
     
-    # Step 2: 登入 Fubon SDK
-    fc = FubonComplete()
-    fc._load_config()
-    fc.login()
-    print()
-    
-    # Step 3: 載入現有追蹤清單
-    holdings, current_watchlist = load_tracking_list()
-    print(f"[追蹤] 庫存: {len(holdings)} 檔")
-    
-    # Step 4: 分析每檔股票
-    results = []
     codes = list(twse_data.keys())
     total = len(codes)
     
-    print(f"[INFO] 總共 {total} 檔待篩選")
-    print(f"[INFO] 每呼叫間隔 {DELAY} 秒，預計耗時 {total * 4 * DELAY / 60:.0f} 分鐘\n")
+    # 預篩：省下不可能通過股票的 Fubon 呼叫
+    if not args.no_prefilter:
+        kept, dropped = prefilter(twse_data, codes)
+        kept_set = set(kept)
+        saved_calls = sum(1 for c in codes if c not in kept_set and c not in done and needs_sync(store, c))
+        seconds_per_call = 60 / BUCKET_LIMITS["historical"]
+        print(f"[預篩] 保留 {len(kept)}/{total} 檔，排除 {dropped}")
+        print(f"[預篩] 省下 {saved_calls} 次 API 呼叫（約 {saved_calls * seconds_per_call:.0f} 秒）")
+        codes = kept
+    pending = [c for c in codes if c not in done and needs_sync(store, c)]
+    state = open_scan_state(today, twse_data, resume)
+    
+    # Step 2: 登入 Fubon SDK（日K庫已足夠時免登入）
+    fc = None
+    if pending:
+        fc = FubonComplete(caller="strategy_a_screener")
+        fc._load_config()
+        fc.login()
+        print()
     
-    for i, code in enumerate(codes):
-        tech_data = get_technical_data(fc, code)
-        time.sleep(DELAY)  # 每檔查完後休息一下，避免超過 Rate Limit
-        result = analyze_strategy_a(code, twse_data, tech_data)
-        
-        if result:
-            results.append(result)
-        
-        # 進度報告
-        if (i + 1) % 100 == 0 or (i + 1) == total:
-            print(f"  進度: {i+1}/{total} ({(i+1)*100//total}%)")
+    # Step 3: 載入現有追蹤清單
+    holdings, current_watchlist = load_tracking_list(db)
+    print(f"[追蹤] 庫存: {len(holdings)} 檔")
     
-    # Step 5: 分類結果
+    # Step 4: 補齊日K庫歷史不足的股票
+    print(f"[INFO] 總共 {total} 檔待篩選，其中 {len(pending)} 檔需向 Fubon 補日K")
+    print(f"[INFO] 額度由 quota_broker 統一控管（60次/分鐘），預計耗時 {len(pending) / 60:.0f} 分鐘\n")
+    
+    # 多筆請求同時在途（延遲重疊），速率由 FubonComplete 向 quota_broker 取 token 控制；
+    # 結果在事件迴圈單一執行緒回呼，寫日K庫與日誌不需加鎖
+    jobs = []
+    for code in pending:
+        from_date, to_date = candle_range(store, code)
+        jobs.append((code, 'get_candles', (code,), {'from_date': from_date, 'to_date': to_date}))
+    
+    progress = {'done': 0}
+    def on_candles(code, candles):
+        progress['done'] += 1
+        if candles:
+            store.upsert(code, candles)
+        if candles is not None:
+            append_scan_state(state, {'type': 'symbol', 'code': code, 'candles': candles})
+        
+        # 進度報告（順便把日K庫寫回磁碟）
+        n = progress['done']
+        if n % 100 == 0 or n == len(pending):
+            store.flush()
+            print(f"  進度: {n}/{len(pending)} ({n*100//len(pending)}%) API呼叫: {n}")
+    
+    fetcher = AsyncFubonComplete(fc)
+    fetcher.run(jobs, on_done=on_candles)
+    if pending:
+        print(f"[INFO] 實際請求速率 {fetcher.rate_per_min:.1f} 次/分鐘（同時在途 {fetcher.max_in_flight} 筆，"
+              f"目前有效速率 {fc.effective_rate()} 次/分鐘）")
+    
+    # Step 5: 全市場一次計算六條件
+    t0 = time.perf_counter()
+    results = analyze_universe(store, twse_data, codes)
+    print(f"[INFO] 向量化分析 {len(results)} 檔，耗時 {(time.perf_counter() - t0) * 1000:.1f} ms")
+    archive = ConditionArchive(CONDITION_DIR)
+    archive.record(today, results)
+    archive.flush()
+    # 今日收盤 MA 存入快取：明日盤中監控啟動時直接讀取
+    db.save_ma_cache([{'code': r['code'], 'date': today, 'ma5': r['ma5'], 'ma20': r['ma20']} for r in results],
+                     source='strategy_a_screener')
+    append_scan_state(state, {'type': 'complete', 'scanned': len(results),
+                              'passed': [r['code'] for r in results if r['ok']]})
+    state.close()
+    
+    # Step 6: 分類結果
     passed = [r for r in results if r['ok']]
     near = sorted([r for r in results if not r['ok'] and r['confidence'] > 0],
                   key=lambda x: -x['confidence'])[:20]
@@ -373,6 +389,7 @@ def main():
     print(f"[SUMMARY] 篩選完成！")
     print(f"[SUMMARY] 總掃描: {len(results)}/{total} 檔")
     print(f"[SUMMARY] 完全符合 (6/6): {len(passed)} 檔")
+    print(f"[SUMMARY] 接近符合（前20）: {len(near)} 檔，最高 {near[0]['conditions_met'] if near else 0}/6")
     print(f"[{'='*60}]\n")
     
     # 顯示完全符合的結果
@@ -383,25 +400,28 @@ def main():
                   f"收={p['close']} MA5={p['ma5']} MA20={p['ma20']} "
                   f"gap={p['gap']}% 量={p['avg_volume_lots']}張 信心={p['confidence']}%")
     
-    # Step 6: 更新追蹤清單
-    output = save_tracking_list(holdings, current_watchlist, passed)
+    # 接近符合：解出明日收盤價 / 成交量需落在哪裡才會六條件全過（盤中直接比對）
+    targets = whatif_solver.solve_symbols(store, [r['code'] for r in near], bars=HISTORY_BARS)
+    db.save_whatif(today, targets)
+    feasible = [t for t in targets if t['feasible']]
+    if feasible:
+        print(f"\n【明日可能通過】({len(feasible)}/{len(targets)}檔)")
+        for t in feasible[:10]:
+            print(f"  🎯 {t['code']}: {t['price_min']:.2f} < 收盤 < {t['price_max']:.2f}，"
+                  f"量 ≥ {t['volume_min_lots']}張")
+    
+    # Step 7: 更新追蹤清單
+    output = save_tracking_list(db, holdings, current_watchlist, passed)
     print(f"\n[追蹤] 清單已更新: {output['total']} 檔")
     print(f"[追蹤] 產出位置: {OUTPUT_FILE}")
     
-    # Step 7: 保存詳細結果
-    result_file = f"{PDRIVE}/data/strategy_a_results_{date.today()}.json"
-    with open(result_file, 'w') as f:
-        json.dump({
-            'date': str(date.today()),
-            'total': total,
-            'scanned': len(results),
-            'passed': passed,
-            'near': near
-        }, f, ensure_ascii=False, indent=2)
-    print(f"[檔案] 詳細結果: {result_file}")
+    # Step 8: 保存詳細結果（全部已分析股票的六條件，供歷史查詢）
+    db.save_screen(today, results, total)
+    print(f"[結果庫] {len(results)} 檔結果已寫入: {RESULTS_DB}")
     
     # 登出
-    fc.logout()
+    if fc:
+        fc.logout()
     
     print(f"\n[{'='*60}]")
     print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 篩選完成")
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+TickQueue - WebSocket 收訊與策略判斷之間的有界佇列
+==================================================
+SDK 的收訊執行緒只負責解析訊息並 put()，策略判斷、寫 log、寫狀態都在 worker 執行緒；
+判斷變慢時不會卡住 socket 讀取。
+
+容量固定（環形緩衝），滿了依 policy 處理：
+  block        收訊執行緒等待空位（不丟資料；阻塞時間計入 blocked_ms；worker 未啟動 / 已停止時改丟最舊）
+  drop_oldest  丟掉最舊的一筆（dropped +1）
+  conflate     每個 key（股票）只保留最新一筆：同 key 尚未處理的 tick 直接被取代（conflated +1），
+               只有不同 key 的數量超過容量才丟最舊（dropped +1）；適合只看最新價的停損 / 觸價判斷
+
+put(item, block=True) 不論 policy 都等待空位（斷線補資料用：一次湧入大量舊成交，不能被丟掉）。
+
+worker 每次最多取 batch 筆處理，metrics() 提供佇列深度、最大深度、丟棄 / 合併數與批次大小。
+
+用法：
+  q = TickQueue(capacity=8192, policy="drop_oldest", batch=256)
+  q.start(handler)                       # handler(item)，在 worker 執行緒呼叫
+  q.put(item, key=symbol)                # 收訊執行緒
+  q.put(item, block=True)                # 補資料執行緒（滿了就等）
+  q.metrics()
+  q.stop()
+"""
+
+import threading
+import time
+from collections import deque
+
+POLICIES = ("block", "drop_oldest", "conflate")
+DEFAULT_CAPACITY = 8192
+DEFAULT_BATCH = 256
+
+
+class TickQueue:
+    """有界 tick 佇列 + 批次處理 worker"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, policy: str = "drop_oldest",
+                 batch: int = DEFAULT_BATCH, on_error=None):
+        if policy not in POLICIES:
+            raise ValueError(f"未知的溢位策略: {policy}（可用 {', '.join(POLICIES)}）")
+        if capacity <= 0:
+            raise ValueError(f"容量必須大於 0: {capacity}")
+        self.capacity = capacity
+        self.policy = policy
+        self.batch = batch
+        self.on_error = on_error
+        self._items = deque()          # (key, item)；conflate 的 item 放在 _latest，這裡只存 key
+        self._latest = {}              # conflate：key → 最新 item
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._running = False
+        self._thread = None
+        # metrics
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.errors = 0
+        self.batches = 0
+        self.max_depth = 0
+        self.max_batch = 0
+        self.blocked_ms = 0.0
+
+    def __len__(self):
+        return len(self._items)
+
+    # ========================
+    # 收訊端
+    # ========================
+
+    def put(self, item, key=None, block: bool = False) -> bool:
+        """
+        放入一筆（key 供 conflate 使用；None = 不合併），回傳是否有資料被丟棄或取代
+        block=True 時不論 policy 都等待空位、不合併
+        """
+        with self._lock:
+            self.enqueued += 1
+            lost = False
+            if self.policy == "conflate" and key is not None and not block:
+                if key in self._latest:
+                    self._latest[key] = item
+                    self.conflated += 1
+                    return True
+                if len(self._items) >= self.capacity:
+                    self._drop_oldest()
+                    lost = True
+                self._latest[key] = item
+                self._items.append((key, None))
+            else:
+                if len(self._items) >= self.capacity:
+                    if self.policy == "block" or block:
+                        t0 = time.perf_counter()
+                        while len(self._items) >= self.capacity and self._running:
+                            self._not_full.wait(0.1)
+                        self.blocked_ms += (time.perf_counter() - t0) * 1000
+                    if len(self._items) >= self.capacity:
+                        self._drop_oldest()
+                        lost = True
+                self._items.append((None, item))
+            depth = len(self._items)
+            if depth > self.max_depth:
+                self.max_depth = depth
+            self._not_empty.notify()
+            return lost
+
+    def _drop_oldest(self):
+        key, _ = self._items.popleft()
+        if key is not None:
+            self._latest.pop(key, None)
+        self.dropped += 1
+
+    # ========================
+    # 處理端
+    # ========================
+
+    def get_batch(self, max_items: int = None, timeout: float = None) -> list:
+        """取出最多 max_items 筆（佇列空時最多等 timeout 秒，逾時回空列表）"""
+        max_items = max_items or self.batch
+        with self._lock:
+            if not self._items:
+                self._not_empty.wait(timeout)
+            out = []
+            while self._items and len(out) < max_items:
+                key, item = self._items.popleft()
+                out.append(self._latest.pop(key) if key is not None else item)
+            if out:
+                self._not_full.notify_all()
+            return out
+
+    def start(self, handler, name: str = "tick-worker"):
+        """啟動 worker：批次取出後逐筆呼叫 handler(item)"""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, args=(handler,), name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self, handler):
+        while self._running or self._items:
+            items = self.get_batch(timeout=0.5)
+            if not items:
+                continue
+            for item in items:
+                try:
+                    handler(item)
+                except Exception as e:
+                    self.errors += 1
+                    if self.on_error:
+                        self.on_error(e)
+            self.processed += len(items)
+            self.batches += 1
+            if len(items) > self.max_batch:
+                self.max_batch = len(items)
+
+    def stop(self, timeout: float = 5.0):
+        """處理完佇列內剩餘資料後停止 worker"""
+        with self._lock:
+            self._running = False
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def metrics(self) -> dict:
+        return {
+            "policy": self.policy,
+            "capacity": self.capacity,
+            "depth": len(self._items),
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+            "errors": self.errors,
+            "batches": self.batches,
+            "mean_batch": round(self.processed / self.batches, 2) if self.batches else 0,
+            "max_batch": self.max_batch,
+            "blocked_ms": round(self.blocked_ms, 3),
+        }
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+TickRecorder - 盤中 tick 逐筆記錄（定長二進位、只附加）
+======================================================
+盤中監控收到的每筆成交寫入當日檔案，事後可重播整個交易時段。
+
+目錄結構：
+  {root}/{日期}.ticks          定長紀錄（RECORD_DTYPE，28 bytes/筆，無檔頭，只附加）
+  {root}/{日期}.symbols.json   股票代號表 ["2330", "2317", ...]（紀錄裡的 sym 為索引）
+
+紀錄欄位：
+  ts      int64    成交時間（微秒，WebSocket trades 的 time；沒有時用收到的時間）
+  sym     uint32   股票代號表索引
+  price   float64  成交價
+  volume  int64    累計成交量（張，與 WebSocket trades 的 volume 相同）
+
+- record() 只把 tuple 放進記憶體緩衝（deque.append），不碰檔案，不阻塞 tick 處理
+- 背景執行緒每 flush_interval 秒（或緩衝滿 FLUSH_RECORDS 筆）轉成 NumPy 陣列一次寫出
+- 讀取用 np.memmap 直接對應成結構化陣列，不逐筆解析；寫到一半的尾端殘筆自動忽略
+
+用法：
+  rec = TickRecorder()                        # 今日檔案
+  rec.record(ts, "2330", 600.0, 12_345_000)
+  rec.close()
+
+  ticks, symbols = load_day("2026-04-14")     # 結構化 memmap + 代號表
+  python tick_recorder.py summary --day 2026-04-14
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import date
+
+import numpy as np
+
+DEFAULT_ROOT = "/home/admin/pCloudDrive/openclaw/stock-screener/data/ticks"
+RECORD_DTYPE = np.dtype([("ts", "<i8"), ("sym", "<u4"), ("price", "<f8"), ("volume", "<i8")])
+FLUSH_INTERVAL = 0.5    # 背景寫出間隔（秒）
+FLUSH_RECORDS = 4096    # 緩衝達此筆數時提前寫出
+
+
+def tick_path(root: str, day: str) -> str:
+    return os.path.join(root, f"{day}.ticks")
+
+
+def symbols_path(root: str, day: str) -> str:
+    return os.path.join(root, f"{day}.symbols.json")
+
+
+class TickRecorder:
+    """當日 tick 記錄器（緩衝 + 背景寫出）"""
+
+    def __init__(self, root: str = DEFAULT_ROOT, day: str = None, flush_interval: float = FLUSH_INTERVAL):
+        self.root = root
+        self.day = day or date.today().isoformat()
+        self.flush_interval = flush_interval
+        os.makedirs(root, exist_ok=True)
+        # 同日重啟時接續既有代號表與檔案
+        self.symbols = load_symbols(root, self.day)
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        self._symbols_written = len(self.symbols)
+        self._buffer = deque()
+        self._sym_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        path = tick_path(root, self.day)
+        self._file = open(path, "ab")
+        # 上次寫到一半中斷時截掉尾端殘筆，後續紀錄才會對齊
+        partial = os.path.getsize(path) % RECORD_DTYPE.itemsize
+        if partial:
+            self._file.truncate(os.path.getsize(path) - partial)
+        self.recorded = 0
+        self.written = 0
+        self.flushes = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="tick-recorder", daemon=True)
+        self._thread.start()
+
+    def _symbol_id(self, symbol: str) -> int:
+        sid = self.index.get(symbol)
+        if sid is None:
+            with self._sym_lock:
+                sid = self.index.get(symbol)
+                if sid is None:
+                    sid = len(self.symbols)
+                    self.symbols.append(symbol)
+                    self.index[symbol] = sid
+        return sid
+
+    def record(self, ts: int, symbol: str, price: float, volume: int):
+        """記錄一筆（ts 為 None / 0 時用目前時間）；只放進緩衝"""
+        if not ts:
+            ts = int(time.time() * 1_000_000)
+        self._buffer.append((ts, self._symbol_id(symbol), price, volume))
+        self.recorded += 1
+        if len(self._buffer) >= FLUSH_RECORDS:
+            self._wake.set()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """把緩衝寫出（背景執行緒定期呼叫；close() 時最後一次）"""
+        buf = [self._buffer.popleft() for _ in range(len(self._buffer))]
+        try:
+            # 代號表先落地，紀錄裡的 sym 一定查得到
+            if len(self.symbols) > self._symbols_written:
+                self._write_symbols()
+            if buf:
+                self._file.write(np.array(buf, dtype=RECORD_DTYPE).tobytes())
+                self._file.flush()
+                self.written += len(buf)
+                self.flushes += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"[tick 紀錄] 寫入失敗（{len(buf)} 筆）: {e}")
+
+    def _write_symbols(self):
+        path = symbols_path(self.root, self.day)
+        symbols = list(self.symbols)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(symbols, f)
+        os.replace(tmp, path)
+        self._symbols_written = len(symbols)
+
+    def stats(self) -> dict:
+        return {
+            "day": self.day,
+            "recorded": self.recorded,
+            "written": self.written,
+            "flushes": self.flushes,
+            "symbols": len(self.symbols),
+            "errors": self.errors,
+        }
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self._thread.join(5)
+        self.flush()
+        self._file.close()
+
+
+# ========================
+# 讀取
+# ========================
+
+def load_symbols(root: str, day: str) -> list:
+    path = symbols_path(root, day)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_day(day: str, root: str = DEFAULT_ROOT):
+    """
+    讀取單日紀錄 → (結構化陣列（np.memmap，唯讀）, 代號表)
+    寫入順序即收到順序；斷線補資料的成交會晚於當時的即時成交，需要時間序請依 ts 排序
+    """
+    path = tick_path(root, day)
+    symbols = load_symbols(root, day)
+    n = os.path.getsize(path) // RECORD_DTYPE.itemsize if os.path.exists(path) else 0
+    if n == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE), symbols
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(n,)), symbols
+
+
+def symbol_ticks(ticks: np.ndarray, symbols: list, code: str) -> np.ndarray:
+    """單一股票的紀錄（依 ts 排序）"""
+    if code not in symbols:
+        return ticks[:0]
+    sel = ticks[ticks["sym"] == symbols.index(code)]
+    return sel[np.argsort(sel["ts"], kind="stable")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="盤中 tick 紀錄")
+    parser.add_argument("--root", default=DEFAULT_ROOT, help="紀錄目錄")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("summary", help="單日各股筆數 / 價格區間")
+    p.add_argument("--day", default=date.today().isoformat())
+    p.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    ticks, symbols = load_day(args.day, args.root)
+    counts = np.bincount(ticks["sym"], minlength=len(symbols)) if len(ticks) else np.zeros(len(symbols), int)
+    for sid in np.argsort(-counts, kind="stable")[:args.top]:
+        if not counts[sid]:
+            break
+        prices = ticks["price"][ticks["sym"] == sid]
+        print(f"  {symbols[sid]}: {counts[sid]} 筆  {prices.min():.2f} ~ {prices.max():.2f}")
+    print(f"[tick 紀錄] {args.day} {len(ticks)} 筆 / {len(symbols)} 檔，耗時 {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+TriggerIndex - 盤中觸價索引
+============================
+啟動時把持倉的停損 / 目標價、觀察名單的進場門檻整理成 symbol → Trigger，
+每個 tick 只要一次 dict 查詢 + 一到兩次浮點比較，不再逐 tick 重算條件或線性搜尋持倉。
+
+- Trigger：單一股票的門檻（__slots__，進場區間 entry_lo < 價 < entry_hi、停損 ≤ stop、目標 ≥ target）
+- levels：所有門檻價排序後的列表（bisect），可查某價格區間內有哪些觸價點
+- LatencyStats：tick → 判斷的延遲統計（ns，保留最近 N 筆算百分位數）
+- SignalChecker / PositionMonitor：原 monitor_websocket 判斷的原樣副本，只給 bench 當基準
+
+用法：
+  index = TriggerIndex()
+  index.add_position("2330", stop=570, target=660)
+  index.set_entry("2317", lo=ma5)            # 進場：現價 > MA5（MA5 > MA20 才設定）
+  action = index.check("2330", price)       # 'STOP_LOSS' | 'TARGET' | 'ENTRY' | None
+
+  python trigger_index.py --bench            # 與舊流程（SignalChecker / PositionMonitor）比較延遲
+"""
+
+import argparse
+import bisect
+import json
+import math
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+INF = math.inf
+LATENCY_SAMPLES = 4096
+
+
+class Trigger:
+    """單一股票的觸價門檻"""
+
+    __slots__ = ("symbol", "entry_lo", "entry_hi", "stop", "target", "position")
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.entry_lo = INF      # 進場：entry_lo < 價 < entry_hi（INF = 不進場）
+        self.entry_hi = INF
+        self.stop = -INF         # 停損：價 ≤ stop
+        self.target = INF        # 目標：價 ≥ target
+        self.position = None     # 持倉資料（main() 的 holdings 項目）
+
+    def check(self, price: float) -> Optional[str]:
+        if self.position is not None:
+            if price <= self.stop:
+                return "STOP_LOSS"
+            if price >= self.target:
+                return "TARGET"
+            return None
+        if self.entry_lo < price < self.entry_hi:
+            return "ENTRY"
+        return None
+
+
+class TriggerIndex:
+    """symbol → Trigger，加上排序的門檻價列表"""
+
+    def __init__(self):
+        self.triggers: Dict[str, Trigger] = {}
+        self.levels: List[tuple] = []  # (價格, symbol, 種類)，依價格排序
+        self._dirty = False
+
+    def _get(self, symbol: str) -> Trigger:
+        trig = self.triggers.get(symbol)
+        if trig is None:
+            trig = self.triggers[symbol] = Trigger(symbol)
+        self._dirty = True
+        return trig
+
+    def add_position(self, symbol: str, stop: float = 0, target: float = 0, position: dict = None):
+        """持倉：停損 / 目標（0 或空值 = 不設）"""
+        trig = self._get(symbol)
+        trig.stop = stop if stop and stop > 0 else -INF
+        trig.target = target if target and target > 0 else INF
+        trig.position = position if position is not None else {"code": symbol}
+
+    def remove_position(self, symbol: str):
+        trig = self.triggers.get(symbol)
+        if trig is not None:
+            trig.position = None
+            trig.stop, trig.target = -INF, INF
+            self._dirty = True
+
+    def set_entry(self, symbol: str, lo: float, hi: float = INF):
+        """進場區間：lo < 價 < hi（例如 MA 條件 lo=MA5，或 whatif_solver 的 price_min / price_max）"""
+        trig = self._get(symbol)
+        trig.entry_lo, trig.entry_hi = lo, hi
+
+    def clear_entry(self, symbol: str):
+        trig = self.triggers.get(symbol)
+        if trig is not None:
+            trig.entry_lo = trig.entry_hi = INF
+            self._dirty = True
+
+    def get(self, symbol: str) -> Optional[Trigger]:
+        return self.triggers.get(symbol)
+
+    def check(self, symbol: str, price: float) -> Optional[str]:
+        """tick 判斷：'STOP_LOSS' | 'TARGET' | 'ENTRY' | None"""
+        trig = self.triggers.get(symbol)
+        if trig is None:
+            return None
+        return trig.check(price)
+
+    def rebuild_levels(self):
+        """重建排序的門檻價列表（門檻變更後呼叫；查詢時也會自動重建）"""
+        levels = []
+        for sym, trig in self.triggers.items():
+            for kind, price in (("entry", trig.entry_lo), ("stop", trig.stop), ("target", trig.target)):
+                if math.isfinite(price):
+                    levels.append((price, sym, kind))
+        levels.sort()
+        self.levels = levels
+        self._dirty = False
+
+    def levels_between(self, lo: float, hi: float) -> List[tuple]:
+        """價格落在 [lo, hi] 的所有門檻 (價格, symbol, 種類)"""
+        if self._dirty:
+            self.rebuild_levels()
+        i = bisect.bisect_left(self.levels, (lo,))
+        j = bisect.bisect_right(self.levels, (hi, chr(0x10FFFF)))
+        return self.levels[i:j]
+
+    def __len__(self):
+        return len(self.triggers)
+
+
+class LatencyStats:
+    """延遲統計（ns）：總數 / 平均 / 最大，加上最近 LATENCY_SAMPLES 筆的百分位數"""
+
+    def __init__(self, size: int = LATENCY_SAMPLES):
+        self.samples = np.zeros(size, dtype=np.int64)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, ns: int):
+        self.samples[self.count % len(self.samples)] = ns
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def summary(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        recent = self.samples[:min(self.count, len(self.samples))]
+        p50, p99 = np.percentile(recent, [50, 99])
+        return {
+            "count": self.count,
+            "mean_us": round(self.total / self.count / 1000, 2),
+            "p50_us": round(float(p50) / 1000, 2),
+            "p99_us": round(float(p99) / 1000, 2),
+            "max_us": round(self.max / 1000, 2),
+        }
+
+
+# ── 舊流程（monitor_websocket 改用 TriggerIndex 前的判斷，僅供 bench 比較）──────────
+class SignalChecker:
+    """檢查進場信號"""
+
+    def __init__(self, sdk, ma_cache: Dict[str, Dict[str, float]]):
+        self.sdk = sdk
+        self.ma_cache = ma_cache  # 預先載入的 MA 資料
+
+    def check_entry(self, symbol: str, last_price: float) -> Optional[Dict]:
+        """
+        檢查進場條件：
+        1. MA5 > MA20（黃金交叉）
+        2. 現價 > MA5
+        """
+        ma = self.ma_cache.get(symbol)
+        if not ma:
+            return None
+
+        ma5 = ma["ma5"]
+        ma20 = ma["ma20"]
+
+        cond1 = ma5 > ma20            # 黃金交叉
+        cond2 = last_price > ma5      # 價格 > MA5
+
+        signal = cond1 and cond2
+
+        return {
+            "symbol": symbol,
+            "price": last_price,
+            "ma5": ma5,
+            "ma20": ma20,
+            "gap_pct": (ma20 - ma5) / ma20 * 100 if ma20 else 0,
+            "cond1_ma5_gt_ma20": cond1,
+            "cond2_price_gt_ma5": cond2,
+            "signal": signal,
+        }
+
+
+class PositionMonitor:
+    """持倉監控，停損/目標檢查"""
+
+    @staticmethod
+    def check(position: Dict, last_price: float) -> Optional[str]:
+        """
+        檢查持倉狀態
+        回傳：'STOP_LOSS' | 'TARGET' | None
+        """
+        entry = position.get("entry", 0)
+        stop = position.get("stop", 0)
+        target = position.get("target", 0)
+
+        if not entry or not last_price:
+            return None
+
+        if stop > 0 and last_price <= stop:
+            return "STOP_LOSS"
+        if target > 0 and last_price >= target:
+            return "TARGET"
+        return None
+
+
+def bench(n_ticks: int = 200_000, n_watch: int = 200, n_hold: int = 5) -> dict:
+    """
+    同一串 tick 的判斷延遲：舊流程（線性找持倉 + PositionMonitor.check、SignalChecker.check_entry）
+    vs. TriggerIndex.check；mismatches 為兩者判斷結果不同的筆數（應為 0）
+    """
+    rng = np.random.default_rng(0)
+    watch = [f"{1000 + i}" for i in range(n_watch)]
+    holdings = [{"code": f"{9000 + i}", "entry": 100.0, "stop": 95.0, "target": 110.0} for i in range(n_hold)]
+    ma_cache = {s: {"ma5": 100.0 + rng.normal(), "ma20": 100.0 + rng.normal()} for s in watch}
+    symbols = watch + [h["code"] for h in holdings]
+    ticks = [(symbols[i], float(p)) for i, p in
+             zip(rng.integers(0, len(symbols), n_ticks), 100 + rng.normal(0, 5, n_ticks))]
+
+    # 舊流程
+    holding_codes = {h["code"] for h in holdings}
+    checker = SignalChecker(None, ma_cache)
+    before = LatencyStats()
+    old = []
+    for sym, last in ticks:
+        t0 = time.perf_counter_ns()
+        if sym in holding_codes:
+            pos = next((p for p in holdings if p["code"] == sym), None)
+            action = PositionMonitor.check(pos, last)
+        else:
+            result = checker.check_entry(sym, last)
+            action = "ENTRY" if result and result["signal"] else None
+        before.add(time.perf_counter_ns() - t0)
+        old.append(action)
+
+    # TriggerIndex
+    index = TriggerIndex()
+    for h in holdings:
+        index.add_position(h["code"], h["stop"], h["target"], h)
+    for sym, ma in ma_cache.items():
+        if ma["ma5"] > ma["ma20"]:
+            index.set_entry(sym, ma["ma5"])
+    after = LatencyStats()
+    mismatches = 0
+    for (sym, last), expected in zip(ticks, old):
+        t0 = time.perf_counter_ns()
+        action = index.check(sym, last)
+        after.add(time.perf_counter_ns() - t0)
+        mismatches += action != expected
+    return {"ticks": n_ticks, "before": before.summary(), "after": after.summary(), "mismatches": mismatches}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TriggerIndex 延遲測試")
+    parser.add_argument("--bench", action="store_true", help="與舊流程比較 tick → 判斷延遲")
+    parser.add_argument("--ticks", type=int, default=200_000)
+    args = parser.parse_args()
+    if args.bench:
+        print(json.dumps(bench(args.ticks), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+TWSE MI_INDEX 全市場日K匯入
+============================
+MI_INDEX type=ALL 一次回傳全市場收盤行情，每列都有
+成交股數、開盤價、最高價、最低價、收盤價，直接轉成當日完整日K寫入 CandleStore。
+每天只要 1 次 TWSE 呼叫，累積幾週後策略A就不需要逐檔呼叫 Fubon。
+
+用法：
+  python twse_ingest.py                          # 下載今日並匯入
+  python twse_ingest.py --date 20260414          # 指定日期
+  python twse_ingest.py --fixture mi_index.json  # 從存檔的 MI_INDEX JSON 匯入（離線）
+"""
+
+import argparse
+import json
+import urllib.request
+from datetime import date
+
+from candle_store import CandleStore, DEFAULT_ROOT
+
+MI_INDEX_URL = "https://www.twse.com.tw/rwd/zh/afterTrading/MI_INDEX?date={date}&type=ALL&response=json"
+
+# 「每日收盤行情(全部)」欄位（依 fields 名稱對應，找不到時用預設位置）
+COLUMNS = {
+    "code": ("證券代號", 0),
+    "name": ("證券名稱", 1),
+    "volume": ("成交股數", 2),
+    "open": ("開盤價", 5),
+    "high": ("最高價", 6),
+    "low": ("最低價", 7),
+    "close": ("收盤價", 8),
+}
+
+
+def is_stock_or_etf(code):
+    """過濾上市櫃股票 + ETF"""
+    if code.startswith('00') or code.startswith('02'):
+        return True
+    if len(code) >= 4 and len(code) <= 6 and code.isdigit():
+        first = int(code[0])
+        if first in [1, 2, 3, 4, 5, 6, 7, 8, 9]:
+            return True
+    return False
+
+
+def fetch_mi_index(date_str: str) -> dict:
+    """下載 MI_INDEX（date_str: YYYYMMDD）"""
+    url = MI_INDEX_URL.format(date=date_str)
+    req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        return json.loads(resp.read().decode('utf-8'))
+
+
+def load_mi_index(path: str) -> dict:
+    """讀取存檔的 MI_INDEX JSON"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def find_close_table(raw: dict):
+    """找「每日收盤行情(全部)」表格"""
+    for t in raw.get('tables', []):
+        title = t.get('title', '')
+        if '收盤行情' in title and '全部' in title:
+            return t
+    return None
+
+
+def _number(text):
+    """'1,234.5' → 1234.5；'--'、空字串 → None"""
+    try:
+        return float(str(text).replace(',', ''))
+    except (ValueError, TypeError):
+        return None
+
+
+def parse_mi_index(raw: dict, code_filter=is_stock_or_etf):
+    """
+    解析 MI_INDEX 為當日日K
+    回傳 (交易日 'YYYY-MM-DD', {code: {'name', 'open', 'high', 'low', 'close', 'volume'}})
+    無成交（收盤價為 '--'）的股票不列入
+    """
+    table = find_close_table(raw)
+    if not table:
+        return None, {}
+
+    trade_date = raw.get('date') or raw.get('params', {}).get('date', '')
+    if len(trade_date) == 8:
+        trade_date = f"{trade_date[:4]}-{trade_date[4:6]}-{trade_date[6:]}"
+
+    fields = table.get('fields', [])
+    cols = {key: fields.index(title) if title in fields else pos
+            for key, (title, pos) in COLUMNS.items()}
+    width = max(cols.values()) + 1
+
+    bars = {}
+    for row in table.get('data', []):
+        if len(row) < width:
+            continue
+        code = row[cols['code']].strip()
+        if code_filter and not code_filter(code):
+            continue
+        bar = {key: _number(row[cols[key]]) for key in ('open', 'high', 'low', 'close', 'volume')}
+        if not bar['close'] or bar['close'] <= 0:
+            continue
+        bar['name'] = row[cols['name']].strip()
+        bars[code] = bar
+    return trade_date, bars
+
+
+def ingest(store: CandleStore, raw: dict, code_filter=is_stock_or_etf):
+    """把一份 MI_INDEX 寫入日K庫，回傳 (交易日, 當日日K)"""
+    trade_date, bars = parse_mi_index(raw, code_filter)
+    if trade_date and bars:
+        store.upsert_day(trade_date, bars)
+        store.flush()
+    return trade_date, bars
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TWSE MI_INDEX 全市場日K匯入")
+    parser.add_argument("--date", default=date.today().strftime("%Y%m%d"), help="交易日 YYYYMMDD")
+    parser.add_argument("--fixture", help="從存檔的 MI_INDEX JSON 匯入（不連網）")
+    parser.add_argument("--store", default=DEFAULT_ROOT, help="日K庫目錄")
+    args = parser.parse_args()
+
+    raw = load_mi_index(args.fixture) if args.fixture else fetch_mi_index(args.date)
+    store = CandleStore(args.store)
+    trade_date, bars = ingest(store, raw)
+    if not bars:
+        print("[TWSE] 找不到收盤行情表格或無成交資料")
+        return
+    print(f"[TWSE] {trade_date} 匯入 {len(bars)} 檔 → {args.store}（累計 {len(store.dates)} 個交易日）")
+
+
+if __name__ == "__main__":
+    main()
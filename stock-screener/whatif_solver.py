@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+策略A「明日條件」反解
+======================
+MA5、MA20、KDJ、量能都是下一根日K的確定函數。對接近符合的股票，直接解出
+「明日收盤價 x、成交量 v 要落在哪裡，六條件才會全部成立」：
+
+  S4 = 最近4日收盤和，S19 = 最近19日收盤和，C[t-4] = 五日前收盤
+  條件1 MA5 上升        MA5' > MA5            ⇔ x > C[t-4]
+  條件2 Gap < g         4(S4+x) > (1-g)(S19+x) ⇔ x > ((1-g)·S19 - 4·S4) / (3+g)
+  條件3 Gap 縮小        同上，g 換成今日 Gap（兩者取較嚴者）
+  條件4 量增            v > V[t]
+  條件6 均量 ≥ N 張     v ≥ N×1000×4 - 最近3日量和
+  條件5 K、D < m        K' = (2K+RSV)/3 < m、D' = (2D+K')/3 < m
+                        ⇔ RSV < R* = min(3m - 2K, 3(3m - 2D) - 2K)
+                        ⇔ x < L8 + R*·(H8-L8)/100（H8/L8：最近8日最高/最低，假設明日高低不超出此區間）
+
+條件1/3/4/5 需要連續多日成立，較早的那幾天今天就已確定；不成立的股票明日不可能通過（feasible=False）。
+價格區間另外夾在漲跌停（±10%）內。
+
+盤中只要比對 price_min < 現價 < price_max、累計量 ≥ volume_min，不必重算指標；
+盤中最高/最低價已超出 H8/L8 時可用 price_ok() 以實際區間重算上限。
+"""
+
+import numpy as np
+
+import indicators
+
+LIMIT_PCT = 0.10  # 漲跌停幅度
+
+# 明日無法通過的原因（位元）
+BLOCK_HISTORY = {
+    1: "cond1_ma5_slope",      # MA5 前幾日未連續上升
+    2: "cond3_gap_shrinking",  # Gap 前幾日未連續縮小
+    4: "cond4_volume_up",      # 成交量前幾日未連續放大
+    8: "cond5_kd_below_25",    # 前幾日 K/D 未低於門檻
+    16: "price_range",         # 價格條件在漲跌停內無解
+    32: "data",                # 資料不足
+}
+
+
+def solve(high, low, close, volume, params: dict = None, limit_pct: float = LIMIT_PCT,
+          r_period: int = 9, k_period: int = 3, d_period: int = 3) -> dict:
+    """
+    股票 × 交易日 矩陣（最後一欄為今日，停牌日已跳過）→ 每檔明日的通過條件
+    回傳（皆為長度 = 股票數的陣列）：
+      price_min / price_max  明日收盤需滿足 price_min < x < price_max
+      volume_min             明日成交量（股）需 ≥ volume_min
+      feasible               明日有可能通過六條件
+      blocked                無法通過的原因（BLOCK_HISTORY 位元）
+      rsv_max, h8, l8        條件5 的 RSV 上限與最近8日高低（盤中重算上限用）
+      prev_close             今日收盤
+    """
+    p = dict(indicators.STRATEGY_A_PARAMS)
+    if params:
+        p.update(params)
+    high = np.atleast_2d(np.asarray(high, dtype=np.float64))
+    low = np.atleast_2d(np.asarray(low, dtype=np.float64))
+    close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+    volume = np.atleast_2d(np.asarray(volume, dtype=np.float64))
+    n_sym = close.shape[0]
+
+    a = indicators.strategy_a(high, low, close, volume, params)
+    last = {key: val[:, -1] for key, val in a.items()}
+    c = close[:, -1]
+    blocked = np.zeros(n_sym, dtype=np.uint8)
+
+    # 今日已確定的部分（明日再多一天才湊滿連續天數）
+    with np.errstate(invalid="ignore"):
+        kd_ok = (a["k"] < p["kd_max"]) & (a["d"] < p["kd_max"])
+        history = {
+            1: indicators.rising(a["ma5"], p["slope_days"] - 1)[:, -1],
+            2: indicators.falling(a["gap"], p["gap_days"] - 1)[:, -1],
+            4: indicators.rising(volume, p["volume_days"] - 1)[:, -1],
+            8: indicators._trailing_all(kd_ok, p["kd_days"] - 1)[:, -1],
+        }
+    for bit, ok in history.items():
+        blocked |= np.where(ok, 0, bit).astype(np.uint8)
+    if close.shape[1] >= max(20, r_period - 1, p["volume_days"]):
+        sums = np.sum(close[:, -19:], axis=1)
+        enough = ~np.isnan(sums) & ~np.isnan(last["k"]) & ~np.isnan(last["gap"])
+    else:
+        sums = np.full(n_sym, np.nan)
+        enough = np.zeros(n_sym, dtype=bool)
+    blocked |= np.where(enough, 0, 32).astype(np.uint8)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # 條件1：x > C[t-4]
+        s4 = np.sum(close[:, -4:], axis=1)
+        lo1 = close[:, -5] if enough.any() else np.full(n_sym, np.nan)
+
+        # 條件2 + 3：Gap 對 x 遞減，取較嚴（較小）的 g
+        g = np.minimum(p["gap_max"], last["gap"]) / 100
+        lo23 = ((1 - g) * sums - 4 * s4) / (3 + g)
+
+        # 條件5：RSV 上限 → 價格上限
+        m = p["kd_max"]
+        k, d = last["k"], last["d"]
+        rsv_max = np.minimum(k_period * m - (k_period - 1) * k,
+                             k_period * (d_period * m - (d_period - 1) * d) - (k_period - 1) * k)
+        h8 = np.max(high[:, -(r_period - 1):], axis=1)
+        l8 = np.min(low[:, -(r_period - 1):], axis=1)
+        hi5 = kd_price_max(h8, l8, rsv_max)
+
+        # 漲跌停價本身可成交（開區間往外推一個浮點數）
+        price_min = np.fmax(np.fmax(lo1, lo23), np.nextafter(c * (1 - limit_pct), -np.inf))
+        price_max = np.fmin(hi5, np.nextafter(c * (1 + limit_pct), np.inf))
+        price_ok = price_max > price_min
+
+        # 條件4 + 6：量
+        vol_prev = np.sum(volume[:, -(p["volume_days"] - 1):], axis=1) if p["volume_days"] > 1 else 0
+        volume_min = np.maximum(np.floor(volume[:, -1]) + 1,
+                                np.ceil(p["min_lots"] * 1000 * p["volume_days"] - vol_prev))
+    blocked |= np.where(price_ok, 0, 16).astype(np.uint8)
+
+    return {
+        "price_min": price_min,
+        "price_max": price_max,
+        "volume_min": volume_min,
+        "feasible": blocked == 0,
+        "blocked": blocked,
+        "rsv_max": rsv_max,
+        "h8": h8,
+        "l8": l8,
+        "prev_close": c,
+        "conditions_met": last["conditions_met"],
+    }
+
+
+def kd_price_max(h8, l8, rsv_max):
+    """
+    條件5 的明日收盤上限：RSV = (x - L9) / (H9 - L9) × 100 < rsv_max
+    （H9/L9 = 最近8日與明日高低；RSV ≤ 0 的上限無解 → -inf，> 100 不設限 → inf）
+    """
+    h8 = np.asarray(h8, dtype=np.float64)
+    l8 = np.asarray(l8, dtype=np.float64)
+    rsv_max = np.asarray(rsv_max, dtype=np.float64)
+    bound = l8 + np.clip(rsv_max, 0, 100) / 100 * (h8 - l8)
+    bound = np.where(rsv_max > 100, np.inf, bound)
+    return np.where(rsv_max <= 0, -np.inf, bound)
+
+
+def price_ok(row: dict, price: float, day_high: float = None, day_low: float = None) -> bool:
+    """
+    盤中比對單一報價是否落在明日（今日）通過區間
+    day_high / day_low 為盤中實際高低；超出最近8日區間時以實際 H9/L9 重算條件5 上限
+    """
+    upper = row["price_max"]
+    h9 = max(row["h8"], day_high if day_high is not None else price)
+    l9 = min(row["l8"], day_low if day_low is not None else price)
+    if h9 != row["h8"] or l9 != row["l8"]:
+        limit = np.nextafter(row["prev_close"] * (1 + LIMIT_PCT), np.inf)
+        upper = min(limit, float(kd_price_max(h9, l9, row["rsv_max"])))
+    return row["price_min"] < price < upper
+
+
+def solve_symbols(store, codes: list, params: dict = None, bars: int = 60) -> list:
+    """
+    從日K庫解出多檔股票的明日門檻，回傳列表（可直接寫入 results_store.save_whatif）
+    [{'code', 'price_min', 'price_max', 'volume_min', 'volume_min_lots', 'feasible', 'blocked', ...}]
+    """
+    if not codes:
+        return []
+    m = {f: store.matrix(f, codes, bars) for f in ("high", "low", "close", "volume")}
+    s = solve(m["high"], m["low"], m["close"], m["volume"], params)
+    rows = []
+    for i, code in enumerate(codes):
+        rows.append({
+            "code": code,
+            "price_min": _round(s["price_min"][i]),
+            "price_max": _round(s["price_max"][i]),
+            "volume_min": int(s["volume_min"][i]) if np.isfinite(s["volume_min"][i]) else None,
+            "volume_min_lots": int(np.ceil(s["volume_min"][i] / 1000)) if np.isfinite(s["volume_min"][i]) else None,
+            "feasible": bool(s["feasible"][i]),
+            "blocked": [name for bit, name in BLOCK_HISTORY.items() if s["blocked"][i] & bit],
+            "rsv_max": _round(s["rsv_max"][i]),
+            "h8": _round(s["h8"][i]),
+            "l8": _round(s["l8"][i]),
+            "prev_close": _round(s["prev_close"][i]),
+            "conditions_met": int(s["conditions_met"][i]),
+        })
+    return rows
+
+
+def _round(x, digits: int = 4):
+    """float → 四捨五入（NaN / 無限大 → None，可直接存 JSON / SQLite）"""
+    x = float(x)
+    if not np.isfinite(x):
+        return None
+    return round(x, digits)
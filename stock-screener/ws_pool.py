@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+WebSocket 連線池 - 訂閱超過單一連線上限時自動分片
+==================================================
+單一 WebSocket 連線最多訂閱 SYMBOLS_PER_CONNECTION 檔。ConnectionPool 依需要開多條連線，
+依各檔訊息頻率分配，某條連線過熱時把熱門股票搬到較冷的連線：
+
+- SymbolRates：每檔訊息頻率（指數衰減，單位 筆/秒）
+- TickDispatcher：所有連線的訊息統一進這裡，依 symbol 派發到對應 handler（持倉 / 觀察名單），
+                  順便計頻率並記錄每檔最後成交時間（斷線補資料的起點）；
+                  begin_gap / end_gap 之間依 (time, serial) 去重，補資料與重連後的即時成交不會重複處理
+- ConnectionPool：
+    subscribe_all(symbols)   依優先順序訂閱（前面的優先；超過總容量的丟棄並回傳）
+    rebalance()              最熱連線 > 平均 × REBALANCE_RATIO 時，逐檔搬到最冷連線
+
+連線物件只需要 connect() / subscribe(params) / unsubscribe(params) / add_handler() / disconnect()
+與 connected 屬性（monitor_websocket.WebSocketManager）；斷線重連後由連線物件自行重送訂閱。
+
+用法：
+  dispatcher = TickDispatcher()
+  dispatcher.route("2330", on_position_tick)
+  pool = ConnectionPool(lambda i: WebSocketManager(...), dispatcher)
+  pool.subscribe_all(["2330", "2317", ...])
+  pool.rebalance()                       # 主迴圈定期呼叫
+"""
+
+import math
+import threading
+import time
+
+SYMBOLS_PER_CONNECTION = 200   # 單一連線訂閱上限
+MAX_CONNECTIONS = 5            # 同時連線上限
+CHANNEL = "trades"
+RATE_HALF_LIFE = 60.0          # 訊息頻率的衰減半衰期（秒）
+REBALANCE_RATIO = 1.5          # 最熱連線頻率超過平均的倍數才搬移
+MIN_REBALANCE_RATE = 2.0       # 最熱連線低於此頻率（筆/秒）不搬移
+MAX_MOVES = 20                 # 每次 rebalance 最多搬移檔數
+
+
+class SymbolRates:
+    """每檔訊息頻率（指數衰減移動平均，筆/秒）"""
+
+    def __init__(self, half_life: float = RATE_HALF_LIFE):
+        self.tau = half_life / math.log(2)
+        self._rate = {}   # symbol → (頻率, 更新時間)
+
+    def hit(self, symbol: str, now: float = None):
+        now = time.monotonic() if now is None else now
+        rate, t = self._rate.get(symbol, (0.0, now))
+        self._rate[symbol] = (rate * math.exp(-(now - t) / self.tau) + 1 / self.tau, now)
+
+    def rate(self, symbol: str, now: float = None) -> float:
+        entry = self._rate.get(symbol)
+        if entry is None:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        rate, t = entry
+        return rate * math.exp(-(now - t) / self.tau)
+
+
+class TickDispatcher:
+    """統一的 tick 派發：symbol → handler"""
+
+    def __init__(self, rates: SymbolRates = None):
+        self.rates = rates or SymbolRates()
+        self.routes = {}
+        self.last_time = {}      # symbol → 最後一筆成交時間（trades 的 time，微秒）
+        self._gap = {}           # 補資料中的 symbol → 已處理的成交 key
+        self.dispatched = 0
+        self.backfilled = 0
+        self.duplicates = 0
+        self.unrouted = 0
+
+    def route(self, symbol: str, handler):
+        self.routes[symbol] = handler
+
+    def begin_gap(self, symbols: list):
+        """斷線時呼叫：這些 symbol 開始記錄成交 key，直到 end_gap"""
+        for s in symbols:
+            self._gap.setdefault(s, set())
+
+    def end_gap(self, symbols: list):
+        """補資料全部派發後呼叫（經同一個佇列排在補資料之後）"""
+        for s in symbols:
+            self._gap.pop(s, None)
+
+    def dispatch(self, msg: dict):
+        data = msg.get("data") if isinstance(msg, dict) else None
+        sym = data.get("symbol") if isinstance(data, dict) else None
+        handler = self.routes.get(sym)
+        if handler is None:
+            self.unrouted += 1
+            return
+        seen = self._gap.get(sym)
+        if seen is not None:
+            # 同一筆成交：time 相同且 serial（沒有時用累計量）相同
+            key = (data.get("time"), data.get("serial", data.get("volume")))
+            if key in seen:
+                self.duplicates += 1
+                return
+            seen.add(key)
+        t = data.get("time")
+        if t and t > self.last_time.get(sym, 0):
+            self.last_time[sym] = t
+        if msg.get("backfill"):
+            self.backfilled += 1       # 補資料不計入即時頻率
+        else:
+            self.rates.hit(sym)
+        self.dispatched += 1
+        handler(msg)
+
+
+class ConnectionPool:
+    """多條 WebSocket 連線 + 依頻率分配訂閱"""
+
+    def __init__(self, factory, dispatcher: TickDispatcher, capacity: int = SYMBOLS_PER_CONNECTION,
+                 max_connections: int = MAX_CONNECTIONS, channel: str = CHANNEL, log=print):
+        """factory(i) → 第 i 條連線物件（尚未連線）"""
+        self.factory = factory
+        self.dispatcher = dispatcher
+        self.capacity = capacity
+        self.max_connections = max_connections
+        self.channel = channel
+        self.log = log
+        self.conns = []
+        self.members = []        # 每條連線訂閱的 symbol 集合
+        self.assign = {}         # symbol → 連線編號
+        self.moves = 0
+        self._lock = threading.RLock()   # 建立連線時（持鎖中）可能同步觸發斷線回呼
+
+    def _open(self) -> int:
+        i = len(self.conns)
+        conn = self.factory(i)
+        conn.add_handler("message", self.dispatcher.dispatch)
+        if not conn.connect():
+            self.log(f"ERROR: 連線 {i} 建立失敗（斷線重連時補訂閱）")
+        self.conns.append(conn)
+        self.members.append(set())
+        return i
+
+    def _params(self, symbol: str) -> dict:
+        return {"channel": self.channel, "symbol": symbol}
+
+    def subscribe_all(self, symbols: list) -> list:
+        """
+        依優先順序訂閱（重複的略過），回傳超過總容量而未訂閱的 symbol
+        頻率未知的股票以 1 筆/秒估算，依 LPT（由熱到冷，放進最冷且未滿的連線）分配
+        """
+        symbols = [s for s in dict.fromkeys(symbols) if s and s not in self.assign]
+        room = self.capacity * self.max_connections - len(self.assign)
+        dropped = symbols[max(room, 0):]
+        symbols = symbols[:max(room, 0)]
+        if dropped:
+            self.log(f"WARNING: 訂閱超過 {self.max_connections} 條連線上限，{len(dropped)} 檔未訂閱: {dropped[:10]}...")
+        need = math.ceil((len(self.assign) + len(symbols)) / self.capacity)
+        with self._lock:
+            while len(self.conns) < need:
+                self._open()
+            now = time.monotonic()
+            loads = self.loads(now)
+            weight = {s: self.dispatcher.rates.rate(s, now) or 1.0 for s in symbols}
+            for sym in sorted(symbols, key=lambda s: -weight[s]):
+                i = min((j for j in range(len(self.conns)) if len(self.members[j]) < self.capacity),
+                        key=lambda j: loads[j])
+                self._add(i, sym)
+                loads[i] += weight[sym]
+        return dropped
+
+    def _add(self, i: int, symbol: str):
+        self.conns[i].subscribe(self._params(symbol))
+        self.members[i].add(symbol)
+        self.assign[symbol] = i
+
+    def _remove(self, symbol: str) -> int:
+        i = self.assign.pop(symbol)
+        self.members[i].discard(symbol)
+        try:
+            self.conns[i].unsubscribe(self._params(symbol))
+        except Exception as e:
+            self.log(f"WARNING: 取消訂閱 {symbol} 失敗: {e}")
+        return i
+
+    def symbols_of(self, conn) -> list:
+        """某條連線目前訂閱的 symbol（持鎖複製，rebalance 同時進行也安全）"""
+        with self._lock:
+            if conn not in self.conns:
+                return []
+            return list(self.members[self.conns.index(conn)])
+
+    def loads(self, now: float = None) -> list:
+        """每條連線目前的訊息頻率（筆/秒）"""
+        rate = self.dispatcher.rates.rate
+        return [sum(rate(s, now) for s in members) for members in self.members]
+
+    def rebalance(self, now: float = None) -> int:
+        """
+        最熱連線頻率 > 平均 × REBALANCE_RATIO 時，把其中的股票搬到最冷的未滿連線，
+        每次挑「搬完後兩條連線差距最小」的那檔；回傳搬移檔數
+        """
+        if len(self.conns) < 2:
+            return 0
+        now = time.monotonic() if now is None else now
+        moved = 0
+        with self._lock:
+            loads = self.loads(now)
+            while moved < MAX_MOVES:
+                mean = sum(loads) / len(loads)
+                hot = max(range(len(loads)), key=lambda j: loads[j])
+                if loads[hot] < MIN_REBALANCE_RATE or loads[hot] <= mean * REBALANCE_RATIO:
+                    break
+                open_conns = [j for j in range(len(loads)) if j != hot and len(self.members[j]) < self.capacity]
+                if not open_conns:
+                    break
+                cold = min(open_conns, key=lambda j: loads[j])
+                gap = loads[hot] - loads[cold]
+                # 搬移 rate = r 後差距變為 |gap - 2r|，只搬能縮小差距的
+                best, best_rate = None, 0.0
+                for sym in self.members[hot]:
+                    r = self.dispatcher.rates.rate(sym, now)
+                    if 0 < r < gap and abs(gap - 2 * r) < abs(gap - 2 * best_rate):
+                        best, best_rate = sym, r
+                if best is None:
+                    break
+                self._remove(best)
+                self._add(cold, best)
+                loads[hot] -= best_rate
+                loads[cold] += best_rate
+                moved += 1
+        if moved:
+            self.moves += moved
+            self.log(f"INFO: 連線負載重新分配，搬移 {moved} 檔，負載 {[round(x, 1) for x in loads]} 筆/秒")
+        return moved
+
+    def disconnect_all(self):
+        for conn in self.conns:
+            conn.disconnect()
+
+    def metrics(self) -> dict:
+        loads = self.loads()
+        return {
+            "connections": len(self.conns),
+            "symbols": len(self.assign),
+            "per_connection": [len(m) for m in self.members],
+            "rates": [round(x, 2) for x in loads],
+            "moves": self.moves,
+            "backfilled": self.dispatcher.backfilled,
+            "duplicates": self.dispatcher.duplicates,
+            "unrouted": self.dispatcher.unrouted,
+        }